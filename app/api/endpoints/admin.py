@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import logging
+
+from app.models.responses import ChatSessionStats, ContextCacheStats, GCReport
+from app.services.chat_session import get_chat_session_manager
+from app.services.context_cache import get_context_cache_manager
+from app.services.gc_service import GarbageCollector, build_collector
+from app.core.exceptions import NotFoundError, ServiceError
+from app.config import get_settings, Settings
+from app.storage.document_store import DocumentStore
+from app.storage.transfer import gzip_ndjson, iter_export_records
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def get_garbage_collector(settings: Settings = Depends(get_settings)):
+    """Dependency to get garbage collector."""
+    return build_collector(settings)
+
+@router.post("/gc", response_model=GCReport)
+async def run_garbage_collection(
+    collector: GarbageCollector = Depends(get_garbage_collector)
+):
+    """Run a garbage collection pass now and report reclaimed space."""
+    try:
+        return await run_in_threadpool(collector.run_once)
+    except Exception as e:
+        logger.error("Error running garbage collection: %s", e)
+        raise ServiceError(f"Error running garbage collection: {str(e)}")
+
+@router.get("/gc", response_model=GCReport)
+async def get_garbage_collection_report(
+    collector: GarbageCollector = Depends(get_garbage_collector)
+):
+    """Get the report of the most recent garbage collection pass."""
+    report = collector.last_report()
+    if report is None:
+        raise NotFoundError("No garbage collection has run yet")
+    return report
+
+@router.get("/context-cache", response_model=ContextCacheStats)
+async def get_context_cache_stats():
+    """Get provider-side context cache hit rate and saved input tokens for this worker."""
+    manager = get_context_cache_manager()
+    if manager is None:
+        return ContextCacheStats(enabled=False)
+    return ContextCacheStats(enabled=True, **manager.snapshot())
+
+@router.get("/chat-sessions", response_model=ChatSessionStats)
+async def get_chat_session_stats():
+    """Get WebSocket chat session and resident memory counters for this worker."""
+    return ChatSessionStats(**get_chat_session_manager().snapshot())
+
+@router.get("/export")
+async def export_documents(
+    since: Optional[datetime] = Query(None, description="Only documents created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only documents created before this time"),
+    status: Optional[List[str]] = Query(None, description="Only documents with these statuses"),
+    include_files: bool = Query(True, description="Include original files"),
+    settings: Settings = Depends(get_settings)
+):
+    """Stream documents, OCR results and chat histories as gzip-compressed NDJSON.
+    
+    Import the result with `python -m app.storage.transfer import FILE`.
+    """
+    records = iter_export_records(
+        DocumentStore.from_settings(settings),
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+        statuses=status,
+        include_files=include_files
+    )
+    filename = f"visiontalk-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.ndjson.gz"
+    return StreamingResponse(
+        gzip_ndjson(records),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,33 +1,274 @@
-from fastapi import APIRouter, Depends, HTTPException
+from dataclasses import asdict
+from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import logging
+import time
+from uuid import uuid4
 
-from app.models.requests import ChatRequest
-from app.models.responses import ChatResponse
-from app.services.llm_service import LLMService
-from app.core.exceptions import ServiceError, NotFoundError,ValidationError
+from app.models.requests import ChatBatchRequest, ChatRequest, MultiChatRequest
+from app.models.responses import ChatResponse, ChatSource, MultiChatResponse, StageUsage
+from app.services.llm_providers import estimate_tokens
+from app.services.llm_service import LLMService, StageStats
+from app.services.map_reduce_service import MapReduceService
+from app.services.llm_router import get_routing_policy
+from app.services.context_cache import get_context_cache_manager
+from app.services.table_service import TableService
+from app.services.passage_service import PassageService, get_passage_service
+from app.services.prompt_builder import HistoryCompactor, PromptBuilder
+from app.services.chat_batch import ChatBatchService
+from app.services.chat_session import ChatSession, ChatSessionManager, get_chat_session_manager
+from app.core.admission import get_admission_controller
+from app.core.exceptions import AppException, ServiceError, NotFoundError,ValidationError
 from app.config import get_settings, Settings
+from app.storage import serialization
 from app.storage.document_store import DocumentStore
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-def get_gemini_service(settings: Settings = Depends(get_settings)):
-    """Dependency to get Gemini service."""
-    return LLMService(settings.GOOGLE_API_KEY)
+def get_llm_service():
+    """Dependency to get LLM service."""
+    return LLMService(get_routing_policy(), get_context_cache_manager(), PromptBuilder.from_settings(get_settings()))
 
 def get_document_store(settings: Settings = Depends(get_settings)):
     """Dependency to get document store."""
-    return DocumentStore(upload_dir=settings.UPLOAD_DIR)
+    return DocumentStore.from_settings(settings)
+
+def get_map_reduce_service(
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
+):
+    """Dependency to get map-reduce chat service."""
+    return build_map_reduce_service(document_store, settings)
+
+def build_map_reduce_service(document_store: DocumentStore, settings: Settings) -> MapReduceService:
+    """Map-reduce chat service for a store."""
+    return MapReduceService(
+        get_routing_policy(),
+        document_store,
+        chunk_tokens=settings.CHAT_CHUNK_TOKENS,
+        concurrency=settings.CHAT_MAP_CONCURRENCY
+    )
+
+def get_history_compactor(
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
+):
+    """Dependency to get chat history compactor."""
+    return HistoryCompactor.from_settings(get_routing_policy(), document_store, settings)
+
+def get_table_service(document_store: DocumentStore = Depends(get_document_store)):
+    """Dependency to get table service."""
+    return TableService(document_store)
+
+async def _answer_from_tables(table_service: TableService, document_id: str, query: str):
+    """Answer a clearly tabular question locally; returns None to fall back to the LLM."""
+    started = time.perf_counter()
+    try:
+        answer = await run_in_threadpool(table_service.answer, document_id, query)
+    except Exception as e:
+        logger.warning("Table lookup failed for document %s: %s", document_id, e)
+        return None
+    if answer is None:
+        return None
+    stats = StageStats("table", seconds=round(time.perf_counter() - started, 3))
+    return answer.text, [stats]
+
+async def _choose_mode(
+    requested: str,
+    table_service: TableService,
+    document_id: str,
+    query: str,
+    document_content: str,
+    settings: Settings
+):
+    """Resolve "auto" to table, map_reduce or full; returns the mode and any table answer."""
+    if requested != "auto":
+        return requested, None
+    table_result = await _answer_from_tables(table_service, document_id, query)
+    if table_result:
+        return "table", table_result
+    if estimate_tokens(document_content) > settings.CHAT_CONTEXT_TOKENS:
+        return "map_reduce", None
+    return "full", None
+
+def _check_chat_ready(document: dict) -> str:
+    """Raise ValidationError unless a document can be chatted with; returns its content."""
+    status = document.get("status")
+    if status not in ("completed", "partial"):
+        raise ValidationError(f"Document processing not completed. Current status: {status}")
+    document_content = document.get("content", "")
+    if not document_content:
+        raise ValidationError("No document content available")
+    return document_content
+
+async def _generate(
+    mode: str,
+    table_result,
+    llm_service: LLMService,
+    map_reduce_service: MapReduceService,
+    document: dict,
+    document_content: str,
+    query: str,
+    use_context_cache: bool = True,
+    history=(),
+    summary=None
+):
+    """Answer a query in the chosen mode; returns the response and per-stage stats.
+    
+    Conversation history is only sent in full mode; map-reduce and table
+    answers treat each question on its own.
+    """
+    document_id = document["document_id"]
+    if table_result:
+        return table_result
+    if mode == "map_reduce":
+        return await map_reduce_service.generate_response(
+            document_id, document.get("pages") or [{"page_number": 1, "markdown": document_content}], query
+        )
+    response, stats = await llm_service.answer(
+        document_content, query, document_id if use_context_cache else None, history, summary
+    )
+    return response, [stats]
+
+@router.post("", response_model=MultiChatResponse)
+async def chat_with_documents(
+    request: MultiChatRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    passage_service: PassageService = Depends(get_passage_service),
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
+):
+    """Chat with several processed documents at once.
+    
+    The passages most relevant to the question are gathered from every
+    document under one `CHAT_MULTI_CONTEXT_TOKENS` budget, and the answer
+    cites them by number; `sources` maps the numbers to document and page.
+    """
+    document_ids = list(dict.fromkeys(request.document_ids))
+    logger.info("Chat request for %d documents", len(document_ids))
+    if len(document_ids) > settings.CHAT_MULTI_MAX_DOCUMENTS:
+        raise ValidationError(f"At most {settings.CHAT_MULTI_MAX_DOCUMENTS} documents can be chatted with at once")
+    
+    try:
+        for document_id in document_ids:
+            document = document_store.get_document(document_id)
+            if not document:
+                raise NotFoundError(f"Document not found: {document_id}")
+            try:
+                _check_chat_ready(document)
+            except ValidationError as e:
+                raise ValidationError(f"{document_id}: {e.detail}")
+        
+        states = await passage_service.gather(document_ids)
+        passages = passage_service.select(states, request.query, settings.CHAT_MULTI_CONTEXT_TOKENS)
+        try:
+            response, stats = await llm_service.answer_passages(passages, request.query)
+            stats = [stats]
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            response, stats = f"Error generating response: {str(e)}", []
+        
+        # Save the exchange in the history of every document asked
+        now = datetime.now().isoformat()
+        for document_id in document_ids:
+            document_store.append_chat_messages(document_id, [
+                {"role": "user", "content": request.query, "timestamp": now, "document_ids": document_ids},
+                {"role": "assistant", "content": response, "timestamp": now, "document_ids": document_ids},
+            ])
+        
+        return MultiChatResponse(
+            document_ids=document_ids,
+            query=request.query,
+            response=response,
+            sources=[
+                ChatSource(index=i, **{key: passage[key] for key in ("document_id", "filename", "page_number", "score")})
+                for i, passage in enumerate(passages, start=1)
+            ],
+            context_tokens=sum(estimate_tokens(passage["text"]) for passage in passages),
+            usage=[StageUsage(**asdict(stage)) for stage in stats]
+        )
+        
+    except Exception as e:
+        if isinstance(e, (NotFoundError, ValidationError)):
+            raise e
+        logger.error("Error processing chat request: %s", e)
+        raise ServiceError(f"Error processing chat request: {str(e)}")
+
+@router.post("/batch")
+async def chat_batch(
+    request: ChatBatchRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    map_reduce_service: MapReduceService = Depends(get_map_reduce_service),
+    table_service: TableService = Depends(get_table_service),
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
+):
+    """Ask one question of many documents, streaming answers as NDJSON.
+    
+    Lines are a "batch" header with the batch id, a "result" per document in
+    completion order, and an "end" line with totals. Chat history is not
+    written. Resend the request with the batch id to resume an interrupted
+    batch; documents already answered are skipped.
+    """
+    batch_service = ChatBatchService.from_settings(document_store, settings)
+    batch_id = request.batch_id or uuid4().hex
+    
+    def select():
+        return batch_service.select(request.document_ids, request.statuses, request.since, request.until)
+    
+    try:
+        header, previous = await run_in_threadpool(batch_service.prepare, batch_id, request.query, request.mode, select)
+    except AppException:
+        raise
+    except Exception as e:
+        logger.error("Error starting chat batch: %s", e)
+        raise ServiceError(f"Error starting chat batch: {str(e)}")
+    logger.info("Chat batch %s over %d documents", batch_id, len(header["document_ids"]))
+    
+    async def answer(document: dict):
+        document_id = document["document_id"]
+        document_content = _check_chat_ready(document)
+        mode, table_result = await _choose_mode(
+            request.mode, table_service, document_id, request.query, document_content, settings
+        )
+        # One question per document: a provider context cache would not be reused
+        response, stats = await _generate(
+            mode, table_result, llm_service, map_reduce_service, document, document_content, request.query,
+            use_context_cache=False
+        )
+        return response, mode, [asdict(stage) for stage in stats]
+    
+    async def lines():
+        async for record in batch_service.run(header, previous, answer, replay=request.replay):
+            yield serialization.dumps(record) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
 
 @router.post("/{document_id}", response_model=ChatResponse)
 async def chat_with_document(
     document_id: str,
     request: ChatRequest,
-    gemini_service: LLMService = Depends(get_gemini_service),
-    document_store: DocumentStore = Depends(get_document_store)
+    background_tasks: BackgroundTasks,
+    llm_service: LLMService = Depends(get_llm_service),
+    compactor: HistoryCompactor = Depends(get_history_compactor),
+    map_reduce_service: MapReduceService = Depends(get_map_reduce_service),
+    table_service: TableService = Depends(get_table_service),
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
 ):
-    """Chat with a processed document."""
-    logger.info(f"Chat request for document: {document_id}")
+    """Chat with a processed document.
+
+    In "auto" mode, questions that name a column and row (or an aggregate)
+    of an extracted table are answered from the table without the LLM, and
+    documents whose estimated size exceeds `CHAT_CONTEXT_TOKENS` are answered
+    with map-reduce over chunks. Full answers see the conversation so far:
+    a rolling summary of older turns plus the most recent turns.
+    """
+    logger.info("Chat request for document: %s", document_id)
     
     try:
         # Get document
@@ -35,37 +276,167 @@ async def chat_with_document(
         if not document:
             raise NotFoundError("Document not found")
         
-        if document.get("status") != "completed":
-            raise ValidationError(f"Document processing not completed. Current status: {document.get('status')}")
-        
-        # Get document content
-        document_content = document.get("content", "")
-        if not document_content:
-            raise ValidationError("No document content available")
+        # Partially processed documents can be queried on the pages available so far
+        status = document.get("status")
+        document_content = _check_chat_ready(document)
         
         # Generate response
-        response = gemini_service.generate_response(document_content, request.query)
-        
-        # Save conversation history (optional)
-        document_store.save_chat_message(
-            document_id=document_id,
-            role="user",
-            content=request.query
-        )
-        document_store.save_chat_message(
-            document_id=document_id,
-            role="assistant",
-            content=response
+        mode, table_result = await _choose_mode(
+            request.mode, table_service, document_id, request.query, document_content, settings
         )
+        try:
+            summary, history = None, []
+            if mode == "full":
+                summary, history = await run_in_threadpool(compactor.conversation, document_id)
+            response, stats = await _generate(
+                mode, table_result, llm_service, map_reduce_service, document, document_content, request.query,
+                history=history, summary=summary
+            )
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            response, stats = f"Error generating response: {str(e)}", []
+        
+        # Save conversation history (optional), both messages in one write
+        now = datetime.now().isoformat()
+        document_store.append_chat_messages(document_id, [
+            {"role": "user", "content": request.query, "timestamp": now},
+            {"role": "assistant", "content": response, "timestamp": now},
+        ])
+        # Fold older turns into the rolling summary after the response is sent
+        background_tasks.add_task(compactor.compact, document_id)
         
         return ChatResponse(
             document_id=document_id,
             query=request.query,
-            response=response
+            response=response,
+            partial=status == "partial",
+            pages_available=document.get("pages_available"),
+            mode=mode,
+            usage=[StageUsage(**asdict(stage)) for stage in stats]
         )
         
     except Exception as e:
         if isinstance(e, (NotFoundError, ValidationError)):
             raise e
-        logger.error(f"Error processing chat request: {str(e)}")
-        raise ServiceError(f"Error processing chat request: {str(e)}")
\ No newline at end of file
+        logger.error("Error processing chat request: %s", e)
+        raise ServiceError(f"Error processing chat request: {str(e)}")
+
+async def _stream_turn(
+    websocket: WebSocket,
+    manager: ChatSessionManager,
+    session: ChatSession,
+    query: str,
+    requested_mode: str,
+    settings: Settings
+) -> None:
+    """Answer one WebSocket turn, streaming the response as it is generated."""
+    document_id = session.document_id
+    document = await run_in_threadpool(manager.document, document_id)
+    document_content = _check_chat_ready(document)
+    table_service = TableService(manager.store)
+    compactor = HistoryCompactor.from_settings(get_routing_policy(), manager.store, settings)
+    mode, table_result = await _choose_mode(requested_mode, table_service, document_id, query, document_content, settings)
+    await websocket.send_json({"type": "start", "mode": mode})
+    
+    try:
+        if table_result:
+            response, stats = table_result
+            await websocket.send_json({"type": "delta", "text": response})
+        elif mode == "map_reduce":
+            response, stats = await build_map_reduce_service(manager.store, settings).generate_response(
+                document_id, document.get("pages") or [{"page_number": 1, "markdown": document_content}], query
+            )
+            await websocket.send_json({"type": "delta", "text": response})
+        else:
+            answer_stats = StageStats("answer")
+            parts = []
+            summary, history = await run_in_threadpool(compactor.conversation, document_id, list(session.turns))
+            stream = get_llm_service().stream_answer(document_content, query, answer_stats, document_id, history, summary)
+            async for delta in stream:
+                parts.append(delta)
+                await websocket.send_json({"type": "delta", "text": delta})
+            response, stats = "".join(parts), [answer_stats]
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.error("Error generating response: %s", e)
+        response, stats = f"Error generating response: {str(e)}", []
+        await websocket.send_json({"type": "delta", "text": response})
+    
+    await run_in_threadpool(manager.record_turn, session, query, response)
+    await websocket.send_json({
+        "type": "done",
+        "response": response,
+        "mode": mode,
+        "partial": document.get("status") == "partial",
+        "pages_available": document.get("pages_available"),
+        "usage": [asdict(stage) for stage in stats],
+    })
+    # Only turns already written are folded; the session's recent turns are sent verbatim.
+    # Compaction runs in the background so the next message is not held up by a summary call.
+    if session.compaction is None or session.compaction.done():
+        session.compaction = asyncio.create_task(compactor.compact(document_id))
+
+@router.websocket("/{document_id}/ws")
+async def chat_session(websocket: WebSocket, document_id: str):
+    """Chat with a document over a WebSocket session.
+    
+    The document is kept in memory for the whole session and history is
+    written in batches. Send {"query": ..., "mode": ...}; each answer arrives
+    as a "start" message, "delta" messages with text and a "done" message
+    with usage. Sessions without messages for `CHAT_SESSION_IDLE_SECONDS` are
+    closed.
+    """
+    settings = get_settings()
+    manager = get_chat_session_manager()
+    controller = get_admission_controller()
+    header = settings.ADMISSION_CLIENT_HEADER
+    client = (header and websocket.headers.get(header)) or (websocket.client.host if websocket.client else "unknown")
+    
+    await websocket.accept()
+    try:
+        session = await run_in_threadpool(manager.open, document_id)
+    except NotFoundError as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=4404)
+        return
+    logger.info("Chat session %s opened for document: %s", session.session_id, document_id)
+    await websocket.send_json({"type": "ready", "session_id": session.session_id, "document_id": document_id})
+    
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive_json(), timeout=settings.CHAT_SESSION_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000, reason="Session idle")
+                break
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON"})
+                continue
+            
+            query = message.get("query") if isinstance(message, dict) else None
+            mode = message.get("mode", "auto") if isinstance(message, dict) else "auto"
+            if not isinstance(query, str) or not query.strip() or mode not in ("auto", "full", "map_reduce"):
+                await websocket.send_json({"type": "error", "detail": "Send {\"query\": ..., \"mode\": \"auto\" | \"full\" | \"map_reduce\"}"})
+                continue
+            
+            try:
+                controller.admit("chat", client)
+            except AppException as e:
+                await websocket.send_json({"type": "error", "detail": e.detail, **e.extra})
+                continue
+            started = time.monotonic()
+            try:
+                await _stream_turn(websocket, manager, session, query, mode, settings)
+            except AppException as e:
+                await websocket.send_json({"type": "error", "detail": e.detail, **e.extra})
+            finally:
+                controller.release("chat", started)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Shielded so buffered history is written even if the handler is cancelled
+        logger.info("Closing chat session %s", session.session_id)
+        await asyncio.shield(run_in_threadpool(manager.close, session))
+        if session.compaction is not None:
+            await asyncio.shield(session.compaction)
@@ -1,28 +1,62 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from uuid import uuid4
+import asyncio
+import base64
+import json
+import mimetypes
 import os
-import tempfile
+import re
+import time
 import logging
-import shutil
+from typing import Optional
 
-from app.models.requests import DocumentURLRequest
-from app.models.responses import DocumentResponse, OCRResponse
-from app.services.ocr_service import OCRService
-from app.core.exceptions import ServiceError, ValidationError
+from app.models.requests import DocumentURLRequest, TableQueryRequest
+from app.models.responses import (
+    DeleteResponse, DocumentResponse, OCRResponse, SearchResponse, TableListResponse, TableQueryResponse
+)
+from app.services.ocr_service import OCRService, PageRangeError, get_ocr_service
+from app.services.table_service import TableService, query_table
+from app.services.image_service import IMAGE_MODES, ImageService
+from app.services.url_cache import UrlCache
+from app.services.context_cache import get_context_cache_manager
+from app.services.chat_session import get_chat_session_manager
+from app.core.admission import get_admission_controller
+from app.core.events import TERMINAL_STATUSES, get_event_broker
+from app.core.exceptions import AppException, NotFoundError, ServiceError, ValidationError
+from app.core.http_cache import (
+    encode_variant, encoded_etag, etag_matches, get_response_cache, make_etag, matching_etag, negotiate_encoding
+)
 from app.config import get_settings, Settings
 from app.storage.document_store import DocumentStore
+from app.storage.search_index import SearchIndex
+from app.storage.serialization import encode_document_response, encode_ocr_result, page_texts, response_pages
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+IMAGE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
 def get_mistral_service(settings: Settings = Depends(get_settings)):
     """Dependency to get Mistral service."""
-    return OCRService(settings.MISTRAL_API_KEY)
+    return get_ocr_service()
 
 def get_document_store(settings: Settings = Depends(get_settings)):
     """Dependency to get document store."""
-    return DocumentStore(upload_dir=settings.UPLOAD_DIR)
+    return DocumentStore.from_settings(settings)
+
+def get_search_index(settings: Settings = Depends(get_settings)):
+    """Dependency to get full-text search index."""
+    return SearchIndex(os.path.join(settings.UPLOAD_DIR, "index"))
+
+def get_table_service(document_store: DocumentStore = Depends(get_document_store)):
+    """Dependency to get table service."""
+    return TableService(document_store)
+
+def get_image_service(document_store: DocumentStore = Depends(get_document_store)):
+    """Dependency to get image service."""
+    return ImageService(document_store)
 
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
@@ -33,7 +67,7 @@ async def upload_document(
     settings: Settings = Depends(get_settings)
 ):
     """Upload a document (PDF or image) for OCR processing."""
-    logger.info(f"Processing uploaded file: {file.filename}")
+    logger.info("Processing uploaded file: %s", file.filename)
     
     # Validate file size
     if file.size > settings.MAX_UPLOAD_SIZE:
@@ -45,22 +79,20 @@ async def upload_document(
         raise ValidationError("Only PDF and image files (PNG, JPG) are supported")
     
     try:
-        # Save file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
-        
         # Generate document ID
         document_id = str(uuid4())
         
-        # Store document and get access path
-        document_path = document_store.save_document(document_id, tmp_path, file.filename)
+        # Stream the upload straight into blob storage
+        blob_key = await run_in_threadpool(
+            document_store.save_document_stream, document_id, file.file, file.filename, file.content_type
+        )
         
         # Process document with OCR in background
+        get_admission_controller().enqueue_ocr()
         background_tasks.add_task(
             process_document_ocr,
             document_id=document_id,
-            file_path=document_path,
+            blob_key=blob_key,
             file_name=file.filename,
             mistral_service=mistral_service,
             document_store=document_store
@@ -74,12 +106,8 @@ async def upload_document(
         )
         
     except Exception as e:
-        logger.error(f"Error processing document upload: {str(e)}")
+        logger.error("Error processing document upload: %s", e)
         raise ServiceError(f"Error processing document: {str(e)}")
-    finally:
-        # Clean up temp file if it exists
-        if 'tmp_path' in locals() and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
 
 @router.post("/process-url", response_model=DocumentResponse)
 async def process_document_url(
@@ -89,7 +117,7 @@ async def process_document_url(
     document_store: DocumentStore = Depends(get_document_store)
 ):
     """Process a document from a URL."""
-    logger.info(f"Processing document from URL: {request.url}")
+    logger.info("Processing document from URL: %s", request.url)
     
     try:
         # Generate document ID
@@ -99,12 +127,15 @@ async def process_document_url(
         document_store.save_url(document_id, request.url)
         
         # Process document with OCR in background
+        get_admission_controller().enqueue_ocr()
         background_tasks.add_task(
             process_url_ocr,
             document_id=document_id,
             url=request.url,
             mistral_service=mistral_service,
-            document_store=document_store
+            document_store=document_store,
+            force_refresh=request.force_refresh,
+            cache_ttl=request.cache_ttl
         )
         
         return DocumentResponse(
@@ -115,123 +146,607 @@ async def process_document_url(
         )
         
     except Exception as e:
-        logger.error(f"Error processing document URL: {str(e)}")
+        logger.error("Error processing document URL: %s", e)
         raise ServiceError(f"Error processing document URL: {str(e)}")
 
+@router.get("/search", response_model=SearchResponse)
+async def search_documents(
+    q: str = Query(..., min_length=1, description="Search query"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of hits"),
+    search_index: SearchIndex = Depends(get_search_index)
+):
+    """Search page content across all completed documents."""
+    started = time.perf_counter()
+    try:
+        total, hits = await run_in_threadpool(search_index.search, q, limit)
+    except Exception as e:
+        logger.error("Error searching documents: %s", e)
+        raise ServiceError(f"Error searching documents: {str(e)}")
+    
+    return SearchResponse(
+        query=q,
+        total=total,
+        hits=hits,
+        took_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
 @router.get("/{document_id}", response_model=OCRResponse)
 async def get_document(
     document_id: str,
-    document_store: DocumentStore = Depends(get_document_store)
+    request: Request,
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
 ):
-    """Get document OCR processing results."""
-    logger.info(f"Retrieving document: {document_id}")
+    """Get document OCR processing results.
+
+    Supports If-None-Match revalidation and gzip/zstd content coding. Encoded
+    bodies of completed documents are cached by ETag so they are serialized
+    and compressed only once.
+    """
+    logger.debug("Retrieving document: %s", document_id)
     
     try:
-        document = document_store.get_document(document_id)
-        if not document:
+        version = document_store.get_document_version(document_id)
+        if version is None:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        return document
+        etag = make_etag(document_id, version)
+        cache = get_response_cache()
+        cached = cache.get(etag)
+        
+        # Revalidation only needs the version, so it is answered before the document is read;
+        # without a cached body the Cache-Control is unknown, and no-cache is the safe answer
+        client_etag = matching_etag(request.headers.get("if-none-match"), etag)
+        if client_etag:
+            return Response(status_code=304, headers={
+                "ETag": client_etag,
+                "Cache-Control": cached.cache_control if cached else "no-cache",
+                "Vary": "Accept-Encoding",
+            })
+        
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        
+        body = cached.variants.get(encoding) if cached else None
+        if body is None and cached and "identity" in cached.variants:
+            encoding, body = encode_variant(
+                cached.variants["identity"], request.headers.get("accept-encoding"), settings.COMPRESSION_MIN_SIZE
+            )
+            cache.put_variant(etag, cached.cache_control, encoding, body)
+        
+        if cached:
+            cache_control = cached.cache_control
+        else:
+            document = document_store.get_document(document_id)
+            if not document:
+                raise HTTPException(status_code=404, detail="Document not found")
+            
+            if document.get("status") == "completed":
+                cache_control = f"private, max-age={settings.DOCUMENT_CACHE_MAX_AGE}"
+            else:
+                cache_control = "no-cache"
+            
+            identity = encode_document_response(document)
+            encoding, body = encode_variant(
+                identity, request.headers.get("accept-encoding"), settings.COMPRESSION_MIN_SIZE
+            )
+            if document.get("status") == "completed":
+                cache.put_variant(etag, cache_control, "identity", identity)
+                cache.put_variant(etag, cache_control, encoding, body)
+        
+        headers = {
+            "ETag": encoded_etag(etag, encoding),
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
-        logger.error(f"Error retrieving document: {str(e)}")
+        logger.error("Error retrieving document: %s", e)
         raise ServiceError(f"Error retrieving document: {str(e)}")
 
-async def process_document_ocr(
+@router.delete("/{document_id}", response_model=DeleteResponse)
+async def delete_document(
     document_id: str,
-    file_path: str,
-    file_name: str,
-    mistral_service: OCRService,
-    document_store: DocumentStore
+    document_store: DocumentStore = Depends(get_document_store),
+    search_index: SearchIndex = Depends(get_search_index)
 ):
-    """Background task to process document with OCR."""
-    logger.info(f"Starting OCR processing for document: {document_id}")
+    """Delete a document, its original file, OCR results and chat history."""
+    if document_store.get_document_version(document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
     
     try:
-        # Determine if it's a PDF or image
-        file_ext = os.path.splitext(file_name)[1].lower()
-        
-        if file_ext == '.pdf':
-            # Process PDF
-            with open(file_path, 'rb') as f:
-                signed_url = mistral_service.upload_pdf(f.read(), file_name)
-                ocr_result = mistral_service.process_ocr({"type": "document_url", "document_url": signed_url})
-        else:
-            # Process image
-            import base64
-            with open(file_path, 'rb') as f:
-                img_base64 = base64.b64encode(f.read()).decode('utf-8')
-                image_url = f"data:image/{file_ext[1:]};base64,{img_base64}"
-                ocr_result = mistral_service.process_ocr({"type": "image_url", "image_url": image_url})
-        
-        # Extract text content
-        content = ""
-        display_content = ""
-        
-        for i, page in enumerate(ocr_result.pages):
-            page_content = page.markdown.strip()
-            if page_content:
-                content += page_content + "\n\n"
-                display_content += f"Page {i+1}:\n{page_content}\n\n----------\n\n"
-        
-        # Update document with OCR results
-        document_store.update_document(
-            document_id=document_id,
-            content=content,
-            display_content=display_content,
-            ocr_result=ocr_result,
-            status="completed"
-        )
-        
-        logger.info(f"OCR processing completed for document: {document_id}")
-        
+        context_cache = get_context_cache_manager()
+        if context_cache:
+            await context_cache.invalidate(document_id)
     except Exception as e:
-        logger.error(f"Error in OCR processing for document {document_id}: {str(e)}")
-        document_store.update_document(
-            document_id=document_id,
-            status="failed",
-            error=str(e)
+        logger.warning("Error releasing context cache of document %s: %s", document_id, e)
+    
+    try:
+        reclaimed = await run_in_threadpool(document_store.delete_document, document_id)
+        await run_in_threadpool(search_index.remove_document, document_id)
+        get_chat_session_manager().invalidate(document_id)
+    except Exception as e:
+        logger.error("Error deleting document %s: %s", document_id, e)
+        raise ServiceError(f"Error deleting document: {str(e)}")
+    
+    return DeleteResponse(document_id=document_id, reclaimed_bytes=reclaimed)
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def _parse_range(header: str, size: int):
+    """Parse a single-range `Range` header into inclusive (start, end), or None if unsatisfiable."""
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+@router.get("/{document_id}/file")
+async def get_document_file(
+    document_id: str,
+    request: Request,
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
+):
+    """Download a document's original file.
+
+    Backends that support it redirect to a presigned URL so the bytes never
+    pass through the API; otherwise the file is streamed with Range support.
+    """
+    document = document_store.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.get("type") == "url":
+        return RedirectResponse(document["url"], status_code=307)
+    
+    blobs = document_store.blob_store
+    key = document_store.document_blob_key(document)
+    size = await run_in_threadpool(blobs.size, key) if key else None
+    if size is None:
+        raise HTTPException(status_code=404, detail="Document file not found")
+    
+    presigned = blobs.presigned_url(key, settings.BLOB_PRESIGN_EXPIRES)
+    if presigned:
+        return RedirectResponse(presigned, status_code=307)
+    
+    media_type = mimetypes.guess_type(document.get("filename") or key)[0] or "application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{os.path.basename(document.get("filename") or key)}"',
+    }
+    range_header = request.headers.get("range")
+    if not range_header:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(blobs.iter_range(key), media_type=media_type, headers=headers)
+    
+    byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(blobs.iter_range(key, start, end), status_code=206, media_type=media_type, headers=headers)
+
+@router.get("/{document_id}/images/{image_id}")
+async def get_document_image(
+    document_id: str,
+    image_id: str,
+    request: Request,
+    width: Optional[int] = Query(None, description="Thumbnail width in pixels"),
+    image_service: ImageService = Depends(get_image_service)
+):
+    """Get an image extracted by OCR, or a thumbnail of it.
+    
+    Images never change once extracted, so they are served with long-lived
+    immutable cache headers.
+    """
+    etag = make_etag(f"{document_id}/{image_id}", str(width or ""))
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        data, media_type = await run_in_threadpool(image_service.get_image, document_id, image_id, width)
+    except AppException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving image %s of document %s: %s", image_id, document_id, e)
+        raise ServiceError(f"Error retrieving image: {str(e)}")
+    return Response(content=data, media_type=media_type, headers=headers)
+
+@router.get("/{document_id}/markdown")
+async def get_document_markdown(
+    document_id: str,
+    images: str = Query("url", description=f"Image references as {', '.join(IMAGE_MODES)}"),
+    image_service: ImageService = Depends(get_image_service)
+):
+    """Get the document as one markdown text, with image references rewritten."""
+    try:
+        markdown = await run_in_threadpool(image_service.render, document_id, images)
+    except AppException:
+        raise
+    except Exception as e:
+        logger.error("Error rendering markdown of document %s: %s", document_id, e)
+        raise ServiceError(f"Error rendering markdown: {str(e)}")
+    return Response(content=markdown, media_type="text/markdown; charset=utf-8")
+
+@router.get("/{document_id}/tables", response_model=TableListResponse)
+async def list_document_tables(
+    document_id: str,
+    table_service: TableService = Depends(get_table_service)
+):
+    """List the tables extracted from a document."""
+    try:
+        tables = await run_in_threadpool(table_service.get_tables, document_id)
+    except NotFoundError:
+        raise
+    except Exception as e:
+        logger.error("Error listing tables: %s", e)
+        raise ServiceError(f"Error listing tables: {str(e)}")
+    
+    return TableListResponse(
+        document_id=document_id,
+        tables=[{key: value for key, value in table.items() if key != "data"} for table in tables]
+    )
+
+@router.post("/{document_id}/tables/query", response_model=TableQueryResponse)
+async def query_document_table(
+    document_id: str,
+    request: TableQueryRequest,
+    table_service: TableService = Depends(get_table_service)
+):
+    """Filter, project or aggregate one extracted table."""
+    try:
+        table = await run_in_threadpool(table_service.get_table, document_id, request.table_id)
+        columns, rows = query_table(
+            table,
+            columns=request.columns,
+            filters=[f.model_dump() for f in request.filters],
+            aggregate=request.aggregate.model_dump() if request.aggregate else None,
+            group_by=request.group_by,
+            limit=request.limit
         )
+    except (NotFoundError, ValidationError):
+        raise
+    except Exception as e:
+        logger.error("Error querying table: %s", e)
+        raise ServiceError(f"Error querying table: {str(e)}")
+    
+    return TableQueryResponse(document_id=document_id, table_id=request.table_id, columns=columns, rows=rows)
 
-async def process_url_ocr(
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/{document_id}/events")
+async def document_events(
     document_id: str,
-    url: str,
-    mistral_service: OCRService,
-    document_store: DocumentStore
+    request: Request,
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
 ):
-    """Background task to process document URL with OCR."""
-    logger.info(f"Starting OCR processing for URL: {url}, document ID: {document_id}")
+    """Stream document processing events as server-sent events.
+
+    Events are status transitions and "chunk" events, sent each time a chunk
+    of pages has been processed. The current status is sent first and the
+    stream closes once the document reaches a terminal status. Changes made
+    by other worker processes are picked up by checking the document version
+    on each heartbeat.
+    """
+    if document_store.get_document_version(document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    broker = get_event_broker()
+    
+    async def event_stream():
+        with broker.subscribe(document_id) as queue:
+            version = document_store.get_document_version(document_id)
+            document = document_store.get_document(document_id) or {}
+            status = document.get("status")
+            yield _sse("status", {"document_id": document_id, "status": status})
+            
+            while status not in TERMINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    current = document_store.get_document_version(document_id)
+                    if current is None:
+                        return
+                    if current != version:
+                        version = current
+                        latest = (document_store.get_document(document_id) or {}).get("status")
+                        if latest != status:
+                            status = latest
+                            yield _sse("status", {"document_id": document_id, "status": status})
+                            continue
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if event["event"] == "status":
+                    status = event["status"]
+                    version = document_store.get_document_version(document_id)
+                yield _sse(event["event"], event)
     
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _set_status(document_store: DocumentStore, document_id: str, status: str, **kwargs) -> None:
+    """Persist a status transition and publish it to event subscribers."""
+    document_store.update_document(document_id=document_id, status=status, **kwargs)
+    get_event_broker().publish(document_id, "status", status=status, **kwargs)
+
+async def _index_document(settings: Settings, document_store: DocumentStore, document_id: str, pages: list) -> None:
+    """Add a completed document to the search index; failures do not fail OCR."""
     try:
-        # Process URL with OCR
-        ocr_result = mistral_service.process_ocr({"type": "document_url", "document_url": url})
-        
-        # Extract text content
-        content = ""
-        display_content = ""
+        document = document_store.get_document(document_id) or {}
+        search_index = SearchIndex(os.path.join(settings.UPLOAD_DIR, "index"))
+        await run_in_threadpool(search_index.add_document, document_id, document.get("filename"), pages)
+    except Exception as e:
+        logger.error("Error indexing document %s: %s", document_id, e)
+
+async def _extract_tables(document_store: DocumentStore, document_id: str, pages: list) -> None:
+    """Store the tables of a completed document; failures do not fail OCR."""
+    try:
+        await run_in_threadpool(TableService(document_store).extract_and_save, document_id, pages)
+    except Exception as e:
+        logger.error("Error extracting tables from document %s: %s", document_id, e)
+
+async def _ocr_chunk(
+    mistral_service: OCRService,
+    document_id: str,
+    document_source: dict,
+    page_range: Optional[list]
+):
+    """One OCR call, retried with backoff; a page range past the end is not retried."""
+    settings = get_settings()
+    attempt = 0
+    while True:
+        try:
+            return await run_in_threadpool(mistral_service.process_ocr, document_source, page_range)
+        except PageRangeError:
+            raise
+        except Exception as e:
+            if attempt >= settings.OCR_CHUNK_RETRIES:
+                raise
+            pause = settings.OCR_RETRY_BACKOFF * 2 ** attempt
+            logger.warning("OCR of document %s failed, retrying in %.1fs: %s", document_id, pause, e)
+            await asyncio.sleep(pause)
+            attempt += 1
+
+async def _run_ocr(
+    mistral_service: OCRService,
+    document_store: DocumentStore,
+    document_id: str,
+    document_source: dict,
+    paged: bool
+) -> None:
+    """Run OCR and persist pages as they become available.
+    
+    Paged sources are processed `OCR_PAGE_CHUNK_SIZE` pages at a time. Each
+    chunk's pages are appended to the document's page log and the status set
+    to "partial", so chat can start before the whole document is done; the
+    completed result is written to the metadata once at the end. OCR does not
+    report the page count, so processing stops at the first chunk with fewer
+    pages than requested, or when a full chunk is followed by a range past
+    the last page. Any other error is retried `OCR_CHUNK_RETRIES` times and
+    then raised, so a document is never completed with pages missing.
+    """
+    settings = get_settings()
+    chunk_size = settings.OCR_PAGE_CHUNK_SIZE if paged else 0
+    broker = get_event_broker()
+    
+    pages = []
+    layout = []
+    model = None
+    pages_processed = 0
+    start = 0
+    document_store.clear_page_log(document_id)
+    
+    while True:
+        page_range = list(range(start, start + chunk_size)) if chunk_size else None
+        try:
+            ocr_result = await _ocr_chunk(mistral_service, document_id, document_source, page_range)
+        except PageRangeError:
+            if not pages:
+                raise
+            break
         
-        for i, page in enumerate(ocr_result.pages):
-            page_content = page.markdown.strip()
-            if page_content:
-                content += page_content + "\n\n"
-                display_content += f"Page {i+1}:\n{page_content}\n\n----------\n\n"
+        encoded = encode_ocr_result(ocr_result)
+        model = encoded["model"] or model
+        layout.extend(encoded["pages"])
+        if encoded["usage_info"]:
+            pages_processed += encoded["usage_info"]["pages_processed"]
         
-        # Update document with OCR results
-        document_store.update_document(
-            document_id=document_id,
-            content=content,
-            display_content=display_content,
-            ocr_result=ocr_result,
-            status="completed"
-        )
+        # Move images out of the page metadata into blob storage
+        chunk_pages = response_pages(ocr_result, offset=start)
+        await run_in_threadpool(ImageService(document_store).store_page_images, document_id, chunk_pages)
+        pages.extend(chunk_pages)
+        if chunk_pages:
+            # OCR reports nothing until a whole chunk is done, so progress is per chunk
+            broker.publish(document_id, "chunk", first_page=chunk_pages[0]["page_number"],
+                           last_page=chunk_pages[-1]["page_number"], pages_done=len(pages))
         
-        logger.info(f"OCR processing completed for URL document: {document_id}")
+        if not chunk_size or len(ocr_result.pages) < chunk_size:
+            break
         
-    except Exception as e:
-        logger.error(f"Error in OCR processing for URL document {document_id}: {str(e)}")
-        document_store.update_document(
-            document_id=document_id,
-            status="failed",
-            error=str(e)
-        )
+        # Persist only this chunk's pages, then the page count
+        await run_in_threadpool(document_store.append_pages, document_id, chunk_pages)
+        document_store.update_document(document_id=document_id, pages_available=len(pages), status="partial")
+        broker.publish(document_id, "status", status="partial", pages_available=len(pages))
+        start += chunk_size
+    
+    content, display_content = page_texts(pages)
+    document_store.update_document(
+        document_id=document_id,
+        content=content,
+        display_content=display_content,
+        pages=pages,
+        pages_available=len(pages),
+        ocr_result={"model": model, "pages": layout, "usage_info": {"pages_processed": pages_processed}},
+        status="completed"
+    )
+    document_store.clear_page_log(document_id)
+    broker.publish(document_id, "status", status="completed", pages_available=len(pages))
+    
+    await _index_document(settings, document_store, document_id, pages)
+    await _extract_tables(document_store, document_id, pages)
+
+async def _blob_source(
+    mistral_service: OCRService,
+    document_store: DocumentStore,
+    document_id: str,
+    blob_key: str,
+    file_ext: str,
+    file_name: str
+) -> dict:
+    """OCR source for a stored file: an uploaded PDF or an inline image."""
+    blobs = document_store.blob_store
+    if file_ext == '.pdf':
+        # Process PDF
+        _set_status(document_store, document_id, "uploading")
+        file_content = await run_in_threadpool(blobs.read, blob_key)
+        signed_url = await run_in_threadpool(mistral_service.upload_pdf, file_content, file_name)
+        return {"type": "document_url", "document_url": signed_url}
+    
+    # Process image
+    file_content = await run_in_threadpool(blobs.read, blob_key)
+    img_base64 = base64.b64encode(file_content).decode('utf-8')
+    image_url = f"data:image/{file_ext[1:]};base64,{img_base64}"
+    return {"type": "image_url", "image_url": image_url}
+
+async def process_document_ocr(
+    document_id: str,
+    blob_key: str,
+    file_name: str,
+    mistral_service: OCRService,
+    document_store: DocumentStore
+):
+    """Background task to process document with OCR.
+    
+    With `OCR_FETCH_PRESIGNED` the OCR service first tries to fetch the file
+    from blob storage by presigned URL; if that fails before any page is
+    stored, the file is uploaded to it instead.
+    """
+    logger.info("Starting OCR processing for document: %s", document_id)
+    settings = get_settings()
+    
+    # Wait for an OCR slot; admission control bounds the queue
+    async with get_admission_controller().ocr_slot():
+        try:
+            # Determine if it's a PDF or image
+            file_ext = os.path.splitext(file_name)[1].lower()
+            paged = file_ext == '.pdf'
+            
+            presigned = None
+            if settings.OCR_FETCH_PRESIGNED:
+                presigned = document_store.blob_store.presigned_url(blob_key, settings.BLOB_PRESIGN_EXPIRES)
+            if presigned:
+                source_type = "document_url" if paged else "image_url"
+                try:
+                    _set_status(document_store, document_id, "ocr")
+                    await _run_ocr(mistral_service, document_store, document_id, {"type": source_type, source_type: presigned}, paged)
+                    logger.info("OCR processing completed for document: %s", document_id)
+                    return
+                except Exception as e:
+                    if (document_store.get_document(document_id) or {}).get("pages_available"):
+                        raise
+                    logger.warning("OCR could not fetch document %s by presigned URL, uploading it: %s", document_id, e)
+            
+            document_source = await _blob_source(mistral_service, document_store, document_id, blob_key, file_ext, file_name)
+            _set_status(document_store, document_id, "ocr")
+            await _run_ocr(mistral_service, document_store, document_id, document_source, paged)
+            
+            logger.info("OCR processing completed for document: %s", document_id)
+            
+        except Exception as e:
+            logger.error("Error in OCR processing for document %s: %s", document_id, e)
+            _set_status(document_store, document_id, "failed", error=str(e))
+
+async def _reuse_ocr_result(document_store: DocumentStore, source_id: str, document_id: str, reason: str) -> None:
+    """Complete a document with a copy of another document's OCR result."""
+    source = document_store.get_document(source_id)
+    pages = await run_in_threadpool(ImageService(document_store).copy_images, source_id, document_id, source.get("pages") or [])
+    document_store.update_document(
+        document_id=document_id,
+        content=source.get("content"),
+        display_content=source.get("display_content"),
+        pages=pages,
+        pages_available=len(pages),
+        ocr_result=source.get("ocr_result"),
+        ocr_cache={"source_document_id": source_id, "reason": reason},
+        status="completed"
+    )
+    get_event_broker().publish(document_id, "status", status="completed", pages_available=len(pages))
+    await _index_document(get_settings(), document_store, document_id, pages)
+    await _extract_tables(document_store, document_id, pages)
+
+async def process_url_ocr(
+    document_id: str,
+    url: str,
+    mistral_service: OCRService,
+    document_store: DocumentStore,
+    force_refresh: bool = False,
+    cache_ttl: Optional[float] = None
+):
+    """Background task to process document URL with OCR.
+    
+    URLs processed before reuse the earlier result while their content is
+    unchanged, without calling OCR.
+    """
+    logger.info("Starting OCR processing for URL: %s, document ID: %s", url, document_id)
+    settings = get_settings()
+    controller = get_admission_controller()
+    url_cache = UrlCache.from_settings(document_store, settings) if settings.URL_CACHE_ENABLED else None
+    
+    if url_cache and not force_refresh:
+        try:
+            hit = await url_cache.lookup(url, cache_ttl)
+            if hit:
+                await _reuse_ocr_result(document_store, hit.document_id, document_id, hit.reason)
+                url_cache.repoint(url, document_id)
+                controller.cancel_ocr()
+                logger.info("Reused OCR result of document %s for URL document %s (%s)", hit.document_id, document_id, hit.reason)
+                return
+        except Exception as e:
+            logger.warning("URL cache lookup failed for %s, running OCR: %s", url, e)
+    
+    # Wait for an OCR slot; admission control bounds the queue
+    async with controller.ocr_slot():
+        # Validators are fetched alongside OCR so a later submission can revalidate
+        validators = asyncio.create_task(url_cache.fetch_validators(url)) if url_cache else None
+        try:
+            # Process URL with OCR
+            _set_status(document_store, document_id, "ocr")
+            await _run_ocr(
+                mistral_service, document_store, document_id, {"type": "document_url", "document_url": url}, paged=True
+            )
+            
+            logger.info("OCR processing completed for URL document: %s", document_id)
+            
+        except Exception as e:
+            logger.error("Error in OCR processing for URL document %s: %s", document_id, e)
+            _set_status(document_store, document_id, "failed", error=str(e))
+            if validators:
+                validators.cancel()
+            return
+    
+    if validators:
+        try:
+            url_cache.record(url, document_id, await validators)
+        except Exception as e:
+            logger.warning("Could not record validators of %s: %s", url, e)
@@ -0,0 +1,114 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+import logging
+
+from app.models.requests import UploadSessionRequest
+from app.models.responses import DocumentResponse, UploadSessionResponse
+from app.api.endpoints.documents import get_document_store, get_mistral_service, process_document_ocr
+from app.core.admission import get_admission_controller
+from app.core.exceptions import AppException, ServiceError, ValidationError
+from app.config import get_settings, Settings
+from app.services.ocr_service import OCRService
+from app.services.upload_service import UploadService
+from app.storage.document_store import DocumentStore
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def get_upload_service(
+    document_store: DocumentStore = Depends(get_document_store),
+    settings: Settings = Depends(get_settings)
+):
+    """Dependency to get upload service."""
+    return UploadService(document_store, settings)
+
+@router.post("", response_model=UploadSessionResponse, status_code=201)
+async def create_upload(
+    request: UploadSessionRequest,
+    upload_service: UploadService = Depends(get_upload_service)
+):
+    """Start a resumable upload; chunks are then sent with PUT."""
+    try:
+        return await run_in_threadpool(
+            upload_service.create_session, request.filename, request.size, request.content_type, request.sha256
+        )
+    except AppException:
+        raise
+    except Exception as e:
+        logger.error("Error creating upload session: %s", e)
+        raise ServiceError(f"Error creating upload session: {str(e)}")
+
+@router.get("/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    upload_service: UploadService = Depends(get_upload_service)
+):
+    """Get the bytes received so far, to resume an interrupted upload."""
+    return upload_service.get_session(upload_id)
+
+@router.put("/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk"),
+    upload_service: UploadService = Depends(get_upload_service)
+):
+    """Upload one chunk as the raw request body."""
+    # Read at most one chunk so a misbehaving client cannot exhaust memory
+    limit = upload_service.chunk_size
+    data = bytearray()
+    async for piece in request.stream():
+        data.extend(piece)
+        if len(data) > limit:
+            raise ValidationError(f"Chunk exceeds the chunk size of {limit} bytes")
+    
+    try:
+        return await run_in_threadpool(upload_service.write_chunk, upload_id, offset, bytes(data))
+    except AppException:
+        raise
+    except Exception as e:
+        logger.error("Error writing chunk of upload %s: %s", upload_id, e)
+        raise ServiceError(f"Error writing chunk: {str(e)}")
+
+@router.post("/{upload_id}/complete", response_model=DocumentResponse)
+async def complete_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    upload_service: UploadService = Depends(get_upload_service),
+    mistral_service: OCRService = Depends(get_mistral_service)
+):
+    """Finish an upload and start OCR processing."""
+    try:
+        session = await run_in_threadpool(upload_service.complete, upload_id)
+    except AppException:
+        raise
+    except Exception as e:
+        logger.error("Error completing upload %s: %s", upload_id, e)
+        raise ServiceError(f"Error completing upload: {str(e)}")
+    
+    # Process document with OCR in background
+    get_admission_controller().enqueue_ocr()
+    background_tasks.add_task(
+        process_document_ocr,
+        document_id=session["document_id"],
+        blob_key=session["blob_key"],
+        file_name=session["filename"],
+        mistral_service=mistral_service,
+        document_store=upload_service.store
+    )
+    
+    return DocumentResponse(
+        document_id=session["document_id"],
+        filename=session["filename"],
+        status="processing",
+        message="Document uploaded and OCR processing started"
+    )
+
+@router.delete("/{upload_id}", status_code=204)
+async def abort_upload(
+    upload_id: str,
+    upload_service: UploadService = Depends(get_upload_service)
+):
+    """Cancel an upload and discard the bytes received."""
+    await run_in_threadpool(upload_service.abort, upload_id)
+    return Response(status_code=204)
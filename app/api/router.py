@@ -1,9 +1,11 @@
 from fastapi import APIRouter
-from app.api.endpoints import documents, chat
+from app.api.endpoints import documents, chat, admin, uploads
 
 # Create API router
 api_router = APIRouter()
 
 # Include endpoint routers
 api_router.include_router(documents.router, prefix="/documents", tags=["documents"])
-api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
\ No newline at end of file
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -1,27 +1,148 @@
 from functools import lru_cache
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # S3 rejects smaller parts except the last
+
 class Settings(BaseSettings):
     """Application settings."""
     APP_NAME: str = "Document OCR & Chat API"
     DEBUG: bool = False
     
-    # API Keys
-    MISTRAL_API_KEY: str
-    GOOGLE_API_KEY: str
+    # API Keys; clients that need a missing key fail on first use
+    MISTRAL_API_KEY: Optional[str] = None
+    GOOGLE_API_KEY: Optional[str] = None
+    
+    # Startup
+    WARMUP_ON_STARTUP: bool = True  # import SDKs and create clients in the background after startup
     
     # File Storage
     UPLOAD_DIR: str = "uploads"
+    STORE_SHARD_DEPTH: int = 2  # hash-prefix directory levels; 0 keeps the flat layout
+    STORE_LOCK_STRIPES: int = 1024  # per-document lock files shared by worker processes
+    
+    # Original file storage
+    BLOB_BACKEND: str = "local"  # local or s3
+    S3_BUCKET: Optional[str] = None
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: Optional[str] = None  # set for MinIO and other S3-compatible stores
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024  # 8MB
+    BLOB_PRESIGN_EXPIRES: int = 3600  # seconds
+    OCR_FETCH_PRESIGNED: bool = False  # let the OCR provider fetch files by presigned URL; needs a publicly reachable blob endpoint
+    
+    # Retention and garbage collection
+    RETENTION_TTL_DAYS: Optional[float] = None  # delete documents not modified for this long
+    RETENTION_MAX_BYTES: Optional[int] = None  # evict least recently modified documents above this
+    CHAT_RETENTION_DAYS: Optional[float] = None
+    GC_ENABLED: bool = True
+    GC_INTERVAL_SECONDS: float = 3600
+    GC_BATCH_SIZE: int = 50
+    GC_BATCH_PAUSE: float = 0.05  # seconds between deletion batches
+    GC_ORPHAN_GRACE_SECONDS: int = 3600
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     
+    # Resumable uploads
+    MAX_RESUMABLE_UPLOAD_SIZE: int = 500 * 1024 * 1024  # 500MB
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # every chunk but the last; at least 5MB for S3
+    UPLOAD_SESSION_TTL_HOURS: float = 24
+    
+    # Admission control, per worker process; 0 disables a limit
+    OCR_MAX_IN_FLIGHT: int = 4  # OCR jobs running at once
+    OCR_MAX_QUEUED: int = 32  # OCR jobs waiting for a slot before uploads get 503
+    CHAT_MAX_CONCURRENT: int = 16  # chat generations at once before chat gets 503
+    CLIENT_UPLOADS_PER_MINUTE: float = 30  # per-client quota before 429
+    CLIENT_CHATS_PER_MINUTE: float = 60
+    ADMISSION_CLIENT_HEADER: Optional[str] = None  # e.g. X-API-Key; the client address when unset
+    
+    # HTTP caching
+    DOCUMENT_CACHE_MAX_AGE: int = 86400  # seconds, completed documents only
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 256MB
+    COMPRESSION_MIN_SIZE: int = 1024
+    
+    # OCR
+    OCR_PAGE_CHUNK_SIZE: int = 8  # pages per OCR call; 0 processes the whole document at once
+    OCR_CHUNK_RETRIES: int = 2  # retries of a failed OCR call before the document is marked failed
+    OCR_RETRY_BACKOFF: float = 2.0  # seconds before the first retry, doubled on each retry
+    
+    # URL OCR cache: resubmitted URLs reuse the earlier OCR result while their content is unchanged
+    URL_CACHE_ENABLED: bool = True
+    URL_CACHE_TTL_SECONDS: float = 3600  # reuse without revalidating for this long; 0 always revalidates
+    URL_CACHE_TTL_RULES: Dict[str, float] = {}  # URL prefix -> TTL in seconds; the longest matching prefix wins
+    URL_CACHE_TIMEOUT: float = 10.0  # seconds for a revalidation request
+    URL_CACHE_MAX_HASH_BYTES: int = 100 * 1024 * 1024  # larger bodies are compared by validators only
+    
+    # Chat
+    CHAT_CONTEXT_TOKENS: int = 100000  # larger documents are answered with map-reduce in "auto" mode
+    CHAT_CHUNK_TOKENS: int = 24000  # estimated tokens per map-reduce chunk
+    CHAT_MAP_CONCURRENCY: int = 4  # chunks queried in parallel
+    CONTEXT_CACHE_ENABLED: bool = True  # cache the document prefix on providers that support it
+    CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    CONTEXT_CACHE_MIN_TOKENS: int = 4096  # shorter documents are sent in full every turn
+    CHAT_SESSION_MEMORY_BUDGET: int = 256 * 1024 * 1024  # document content kept resident by WebSocket sessions
+    CHAT_SESSION_IDLE_SECONDS: float = 900  # WebSocket sessions without messages are closed after this
+    CHAT_SESSION_TURNS: int = 20  # recent turns each session keeps in memory
+    CHAT_SESSION_FLUSH_MESSAGES: int = 10  # history messages buffered before they are written
+    CHAT_HISTORY_TOKENS: int = 4000  # prompt budget for the conversation summary and recent turns
+    CHAT_HISTORY_RECENT_TURNS: int = 4  # turns sent verbatim; older ones are folded into a rolling summary
+    CHAT_SUMMARY_TOKENS: int = 512  # length limit of the rolling summary
+    CHAT_BATCH_CONCURRENCY: int = 8  # documents answered at once by a batch; halved on provider rate limits
+    CHAT_BATCH_MAX_RETRIES: int = 4  # retries of a rate-limited document before it is reported as failed
+    CHAT_BATCH_BACKOFF: float = 2.0  # seconds paused after a rate limit, doubled on each retry
+    CHAT_BATCH_MAX_DOCUMENTS: int = 10000
+    CHAT_MULTI_CONTEXT_TOKENS: int = 32000  # passages shared by all documents of a multi-document chat
+    CHAT_MULTI_MAX_DOCUMENTS: int = 20
+    CHAT_PASSAGE_TOKENS: int = 300  # estimated tokens per retrieved passage
+    CHAT_PASSAGE_CACHE_DOCUMENTS: int = 256  # passage states kept in memory
+    
+    # Document events
+    EVENTS_HEARTBEAT_INTERVAL: float = 15.0  # seconds
+    
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json or text
+    LOG_FILE: str = "logs/app.log"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_RATE_LIMIT: float = 50.0  # records/second per logger below WARNING; 0 disables
+    LOG_RATE_LIMITED_LOGGERS: List[str] = [
+        "app.storage.document_store",
+        "app.api.endpoints.documents",
+        "app.api.endpoints.chat",
+    ]
+    
+    # LLM routing
+    LLM_PRIMARY_PROVIDER: str = "gemini"
+    LLM_PRIMARY_MODEL: str = "gemma-3-27b-it"
+    LLM_SECONDARY_PROVIDER: Optional[str] = None
+    LLM_SECONDARY_MODEL: Optional[str] = None
+    LLM_ROUTING_POLICY: str = "single"  # single, fallback or hedged
+    LLM_HEDGE_DELAY: Optional[float] = None  # seconds; None derives it from observed latency
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY: float = 0.5
+    LLM_HEDGE_MAX_DELAY: float = 10.0
+    LLM_LATENCY_WINDOW: int = 200
+    LLM_LOCAL_DELAY: float = 0.0
+    LLM_CONTEXT_WINDOW: int = 128000  # prompt and output tokens the model accepts
+    LLM_MAX_OUTPUT_TOKENS: int = 2048
+    
+    @model_validator(mode="after")
+    def check_part_sizes(self) -> "Settings":
+        """Reject chunk sizes S3 would only refuse when a multipart upload completes."""
+        sizes = {"S3_MULTIPART_CHUNK_SIZE": self.S3_MULTIPART_CHUNK_SIZE}
+        if self.BLOB_BACKEND == "s3":
+            sizes["UPLOAD_CHUNK_SIZE"] = self.UPLOAD_CHUNK_SIZE
+        for name, size in sizes.items():
+            if size < S3_MIN_PART_SIZE:
+                raise ValueError(f"{name} must be at least {S3_MIN_PART_SIZE} bytes (the S3 minimum part size)")
+        return self
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from app.config import Settings, get_settings
+from app.core.exceptions import AppException, OverloadedError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Request paths that start OCR jobs, and the prefix of chat generation requests
+OCR_PATHS = ("/api/documents/upload", "/api/documents/process-url")
+UPLOAD_COMPLETE_PATH = re.compile(r"^/api/uploads/[^/]+/complete$")
+CHAT_PATH_PREFIX = "/api/chat/"
+CHAT_BATCH_PATH = "/api/chat/batch"
+
+MAX_TRACKED_CLIENTS = 10000
+
+class TokenBucket:
+    """Per-client request quota refilled at a constant rate."""
+
+    def __init__(self, per_minute: float):
+        """Initialize a full bucket."""
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def try_take(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        """Whether the bucket has refilled completely, so it can be forgotten."""
+        elapsed = time.monotonic() - self.updated
+        return self.tokens + elapsed * self.rate >= self.capacity
+
+class AdmissionController:
+    """Per-process limits on OCR backlog, concurrent chat generations and client request rates.
+
+    OCR jobs wait for one of `ocr_max_in_flight` slots; at most `ocr_max_queued`
+    more may wait. Requests beyond that are rejected with 503, and clients over
+    their quota with 429. A chat batch holds `chat_batch_weight` chat slots,
+    the number of generations it runs at once. Retry-After is derived from the
+    observed duration of recent OCR jobs and single chat generations.
+    """
+
+    def __init__(
+        self,
+        ocr_max_in_flight: int = 4,
+        ocr_max_queued: int = 32,
+        chat_max_concurrent: int = 16,
+        uploads_per_minute: float = 30,
+        chats_per_minute: float = 60,
+        chat_batch_weight: int = 8
+    ):
+        """Initialize limits."""
+        self.ocr_max_in_flight = ocr_max_in_flight
+        self.ocr_max_queued = ocr_max_queued
+        self.chat_max_concurrent = chat_max_concurrent
+        self.chat_batch_weight = chat_batch_weight
+        self.quotas = {"ocr": uploads_per_minute, "chat": chats_per_minute}
+
+        self.ocr_in_flight = 0
+        self.ocr_queued = 0
+        self.ocr_pending = 0  # admitted requests that have not scheduled their job yet
+        self.chat_in_flight = 0
+        # Moving averages of job durations, seeded with conservative guesses
+        self.durations = {"ocr": 30.0, "chat": 5.0}
+
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._ocr_semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AdmissionController":
+        """Build a controller from application settings."""
+        return cls(
+            ocr_max_in_flight=settings.OCR_MAX_IN_FLIGHT,
+            ocr_max_queued=settings.OCR_MAX_QUEUED,
+            chat_max_concurrent=settings.CHAT_MAX_CONCURRENT,
+            uploads_per_minute=settings.CLIENT_UPLOADS_PER_MINUTE,
+            chats_per_minute=settings.CLIENT_CHATS_PER_MINUTE,
+            chat_batch_weight=settings.CHAT_BATCH_CONCURRENCY
+        )
+
+    def _record_duration(self, lane: str, seconds: float) -> None:
+        """Fold a completed job into the lane's moving average."""
+        self.durations[lane] = 0.8 * self.durations[lane] + 0.2 * seconds
+
+    def _check_quota(self, lane: str, client: str) -> None:
+        """Charge the client's quota for a lane."""
+        per_minute = self.quotas[lane]
+        if not per_minute:
+            return
+        with self._lock:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if not bucket.is_full()}
+            bucket = self._buckets.get((lane, client))
+            if bucket is None:
+                bucket = self._buckets[(lane, client)] = TokenBucket(per_minute)
+            wait = bucket.try_take()
+        if wait:
+            raise RateLimitError(f"Too many {lane} requests, retry later", retry_after=max(1, math.ceil(wait)))
+
+    def weight(self, lane: str, path: str) -> int:
+        """Slots a request holds in its lane: a batch holds one per concurrent generation."""
+        if lane == "chat" and path == CHAT_BATCH_PATH:
+            # Never more than the lane has, so a batch can still run when chat is idle
+            return max(1, min(self.chat_batch_weight, self.chat_max_concurrent or self.chat_batch_weight))
+        return 1
+
+    def admit(self, lane: str, client: str, weight: int = 1) -> None:
+        """Admit a request to a lane or raise RateLimitError / OverloadedError."""
+        if lane == "ocr":
+            backlog = self.ocr_in_flight + self.ocr_queued + self.ocr_pending
+            capacity = self.ocr_max_in_flight + self.ocr_max_queued
+            if self.ocr_max_in_flight and backlog >= capacity:
+                # Time for enough running jobs to finish that this one would fit
+                waves = (backlog - capacity) // self.ocr_max_in_flight + 1
+                retry_after = max(1, math.ceil(self.durations["ocr"] * waves))
+                raise OverloadedError("OCR queue is full, retry later", retry_after=retry_after)
+            self._check_quota(lane, client)
+            self.ocr_pending += 1
+        elif lane == "chat":
+            if self.chat_max_concurrent and self.chat_in_flight + weight > self.chat_max_concurrent:
+                retry_after = max(1, math.ceil(self.durations["chat"]))
+                raise OverloadedError("Too many concurrent chat requests, retry later", retry_after=retry_after)
+            self._check_quota(lane, client)
+            self.chat_in_flight += weight
+
+    def release(self, lane: str, started: float, weight: int = 1) -> None:
+        """Release an admitted request: OCR once its job is scheduled, chat once its answer is complete."""
+        if lane == "ocr":
+            self.ocr_pending -= 1
+        elif lane == "chat":
+            self.chat_in_flight -= weight
+            # A batch's duration says nothing about how soon a single generation frees its slot
+            if weight == 1:
+                self._record_duration("chat", time.monotonic() - started)
+
+    def enqueue_ocr(self) -> None:
+        """Count an OCR job that was scheduled but has not started."""
+        self.ocr_queued += 1
+
+    def cancel_ocr(self) -> None:
+        """Forget an enqueued OCR job that turned out not to need a slot."""
+        self.ocr_queued -= 1
+
+    @asynccontextmanager
+    async def ocr_slot(self) -> AsyncIterator[None]:
+        """Run an enqueued OCR job once a slot is free."""
+        if self._ocr_semaphore is None:
+            self._ocr_semaphore = asyncio.Semaphore(self.ocr_max_in_flight or 1_000_000)
+        try:
+            await self._ocr_semaphore.acquire()
+        finally:
+            self.ocr_queued -= 1
+        self.ocr_in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.ocr_in_flight -= 1
+            self._ocr_semaphore.release()
+            self._record_duration("ocr", time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current load, for logs and diagnostics."""
+        return {
+            "ocr_in_flight": self.ocr_in_flight,
+            "ocr_queued": self.ocr_queued,
+            "ocr_pending": self.ocr_pending,
+            "chat_in_flight": self.chat_in_flight,
+        }
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    """Process-wide admission controller."""
+    return AdmissionController.from_settings(get_settings())
+
+def _reject(exc: AppException) -> JSONResponse:
+    """Error response for a rejected request."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, **exc.extra},
+        headers=exc.headers
+    )
+
+class AdmissionMiddleware:
+    """ASGI middleware applying admission control before the request body is read.
+
+    Upload bodies are only consumed by the endpoint, so rejecting here spares
+    both the network transfer and the memory. Oversized uploads announced by
+    Content-Length are refused with 413 for the same reason. OCR requests are
+    released when their response starts, since the job runs in the
+    background; chat requests when the last body chunk is sent, so streamed
+    answers hold their slot until they are complete.
+    """
+
+    def __init__(self, app, client_header: Optional[str] = None, max_body_size: Optional[int] = None):
+        """Wrap an ASGI app."""
+        self.app = app
+        self.client_header = client_header.lower().encode("latin-1") if client_header else None
+        self.max_body_size = max_body_size
+
+    def _lane(self, scope) -> Optional[str]:
+        """Admission lane of a request, if it is limited."""
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return None
+        path = scope["path"]
+        if path in OCR_PATHS or UPLOAD_COMPLETE_PATH.match(path):
+            return "ocr"
+        if path.startswith(CHAT_PATH_PREFIX) or path == CHAT_PATH_PREFIX.rstrip("/"):
+            return "chat"
+        return None
+
+    def _client(self, scope) -> str:
+        """Quota key of the caller: the configured header, else the peer address."""
+        headers = dict(scope.get("headers") or [])
+        if self.client_header and self.client_header in headers:
+            return headers[self.client_header].decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        lane = self._lane(scope)
+        if lane is None:
+            return await self.app(scope, receive, send)
+
+        if scope["path"] in OCR_PATHS and self.max_body_size:
+            length = dict(scope.get("headers") or []).get(b"content-length")
+            if length and length.isdigit() and int(length) > self.max_body_size:
+                response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+                return await response(scope, receive, send)
+
+        controller = get_admission_controller()
+        weight = controller.weight(lane, scope["path"])
+        try:
+            controller.admit(lane, self._client(scope), weight)
+        except AppException as exc:
+            logger.warning("Rejected %s request: %s (%s)", lane, exc.detail, controller.snapshot())
+            return await _reject(exc)(scope, receive, send)
+
+        started = time.monotonic()
+        released = False
+
+        def finished(message) -> bool:
+            if lane == "ocr":
+                return message["type"] == "http.response.start"
+            return message["type"] == "http.response.body" and not message.get("more_body", False)
+
+        async def send_wrapper(message):
+            nonlocal released
+            try:
+                await send(message)
+            finally:
+                if not released and finished(message):
+                    released = True
+                    controller.release(lane, started, weight)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not released:
+                controller.release(lane, started, weight)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TERMINAL_STATUSES = frozenset({"completed", "failed"})
+
+class EventBroker:
+    """In-process pub/sub of document processing events.
+
+    Publishing is safe from any thread; events are delivered on each
+    subscriber's event loop. Slow subscribers lose their oldest events rather
+    than blocking the publisher.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        """Initialize broker."""
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+        """Put an event on a queue, dropping the oldest one when full."""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def publish(self, document_id: str, event: str, **data: Any) -> None:
+        """Publish an event for a document to all of its subscribers."""
+        payload = {"event": event, "document_id": document_id, "timestamp": time.time(), **data}
+        with self._lock:
+            subscribers = list(self._subscribers.get(document_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, payload)
+            except RuntimeError:
+                # Subscriber's loop is closed
+                pass
+
+    @contextmanager
+    def subscribe(self, document_id: str) -> Iterator[asyncio.Queue]:
+        """Subscribe to a document's events for the duration of the block."""
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(document_id, []).append(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(document_id, [])
+                if entry in subscribers:
+                    subscribers.remove(entry)
+                if not subscribers:
+                    self._subscribers.pop(document_id, None)
+
+    def subscriber_count(self, document_id: Optional[str] = None) -> int:
+        """Number of active subscriptions, overall or for one document."""
+        with self._lock:
+            if document_id is not None:
+                return len(self._subscribers.get(document_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+@lru_cache()
+def get_event_broker() -> EventBroker:
+    """Process-wide event broker."""
+    return EventBroker()
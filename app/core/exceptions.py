@@ -7,11 +7,13 @@ class AppException(Exception):
         self, 
         detail: str, 
         status_code: int = status.HTTP_500_INTERNAL_SERVER_ERROR,
-        extra: Optional[Dict[str, Any]] = None
+        extra: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
     ):
         self.detail = detail
         self.status_code = status_code
         self.extra = extra or {}
+        self.headers = headers
         super().__init__(self.detail)
 
 class ValidationError(AppException):
@@ -39,4 +41,33 @@ class NotFoundError(AppException):
             detail=detail,
             status_code=status.HTTP_404_NOT_FOUND,
             extra=extra
+        )
+
+class ConflictError(AppException):
+    """Raised when a request conflicts with the current state of a resource."""
+    def __init__(self, detail: str, extra: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            detail=detail,
+            status_code=status.HTTP_409_CONFLICT,
+            extra=extra
+        )
+
+class RateLimitError(AppException):
+    """Raised when a client exceeds its request quota."""
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(
+            detail=detail,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            extra={"retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class OverloadedError(AppException):
+    """Raised when the service is at capacity."""
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(
+            detail=detail,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            extra={"retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
         )
\ No newline at end of file
@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from app.config import get_settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+ENCODING_SUFFIXES = ("-gzip", "-zstd")
+
+def make_etag(document_id: str, version: str) -> str:
+    """Build a strong ETag from a document id and content version."""
+    digest = hashlib.sha1(f"{document_id}:{version}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of a content-coded representation; strong ETags differ per encoding."""
+    if encoding == "identity":
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """The If-None-Match entry that matches an ETag, ignoring encoding suffixes, or None."""
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        base = candidate
+        for suffix in ENCODING_SUFFIXES:
+            if base.endswith(f'{suffix}"'):
+                base = base[:-len(suffix) - 1] + '"'
+        if base == etag:
+            return candidate
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, ignoring encoding suffixes."""
+    return matching_etag(if_none_match, etag) is not None
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> str:
+    """Pick the best supported content coding from an Accept-Encoding header."""
+    if not accept_encoding:
+        return "identity"
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if zstandard is not None and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return "identity"
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with the given content coding."""
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return body
+
+@dataclass
+class CachedRepresentation:
+    """Encoded bodies of one document version."""
+    cache_control: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        """Total cached bytes."""
+        return sum(len(body) for body in self.variants.values())
+
+class ResponseCache:
+    """Byte-bounded LRU of encoded response bodies keyed by ETag."""
+
+    def __init__(self, max_bytes: int):
+        """Initialize cache."""
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedRepresentation]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, etag: str) -> Optional[CachedRepresentation]:
+        """Return the cached representation for an ETag."""
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def get_variant(self, etag: str, encoding: str) -> Optional[bytes]:
+        """Return one cached encoding of an ETag's body."""
+        entry = self.get(etag)
+        return entry.variants.get(encoding) if entry else None
+
+    def put_variant(self, etag: str, cache_control: str, encoding: str, body: bytes) -> None:
+        """Store an encoded body, evicting least recently used entries."""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                entry = self._entries[etag] = CachedRepresentation(cache_control)
+            else:
+                self._size -= entry.size
+            entry.variants[encoding] = body
+            self._size += entry.size
+            self._entries.move_to_end(etag)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+def encode_variant(body: bytes, accept_encoding: Optional[str], min_size: int) -> Tuple[str, bytes]:
+    """Negotiate and compress a body, leaving small bodies uncompressed."""
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= min_size else "identity"
+    return encoding, compress(body, encoding)
+
+@lru_cache()
+def get_response_cache() -> ResponseCache:
+    """Process-wide encoded response cache."""
+    return ResponseCache(get_settings().RESPONSE_CACHE_MAX_BYTES)
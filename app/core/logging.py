@@ -1,39 +1,200 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+from typing import Dict, Iterable, Optional, Tuple
 from app.config import get_settings
 
+# Attributes present on every LogRecord; anything else was passed via `extra=`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+_setup_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Serialize the record and any `extra` fields."""
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """Token-bucket rate limit for high-volume loggers.
+
+    Only records below WARNING from the listed loggers (and their children) are
+    limited. The number of dropped records is attached to the next record that
+    passes as `sampled_out`.
+    """
+
+    def __init__(self, logger_names: Iterable[str], rate: float, burst: Optional[float] = None):
+        """Initialize filter with a per-logger rate in records per second."""
+        super().__init__()
+        self.prefixes = tuple(logger_names)
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._buckets: Dict[str, Tuple[float, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def _is_limited(self, name: str) -> bool:
+        """Whether a logger name falls under one of the configured prefixes."""
+        return any(name == prefix or name.startswith(prefix + ".") for prefix in self.prefixes)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Drop records that exceed the logger's budget."""
+        if self.rate <= 0 or record.levelno >= logging.WARNING or not self._is_limited(record.name):
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(record.name, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full.
+
+    The number of dropped records is reported by a warning queued ahead of
+    the next record that fits, and at shutdown.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        """Initialize handler."""
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Copy the record with its message rendered, keeping `exc_info` for the formatter.
+
+        The message is rendered on the calling thread so later changes to
+        mutable arguments do not show up in the log; the base class would
+        also format the traceback into the message and clear `exc_info`, so
+        tracebacks never reached the formatters.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Enqueue without blocking the calling thread."""
+        if self.dropped and not self.report_dropped():
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def report_dropped(self) -> bool:
+        """Queue a warning with the number of records dropped so far; returns whether it fit."""
+        if not self.dropped:
+            return True
+        notice = logging.getLogger(__name__).makeRecord(
+            __name__, logging.WARNING, __file__, 0,
+            "Dropped %d log records while the log queue was full", (self.dropped,), None
+        )
+        try:
+            self.queue.put_nowait(self.prepare(notice))
+        except queue.Full:
+            return False
+        self.dropped = 0
+        return True
+
+def _stop_listener() -> None:
+    """Report dropped records, then flush and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        if _queue_handler is not None:
+            with _queue_handler.lock:
+                _queue_handler.report_dropped()
+        _listener.stop()
+        _listener = None
+
 def setup_logging():
-    """Configure application logging."""
+    """Configure application logging.
+
+    Records are put on a bounded queue by the calling thread and formatted and
+    written to stdout and the rotating log file by a background listener.
+    Calling this more than once is a no-op.
+    """
+    global _listener, _queue_handler
     settings = get_settings()
-    
-    # Create logs directory if it doesn't exist
-    os.makedirs("logs", exist_ok=True)
-    
+
     # Configure root logger
     logger = logging.getLogger()
-    logger.setLevel(settings.LOG_LEVEL)
-    
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
-    # File handler
-    file_handler = RotatingFileHandler(
-        "logs/app.log",
-        maxBytes=10485760,  # 10MB
-        backupCount=5
-    )
-    file_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(pathname)s:%(lineno)d - %(message)s"
-    )
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
-    
+
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+
+        logger.setLevel(settings.LOG_LEVEL)
+
+        # Create logs directory if it doesn't exist
+        log_dir = os.path.dirname(settings.LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+        if settings.LOG_FORMAT == "json":
+            console_formatter = file_formatter = JsonFormatter()
+        else:
+            console_formatter = logging.Formatter(
+                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+            )
+            file_formatter = logging.Formatter(
+                "%(asctime)s - %(name)s - %(levelname)s - %(pathname)s:%(lineno)d - %(message)s"
+            )
+
+        # Console handler
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(console_formatter)
+
+        # File handler
+        file_handler = RotatingFileHandler(
+            settings.LOG_FILE,
+            maxBytes=10485760,  # 10MB
+            backupCount=5
+        )
+        file_handler.setFormatter(file_formatter)
+
+        # Queue handler on the request path, writers on the listener thread
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMITED_LOGGERS, settings.LOG_RATE_LIMIT))
+        logger.addHandler(queue_handler)
+        _queue_handler = queue_handler
+
+        _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+
     # Return logger
-    return logger
\ No newline at end of file
+    return logger
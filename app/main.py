@@ -1,15 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.api.router import api_router
+from app.core.admission import AdmissionMiddleware
 from app.core.exceptions import AppException
 from app.core.logging import setup_logging
 from app.config import get_settings, Settings
+from app.services.gc_service import build_collector, run_collector
+from app.services.warmup_service import get_warmup_service
 
 # Setup logging
 logger = setup_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background maintenance tasks."""
+    settings = get_settings()
+    tasks = []
+    if settings.WARMUP_ON_STARTUP:
+        tasks.append(asyncio.create_task(get_warmup_service().run()))
+    if settings.GC_ENABLED:
+        tasks.append(asyncio.create_task(run_collector(lambda: build_collector(settings), settings)))
+    
+    yield
+    
+    for task in tasks:
+        task.cancel()
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
     settings = get_settings()
@@ -18,6 +39,7 @@ def create_app() -> FastAPI:
         title="Document OCR & Chat API",
         description="API for processing documents with OCR and interacting with them using LLMs",
         version="1.0.0",
+        lifespan=lifespan,
     )
     
     # Configure CORS
@@ -29,16 +51,24 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    # Reject work over capacity before request bodies are read
+    app.add_middleware(
+        AdmissionMiddleware,
+        client_header=settings.ADMISSION_CLIENT_HEADER,
+        max_body_size=settings.MAX_UPLOAD_SIZE + 64 * 1024  # allow for multipart framing
+    )
+    
     # Include API router
     app.include_router(api_router, prefix="/api")
     
     # Add exception handlers
     @app.exception_handler(AppException)
     async def app_exception_handler(request, exc):
-        logger.error(f"Application error: {exc.detail}")
+        logger.error("Application error: %s", exc.detail)
         return JSONResponse(
             status_code=exc.status_code,
-            content={"detail": exc.detail}
+            content={"detail": exc.detail, **exc.extra},
+            headers=exc.headers
         )
     
     @app.get("/health")
@@ -46,6 +76,12 @@ def create_app() -> FastAPI:
         """Health check endpoint."""
         return {"status": "healthy"}
     
+    @app.get("/ready")
+    async def readiness_check():
+        """Readiness endpoint; 503 until warm-up has finished."""
+        warmup = get_warmup_service()
+        return JSONResponse(status_code=200 if warmup.ready else 503, content=warmup.snapshot())
+    
     return app
 
 app = create_app()
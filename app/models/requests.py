@@ -1,9 +1,61 @@
+from typing import Any, List, Literal, Optional
+
 from pydantic import BaseModel, HttpUrl, Field
 
 class DocumentURLRequest(BaseModel):
     """Request model for processing a document from a URL."""
     url: str = Field(..., description="URL of the document to process")
+    force_refresh: bool = Field(False, description="Run OCR again even if the URL was processed before")
+    cache_ttl: Optional[float] = Field(
+        None, ge=0, description="Seconds an earlier result is reused without revalidation; overrides the configured TTL"
+    )
 
 class ChatRequest(BaseModel):
     """Request model for chatting with a document."""
-    query: str = Field(..., description="User's query about the document")
\ No newline at end of file
+    query: str = Field(..., description="User's query about the document")
+    mode: Literal["auto", "full", "map_reduce"] = Field(
+        "auto", description="Answer over the full document, with map-reduce over chunks, or pick by document size and question"
+    )
+
+class MultiChatRequest(BaseModel):
+    """Request model for chatting with several documents at once."""
+    query: str = Field(..., description="User's query about the documents")
+    document_ids: List[str] = Field(..., min_length=1, description="Documents to answer from")
+
+class ChatBatchRequest(BaseModel):
+    """Request model for asking one question of many documents."""
+    query: str = Field(..., description="Question asked of every document")
+    mode: Literal["auto", "full", "map_reduce"] = Field("auto", description="Answer mode, as for a single chat")
+    document_ids: Optional[List[str]] = Field(None, description="Documents to ask; defaults to every document matching the filters")
+    statuses: List[str] = Field(["completed"], description="Only documents with these statuses, when document_ids is not given")
+    since: Optional[str] = Field(None, description="Only documents created at or after this ISO date")
+    until: Optional[str] = Field(None, description="Only documents created before this ISO date")
+    batch_id: Optional[str] = Field(None, description="Id of an interrupted batch to resume, or of a new batch")
+    replay: bool = Field(False, description="When resuming, stream the results of the earlier run first")
+
+class UploadSessionRequest(BaseModel):
+    """Request model for starting a resumable upload."""
+    filename: str = Field(..., description="Original filename")
+    size: int = Field(..., description="Total file size in bytes")
+    content_type: Optional[str] = Field(None, description="MIME type of the file")
+    sha256: Optional[str] = Field(None, description="Hex sha256 of the file, verified on completion")
+
+class TableFilter(BaseModel):
+    """A condition on one table column."""
+    column: str = Field(..., description="Column name")
+    op: Literal["eq", "ne", "gt", "gte", "lt", "lte", "contains"] = Field("eq", description="Comparison operator")
+    value: Any = Field(None, description="Value to compare with")
+
+class TableAggregate(BaseModel):
+    """An aggregate over one table column."""
+    func: Literal["sum", "avg", "min", "max", "count"] = Field(..., description="Aggregate function")
+    column: Optional[str] = Field(None, description="Column to aggregate; all rows for count when omitted")
+
+class TableQueryRequest(BaseModel):
+    """Request model for querying an extracted table."""
+    table_id: str = Field(..., description="Table ID, as listed for the document")
+    columns: Optional[List[str]] = Field(None, description="Columns to return; all when omitted")
+    filters: List[TableFilter] = Field(default_factory=list, description="Conditions all rows must meet")
+    aggregate: Optional[TableAggregate] = Field(None, description="Aggregate to compute instead of returning rows")
+    group_by: Optional[str] = Field(None, description="Column to group the aggregate by")
+    limit: int = Field(100, ge=1, le=10000, description="Maximum number of rows")
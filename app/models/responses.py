@@ -9,6 +9,21 @@ class DocumentResponse(BaseModel):
     message: str = Field(..., description="Status message")
     error: Optional[str] = Field(None, description="Error message if processing failed")
 
+class UploadSessionResponse(BaseModel):
+    """Response model for resumable upload sessions."""
+    upload_id: str = Field(..., description="Upload session ID")
+    document_id: str = Field(..., description="ID of the document being uploaded")
+    filename: str = Field(..., description="Original filename")
+    size: int = Field(..., description="Total file size in bytes")
+    offset: int = Field(..., description="Bytes received so far; the next chunk starts here")
+    chunk_size: int = Field(..., description="Required size of every chunk except the last")
+    expires_at: float = Field(..., description="Session expiry as a UNIX timestamp")
+
+class DeleteResponse(BaseModel):
+    """Response model for document deletion."""
+    document_id: str = Field(..., description="Deleted document ID")
+    reclaimed_bytes: int = Field(..., description="Bytes freed on disk")
+
 class PageContent(BaseModel):
     """Model for page content in OCR response."""
     page_number: int = Field(..., description="Page number")
@@ -23,6 +38,7 @@ class OCRResponse(BaseModel):
     content: Optional[str] = Field(None, description="Extracted text content")
     display_content: Optional[str] = Field(None, description="Formatted display content")
     pages: Optional[List[PageContent]] = Field(None, description="Content by page")
+    pages_available: Optional[int] = Field(None, description="Number of pages processed so far")
     error: Optional[str] = Field(None, description="Error message if processing failed")
 
     class Config:
@@ -30,13 +46,114 @@ class OCRResponse(BaseModel):
         json_encoders = {}
         arbitrary_types_allowed = True
 
+class StageUsage(BaseModel):
+    """Token usage and latency of one chat stage."""
+    stage: str = Field(..., description="Stage name (answer, map, reduce or table)")
+    calls: int = Field(0, description="Number of model calls")
+    cached: int = Field(0, description="Number of results served from cache")
+    input_tokens: int = Field(0, description="Prompt tokens")
+    output_tokens: int = Field(0, description="Completion tokens")
+    cached_input_tokens: int = Field(0, description="Prompt tokens served from a provider-side context cache")
+    seconds: float = Field(0.0, description="Wall-clock time of the stage")
+
 class ChatResponse(BaseModel):
     """Response model for chat operations."""
     document_id: str = Field(..., description="Document ID")
     query: str = Field(..., description="User's query")
     response: str = Field(..., description="Generated response")
+    partial: bool = Field(False, description="Whether the answer is based on a partially processed document")
+    pages_available: Optional[int] = Field(None, description="Number of pages the answer is based on")
+    mode: Optional[str] = Field(None, description="Chat mode used to answer (full, map_reduce or table)")
+    usage: List[StageUsage] = Field(default_factory=list, description="Token usage and latency per stage")
+
+class ChatSource(BaseModel):
+    """A passage a multi-document answer was based on."""
+    index: int = Field(..., description="Number the answer cites the passage by")
+    document_id: str = Field(..., description="Document ID")
+    filename: Optional[str] = Field(None, description="Original filename")
+    page_number: int = Field(..., description="Page number")
+    score: float = Field(..., description="Relevance score")
+
+class MultiChatResponse(BaseModel):
+    """Response model for multi-document chat."""
+    document_ids: List[str] = Field(..., description="Documents the question was asked of")
+    query: str = Field(..., description="User's query")
+    response: str = Field(..., description="Generated response")
+    sources: List[ChatSource] = Field(default_factory=list, description="Passages given to the model, in citation order")
+    context_tokens: int = Field(0, description="Estimated tokens of the passages sent")
+    usage: List[StageUsage] = Field(default_factory=list, description="Token usage and latency per stage")
 
 class ChatHistoryResponse(BaseModel):
     """Response model for chat history."""
     document_id: str = Field(..., description="Document ID")
-    messages: List[Dict[str, Any]] = Field(..., description="Chat messages")
\ No newline at end of file
+    messages: List[Dict[str, Any]] = Field(..., description="Chat messages")
+
+class SearchHit(BaseModel):
+    """Model for a page matching a search query."""
+    document_id: str = Field(..., description="Document ID")
+    filename: Optional[str] = Field(None, description="Original filename")
+    page_number: int = Field(..., description="Page number")
+    score: float = Field(..., description="Relevance score")
+    snippet: str = Field(..., description="Text around the first match")
+
+class SearchResponse(BaseModel):
+    """Response model for full-text search."""
+    query: str = Field(..., description="Search query")
+    total: int = Field(..., description="Number of matching pages")
+    hits: List[SearchHit] = Field(..., description="Top ranked pages")
+    took_ms: float = Field(..., description="Search time in milliseconds")
+
+class GCReport(BaseModel):
+    """Report of a garbage collection pass."""
+    started_at: float = Field(..., description="Start time as a UNIX timestamp")
+    scanned_documents: int = Field(..., description="Documents inspected")
+    expired_documents: int = Field(..., description="Documents deleted by TTL")
+    evicted_documents: int = Field(..., description="Documents deleted to meet the size limit")
+    orphaned_directories: int = Field(..., description="File or chat directories without a document")
+    stale_chat_logs: int = Field(..., description="Expired chat histories")
+    expired_uploads: int = Field(0, description="Abandoned resumable uploads removed")
+    reclaimed_bytes: int = Field(..., description="Bytes freed on disk")
+    duration_seconds: float = Field(..., description="Duration of the pass")
+
+class ContextCacheStats(BaseModel):
+    """Provider-side context cache counters of this worker process."""
+    enabled: bool = Field(..., description="Whether context caching is enabled")
+    hits: int = Field(0, description="Turns that reused a cached document prefix")
+    misses: int = Field(0, description="Caches created or replaced")
+    fallbacks: int = Field(0, description="Turns sent in full after a cache error")
+    saved_input_tokens: int = Field(0, description="Prompt tokens served from cache")
+    hit_rate: float = Field(0.0, description="hits / (hits + misses)")
+
+class ChatSessionStats(BaseModel):
+    """WebSocket chat session counters of this worker process."""
+    sessions: int = Field(..., description="Open sessions")
+    resident_documents: int = Field(..., description="Documents held in memory")
+    resident_bytes: int = Field(..., description="Approximate memory held by resident documents")
+    loads: int = Field(..., description="Documents loaded from the store")
+    evictions: int = Field(..., description="Documents dropped to stay within the memory budget")
+    flushes: int = Field(..., description="Batched chat history writes")
+
+class TableColumn(BaseModel):
+    """Column of an extracted table."""
+    name: str = Field(..., description="Column header")
+    type: str = Field(..., description="Inferred type (number or string)")
+    unit: str = Field("", description="Currency symbol or % shared by a numeric column")
+
+class TableSummary(BaseModel):
+    """An extracted table without its data."""
+    table_id: str = Field(..., description="Table ID")
+    page: Optional[int] = Field(None, description="Page the table is on")
+    columns: List[TableColumn] = Field(..., description="Columns")
+    row_count: int = Field(..., description="Number of rows")
+
+class TableListResponse(BaseModel):
+    """Response model for listing a document's tables."""
+    document_id: str = Field(..., description="Document ID")
+    tables: List[TableSummary] = Field(..., description="Extracted tables")
+
+class TableQueryResponse(BaseModel):
+    """Response model for a table query."""
+    document_id: str = Field(..., description="Document ID")
+    table_id: str = Field(..., description="Table ID")
+    columns: List[str] = Field(..., description="Result column names")
+    rows: List[List[Any]] = Field(..., description="Result rows")
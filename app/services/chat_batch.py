@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import Settings
+from app.core.exceptions import ValidationError
+from app.services.llm_providers import is_rate_limited
+from app.storage import serialization
+from app.storage.atomic import read_bytes
+from app.storage.document_store import SAFE_NAME, DocumentStore
+from app.storage.transfer import matches
+
+logger = logging.getLogger(__name__)
+
+# Answers the batch question for one document: returns (response, mode, usage)
+Answerer = Callable[[Dict[str, Any]], Awaitable[Tuple[str, str, List[Dict[str, Any]]]]]
+
+class RateLimitGate:
+    """Concurrency limit that backs off on provider rate limits.
+
+    A rate-limited call halves the limit and pauses every caller for the
+    backoff. The limit grows back by one after as many consecutive successes
+    as the current limit, up to the maximum.
+    """
+
+    def __init__(self, limit: int, backoff: float = 2.0, max_backoff: float = 60.0):
+        """Initialize gate."""
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.active = 0
+        self.resume_at = 0.0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Wait for a free slot outside any backoff pause."""
+        async with self._condition:
+            while True:
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.active < self.limit:
+                    self.active += 1
+                    return
+                else:
+                    await self._condition.wait()
+
+    async def release(self, rate_limited: bool = False, attempt: int = 0) -> None:
+        """Free a slot, backing off if the call was rate limited."""
+        async with self._condition:
+            self.active -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                pause = min(self.max_backoff, self.backoff * 2 ** attempt)
+                self.resume_at = max(self.resume_at, time.monotonic() + pause)
+            else:
+                self._successes += 1
+                if self.limit < self.max_limit and self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+class ChatBatchService:
+    """Asks one question of many documents, yielding each answer as it completes.
+
+    At most `concurrency` documents are answered at once, through a
+    RateLimitGate. Every result is appended to `{results_dir}/{batch_id}.ndjson`
+    when it is produced, after a first line recording the question and the
+    selected documents. Running the same batch id again skips the documents
+    already answered, so an interrupted batch resumes where it stopped. Chat
+    history is not written.
+    """
+
+    def __init__(
+        self,
+        document_store: DocumentStore,
+        results_dir: str,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        backoff: float = 2.0,
+        max_documents: int = 10000
+    ):
+        """Initialize service."""
+        self.store = document_store
+        self.results_dir = results_dir
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_documents = max_documents
+        os.makedirs(results_dir, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, document_store: DocumentStore, settings: Settings) -> "ChatBatchService":
+        """Build a service from application settings."""
+        return cls(
+            document_store,
+            os.path.join(settings.UPLOAD_DIR, "chat_batches"),
+            concurrency=settings.CHAT_BATCH_CONCURRENCY,
+            max_retries=settings.CHAT_BATCH_MAX_RETRIES,
+            backoff=settings.CHAT_BATCH_BACKOFF,
+            max_documents=settings.CHAT_BATCH_MAX_DOCUMENTS
+        )
+
+    def _path(self, batch_id: str) -> str:
+        """Results file of a batch."""
+        if not SAFE_NAME.match(batch_id):
+            raise ValidationError("Invalid batch id")
+        return os.path.join(self.results_dir, f"{batch_id}.ndjson")
+
+    def select(
+        self,
+        document_ids: Optional[Sequence[str]],
+        statuses: Optional[Sequence[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> List[str]:
+        """Ids of the documents a batch asks: the given ones, else every document matching the filters."""
+        if document_ids is not None:
+            selected = list(dict.fromkeys(document_ids))
+        else:
+            selected = []
+            for document_id in sorted(self.store.list_document_ids()):
+                metadata = self.store.get_document(document_id)
+                if metadata and matches(metadata, since, until, statuses):
+                    selected.append(document_id)
+        if len(selected) > self.max_documents:
+            raise ValidationError(f"A batch can ask at most {self.max_documents} documents, {len(selected)} selected")
+        return selected
+
+    def load(self, batch_id: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Header and latest result per document of an earlier run of a batch."""
+        data = read_bytes(self._path(batch_id))
+        if data is None:
+            return None, {}
+        header, results = None, {}
+        for line in data.splitlines():
+            try:
+                record = serialization.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was interrupted
+                continue
+            if record.get("type") == "batch":
+                header = record
+            elif record.get("type") == "result":
+                results[record["document_id"]] = record
+        return header, results
+
+    def prepare(self, batch_id: str, query: str, mode: str, select: Callable[[], List[str]]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Header and earlier results of a batch, starting it if it is new."""
+        header, results = self.load(batch_id)
+        if header is not None:
+            if header["query"] != query or header["mode"] != mode:
+                raise ValidationError(f"Batch {batch_id} was started with a different question or mode")
+            return header, results
+
+        header = {"type": "batch", "batch_id": batch_id, "query": query, "mode": mode,
+                  "document_ids": select(), "created_at": time.time()}
+        with open(self._path(batch_id), "ab") as f:
+            f.write(serialization.dumps(header) + b"\n")
+        return header, {}
+
+    async def _answer_document(self, document_id: str, answer: Answerer, gate: RateLimitGate) -> Dict[str, Any]:
+        """Result record for one document, retrying provider rate limits."""
+        result: Dict[str, Any] = {"type": "result", "document_id": document_id}
+        started = time.perf_counter()
+        document = self.store.get_document(document_id)
+        if not document:
+            return {**result, "status": "error", "error": "Document not found"}
+
+        attempt = 0
+        while True:
+            await gate.acquire()
+            rate_limited = False
+            try:
+                response, mode, usage = await answer(document)
+                return {**result, "status": "ok", "response": response, "mode": mode, "usage": usage,
+                        "attempts": attempt + 1, "seconds": round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                rate_limited = is_rate_limited(e)
+                if not rate_limited or attempt >= self.max_retries:
+                    return {**result, "status": "error", "error": getattr(e, "detail", None) or str(e),
+                            "attempts": attempt + 1, "seconds": round(time.perf_counter() - started, 3)}
+                logger.info("Rate limited on document %s, attempt %d; backing off", document_id, attempt + 1)
+            finally:
+                await gate.release(rate_limited, attempt)
+            attempt += 1
+
+    async def run(
+        self,
+        header: Dict[str, Any],
+        previous: Dict[str, Dict[str, Any]],
+        answer: Answerer,
+        replay: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a batch's records: a header, a result per document as it completes, then totals.
+
+        Documents answered successfully by an earlier run are skipped, and
+        their results yielded first when `replay` is set.
+        """
+        batch_id = header["batch_id"]
+        answered = {document_id for document_id, record in previous.items() if record["status"] == "ok"}
+        pending = [document_id for document_id in header["document_ids"] if document_id not in answered]
+        yield {"type": "batch", "batch_id": batch_id, "query": header["query"], "mode": header["mode"],
+               "total": len(header["document_ids"]), "previously_answered": len(answered)}
+        if replay:
+            for document_id in header["document_ids"]:
+                if document_id in answered:
+                    yield {**previous[document_id], "replayed": True}
+
+        gate = RateLimitGate(self.concurrency, self.backoff)
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        for document_id in pending:
+            queue.put_nowait(document_id)
+        results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+        async def worker() -> None:
+            while True:
+                try:
+                    document_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await self._answer_document(document_id, answer, gate))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(pending)))]
+        totals = {"ok": 0, "error": 0}
+        try:
+            with open(self._path(batch_id), "ab") as f:
+                for _ in pending:
+                    record = await results.get()
+                    f.write(serialization.dumps(record) + b"\n")
+                    f.flush()
+                    totals[record["status"]] += 1
+                    yield record
+        finally:
+            # Stops outstanding work when the client goes away; the file keeps what was answered
+            for task in workers:
+                task.cancel()
+
+        logger.info("Batch %s finished: %d answered, %d failed, %d from earlier runs",
+                    batch_id, totals["ok"], totals["error"], len(answered))
+        yield {"type": "end", "batch_id": batch_id, "answered": totals["ok"] + len(answered), "failed": totals["error"]}
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional
+from uuid import uuid4
+
+from app.config import Settings, get_settings
+from app.core.exceptions import NotFoundError
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields chat needs; OCR layout and display content stay on disk
+RESIDENT_FIELDS = ("document_id", "filename", "status", "content", "pages", "pages_available")
+
+@dataclass
+class ResidentDocument:
+    """The part of a document's metadata chat needs, kept in memory."""
+    document: Dict[str, Any]
+    version: Optional[str]
+    size: int
+    last_used: float = field(default_factory=time.monotonic)
+
+@dataclass
+class ChatSession:
+    """One WebSocket conversation with a document."""
+    session_id: str
+    document_id: str
+    turns: Deque[Dict[str, Any]]
+    pending: List[Dict[str, Any]] = field(default_factory=list)
+    last_active: float = field(default_factory=time.monotonic)
+    compaction: Optional["asyncio.Task[bool]"] = None  # history compaction running after a turn
+
+def _resident_size(document: Dict[str, Any]) -> int:
+    """Approximate memory held by a resident document, in bytes."""
+    pages = document.get("pages") or []
+    return len(document.get("content") or "") + sum(len(page.get("markdown") or "") for page in pages) + 512 * len(pages)
+
+class ChatSessionManager:
+    """Keeps documents resident for WebSocket chat sessions within a memory budget.
+
+    Documents are loaded once and shared by every session on them. When the
+    resident total exceeds `memory_budget` bytes the least recently used
+    documents are dropped, and reloaded by their sessions on the next turn.
+    Documents still being processed are reloaded when their metadata changes.
+    Each session keeps its last `max_turns` turns in memory and writes its
+    history every `flush_messages` messages and when it closes.
+    """
+
+    def __init__(
+        self,
+        document_store: DocumentStore,
+        memory_budget: int = 256 * 1024 * 1024,
+        max_turns: int = 20,
+        flush_messages: int = 10
+    ):
+        """Initialize manager."""
+        self.store = document_store
+        self.memory_budget = memory_budget
+        self.max_turns = max_turns
+        self.flush_messages = flush_messages
+        self.sessions: Dict[str, ChatSession] = {}
+        self.stats = {"loads": 0, "evictions": 0, "flushes": 0}
+        self._documents: "OrderedDict[str, ResidentDocument]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ChatSessionManager":
+        """Build a manager from application settings."""
+        return cls(
+            DocumentStore.from_settings(settings),
+            memory_budget=settings.CHAT_SESSION_MEMORY_BUDGET,
+            max_turns=settings.CHAT_SESSION_TURNS,
+            flush_messages=settings.CHAT_SESSION_FLUSH_MESSAGES
+        )
+
+    def open(self, document_id: str) -> ChatSession:
+        """Start a session, loading the document if it is not resident."""
+        self.document(document_id)
+        session = ChatSession(uuid4().hex, document_id, deque(maxlen=self.max_turns * 2))
+        self.sessions[session.session_id] = session
+        return session
+
+    def document(self, document_id: str) -> Dict[str, Any]:
+        """Resident copy of a document, loaded or refreshed as needed."""
+        with self._lock:
+            resident = self._documents.get(document_id)
+            if resident is not None:
+                if resident.document.get("status") == "completed":
+                    return self._touch(document_id, resident)
+                # Still being processed: reload only if the metadata changed
+                if self.store.get_document_version(document_id) == resident.version:
+                    return self._touch(document_id, resident)
+
+        version = self.store.get_document_version(document_id)
+        metadata = self.store.get_document(document_id)
+        if not metadata:
+            raise NotFoundError("Document not found")
+        document = {key: metadata.get(key) for key in RESIDENT_FIELDS}
+        resident = ResidentDocument(document, version, _resident_size(document))
+
+        with self._lock:
+            previous = self._documents.pop(document_id, None)
+            if previous is not None:
+                self._resident_bytes -= previous.size
+            self._documents[document_id] = resident
+            self._resident_bytes += resident.size
+            self.stats["loads"] += 1
+            self._enforce_budget(document_id)
+        return document
+
+    def _touch(self, document_id: str, resident: ResidentDocument) -> Dict[str, Any]:
+        """Mark a resident document as recently used."""
+        resident.last_used = time.monotonic()
+        self._documents.move_to_end(document_id)
+        return resident.document
+
+    def _enforce_budget(self, keep: str) -> None:
+        """Drop least recently used documents until the budget is met."""
+        while self._resident_bytes > self.memory_budget and len(self._documents) > 1:
+            document_id = next(iter(self._documents))
+            if document_id == keep:
+                self._documents.move_to_end(document_id)
+                continue
+            evicted = self._documents.pop(document_id)
+            self._resident_bytes -= evicted.size
+            self.stats["evictions"] += 1
+            logger.debug("Evicted resident document %s (%d bytes)", document_id, evicted.size)
+
+    def invalidate(self, document_id: str) -> None:
+        """Forget a resident document, e.g. after it is deleted."""
+        with self._lock:
+            resident = self._documents.pop(document_id, None)
+            if resident is not None:
+                self._resident_bytes -= resident.size
+
+    def record_turn(self, session: ChatSession, query: str, response: str) -> None:
+        """Remember a turn and buffer it for the history file."""
+        now = datetime.now().isoformat()
+        messages = [
+            {"role": "user", "content": query, "timestamp": now},
+            {"role": "assistant", "content": response, "timestamp": now},
+        ]
+        session.turns.extend(messages)
+        session.pending.extend(messages)
+        session.last_active = time.monotonic()
+        if len(session.pending) >= self.flush_messages:
+            self.flush(session)
+
+    def flush(self, session: ChatSession) -> None:
+        """Write buffered history messages."""
+        if not session.pending:
+            return
+        pending, session.pending = session.pending, []
+        self.store.append_chat_messages(session.document_id, pending)
+        self.stats["flushes"] += 1
+
+    def close(self, session: ChatSession) -> None:
+        """Flush and forget a session."""
+        try:
+            self.flush(session)
+        finally:
+            self.sessions.pop(session.session_id, None)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Session and memory counters, for diagnostics."""
+        return {
+            "sessions": len(self.sessions),
+            "resident_documents": len(self._documents),
+            "resident_bytes": self._resident_bytes,
+            **self.stats,
+        }
+
+@lru_cache()
+def get_chat_session_manager() -> ChatSessionManager:
+    """Process-wide chat session manager."""
+    return ChatSessionManager.from_settings(get_settings())
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.config import Settings, get_settings
+from app.services.llm_providers import LLMProvider, LLMResult, estimate_tokens
+from app.services.llm_router import CachedPrefix, RoutingPolicy, get_routing_policy
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Caches this close to expiry are replaced rather than used
+EXPIRY_MARGIN_SECONDS = 60
+# After a failed cache creation, skip caching on that provider for this long
+CREATE_RETRY_SECONDS = 300
+LOCK_STRIPES = 64
+
+class ContextCacheManager:
+    """Registers each document's prompt prefix as provider-side cached content.
+
+    The cache entry for a document is recorded next to its chat history with
+    a digest of the prefix, so it is replaced when the document content
+    changes, renewed shortly before it expires, and removed with the
+    document. Cached requests go through the routing policy too, so they are
+    hedged, fall back and have their latency tracked; providers or models
+    without caching, short prefixes and any cache error send the full prompt.
+
+    Counters are per process. Two workers may occasionally both create a
+    cache for the same document; the extra one simply expires.
+    """
+
+    def __init__(self, router: RoutingPolicy, document_store: DocumentStore, ttl: int = 3600, min_tokens: int = 4096):
+        """Initialize manager."""
+        self.router = router
+        self.document_store = document_store
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "fallbacks": 0, "saved_input_tokens": 0}
+        self._locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+        self._disabled_until: Dict[str, float] = {}
+
+    @classmethod
+    def from_settings(cls, router: RoutingPolicy, settings: Settings) -> "ContextCacheManager":
+        """Build a manager from application settings."""
+        return cls(
+            router,
+            DocumentStore.from_settings(settings),
+            ttl=settings.CONTEXT_CACHE_TTL_SECONDS,
+            min_tokens=settings.CONTEXT_CACHE_MIN_TOKENS
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus the hit rate of cache lookups."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0}
+
+    def usable(self, provider: LLMProvider, prefix: str) -> bool:
+        """Whether caching the prefix on this provider is worthwhile."""
+        if not provider.supports_context_cache or estimate_tokens(prefix) < self.min_tokens:
+            return False
+        return self._disabled_until.get(provider.label, 0) <= time.time()
+
+    async def _cache_name(self, document_id: str, provider: LLMProvider, prefix: str) -> str:
+        """Name of a live cache for the prefix, creating or replacing it when needed."""
+        digest = hashlib.sha256(f"{provider.label}\0{prefix}".encode("utf-8")).hexdigest()
+        lock = self._locks[hash(document_id) % LOCK_STRIPES]
+        async with lock:
+            entry = self.document_store.get_context_cache(document_id)
+            now = time.time()
+            if entry and entry["digest"] == digest and entry["expires_at"] - EXPIRY_MARGIN_SECONDS > now:
+                self.stats["hits"] += 1
+                return entry["name"]
+
+            if entry and entry["provider"] == provider.label:
+                await self._release(provider, entry["name"])
+            try:
+                name = await provider.create_context_cache(prefix, self.ttl)
+            except Exception:
+                self._disabled_until[provider.label] = now + CREATE_RETRY_SECONDS
+                raise
+            self.stats["misses"] += 1
+            self.document_store.save_context_cache(document_id, {
+                "provider": provider.label,
+                "name": name,
+                "digest": digest,
+                "expires_at": now + self.ttl,
+                "prefix_tokens": estimate_tokens(prefix),
+            })
+            logger.debug("Created context cache %s for document %s", name, document_id)
+            return name
+
+    async def _release(self, provider: LLMProvider, name: str) -> None:
+        """Delete a provider cache, ignoring ones that already expired."""
+        try:
+            await provider.delete_context_cache(name)
+        except Exception as e:
+            logger.debug("Error deleting context cache %s: %s", name, e)
+
+    async def complete(
+        self,
+        document_id: str,
+        prefix: str,
+        suffix: str,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> LLMResult:
+        """Generate `prefix + suffix`, sending the prefix from the provider cache when possible."""
+        provider = self.router.primary
+        if not self.usable(provider, prefix):
+            return await self.router.complete(prefix + suffix, generation_config)
+        try:
+            name = await self._cache_name(document_id, provider, prefix)
+            result = await self.router.complete(prefix + suffix, generation_config, CachedPrefix(name, suffix))
+        except Exception as e:
+            logger.warning("Context cache unavailable for document %s, sending full prompt: %s", document_id, e)
+            self.stats["fallbacks"] += 1
+            return await self.router.complete(prefix + suffix, generation_config)
+        self.stats["saved_input_tokens"] += result.cached_tokens
+        return result
+
+    async def invalidate(self, document_id: str) -> None:
+        """Drop a document's cache, e.g. when the document is deleted."""
+        entry = self.document_store.get_context_cache(document_id)
+        if not entry:
+            return
+        if entry["provider"] == self.router.primary.label:
+            await self._release(self.router.primary, entry["name"])
+        self.document_store.delete_context_cache(document_id)
+
+@lru_cache()
+def get_context_cache_manager() -> Optional[ContextCacheManager]:
+    """Process-wide context cache manager, or None when caching is disabled."""
+    settings = get_settings()
+    if not settings.CONTEXT_CACHE_ENABLED:
+        return None
+    return ContextCacheManager.from_settings(get_routing_policy(), settings)
@@ -0,0 +1,197 @@
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import Settings
+from app.storage import serialization
+from app.storage.atomic import atomic_write, disk_usage, read_bytes, remove_path
+from app.storage.document_store import DocumentStore
+from app.services.upload_service import UploadService
+from app.storage.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+class GarbageCollector:
+    """Applies retention policies to stored documents.
+
+    - Documents not modified for `RETENTION_TTL_DAYS` are deleted.
+    - When total usage exceeds `RETENTION_MAX_BYTES`, the least recently
+      modified documents are deleted until usage is back under the limit.
+    - `files/` and `chat/` directories without metadata are removed once they
+      are older than `GC_ORPHAN_GRACE_SECONDS` (uploads write the file first).
+    - Chat logs not modified for `CHAT_RETENTION_DAYS` are removed with their
+      rolling summaries; other state kept next to them stays.
+    - Resumable uploads past their session expiry are aborted.
+
+    Deletions happen in batches of `GC_BATCH_SIZE` with a pause in between so
+    the collector never holds the disk for long.
+    """
+
+    def __init__(self, document_store: DocumentStore, search_index: SearchIndex, settings: Settings):
+        """Initialize collector."""
+        self.store = document_store
+        self.search_index = search_index
+        self.settings = settings
+        self.report_file = os.path.join(settings.UPLOAD_DIR, "gc", "last_report.json")
+
+    def last_report(self) -> Optional[Dict[str, Any]]:
+        """Report of the most recent collection pass in any worker."""
+        data = read_bytes(self.report_file)
+        return serialization.loads(data) if data is not None else None
+
+    def _pause_between_batches(self, deleted: int) -> None:
+        """Yield the disk to request handling after each batch."""
+        if deleted and deleted % self.settings.GC_BATCH_SIZE == 0:
+            time.sleep(self.settings.GC_BATCH_PAUSE)
+
+    def _documents(self) -> List[Tuple[str, float, int]]:
+        """(document_id, last modified, bytes used) for every stored document."""
+        documents = []
+        for document_id in self.store.list_document_ids():
+            paths = self.store.document_paths(document_id)
+            if not paths:
+                continue
+            modified = max(os.path.getmtime(path) for path in paths)
+            documents.append((document_id, modified, sum(disk_usage(path) for path in paths)))
+        return documents
+
+    def _delete(self, document_id: str, report: Dict[str, Any], reason: str) -> None:
+        """Delete a document and account for it in the report."""
+        report["reclaimed_bytes"] += self.store.delete_document(document_id)
+        try:
+            self.search_index.remove_document(document_id)
+        except Exception as e:
+            logger.error("Error removing document %s from search index: %s", document_id, e)
+        report[reason] += 1
+        self._pause_between_batches(report["expired_documents"] + report["evicted_documents"])
+
+    def run_once(self) -> Dict[str, Any]:
+        """Run one collection pass and return a report."""
+        started = time.time()
+        report: Dict[str, Any] = {
+            "started_at": started,
+            "scanned_documents": 0,
+            "expired_documents": 0,
+            "evicted_documents": 0,
+            "orphaned_directories": 0,
+            "stale_chat_logs": 0,
+            "expired_uploads": 0,
+            "reclaimed_bytes": 0,
+        }
+
+        # Abandoned resumable uploads, before their "receiving" documents are scanned
+        try:
+            report["expired_uploads"] = UploadService(self.store, self.settings).purge_expired()
+        except Exception as e:
+            logger.error("Error purging expired uploads: %s", e)
+
+        documents = self._documents()
+        report["scanned_documents"] = len(documents)
+        known = {document_id for document_id, _, _ in documents}
+
+        # TTL-based retention
+        if self.settings.RETENTION_TTL_DAYS:
+            cutoff = started - self.settings.RETENTION_TTL_DAYS * DAY
+            remaining = []
+            for document in documents:
+                if document[1] < cutoff:
+                    self._delete(document[0], report, "expired_documents")
+                else:
+                    remaining.append(document)
+            documents = remaining
+
+        # Size-based retention, oldest first
+        if self.settings.RETENTION_MAX_BYTES:
+            usage = sum(size for _, _, size in documents)
+            for document_id, _, size in sorted(documents, key=lambda document: document[1]):
+                if usage <= self.settings.RETENTION_MAX_BYTES:
+                    break
+                self._delete(document_id, report, "evicted_documents")
+                usage -= size
+
+        # Orphaned file and chat directories
+        orphan_cutoff = started - self.settings.GC_ORPHAN_GRACE_SECONDS
+        chat_cutoff = started - self.settings.CHAT_RETENTION_DAYS * DAY if self.settings.CHAT_RETENTION_DAYS else None
+        removed = 0
+        for base_dir in (self.store.files_dir, self.store.chat_dir):
+            for document_id, path in list(self.store.iter_document_dirs(base_dir)):
+                if document_id not in known:
+                    try:
+                        modified = os.path.getmtime(path)
+                    except FileNotFoundError:
+                        continue
+                    if modified >= orphan_cutoff:
+                        continue
+                    report["reclaimed_bytes"] += remove_path(path)
+                    report["orphaned_directories"] += 1
+                elif base_dir == self.store.chat_dir and chat_cutoff:
+                    # Only the log itself; tables, passages and context cache entries live alongside it
+                    modified = self.store.chat_history_modified(document_id)
+                    if modified is None or modified >= chat_cutoff:
+                        continue
+                    report["reclaimed_bytes"] += self.store.delete_chat_history(document_id)
+                    report["stale_chat_logs"] += 1
+                else:
+                    continue
+                removed += 1
+                self._pause_between_batches(removed)
+
+        report["duration_seconds"] = round(time.time() - started, 3)
+        os.makedirs(os.path.dirname(self.report_file), exist_ok=True)
+        atomic_write(self.report_file, serialization.dumps(report))
+        logger.info("Garbage collection finished: %s", report)
+        return report
+
+class CollectorLease:
+    """Non-blocking advisory file lock so only one worker process collects at a time."""
+
+    def __init__(self, path: str):
+        """Initialize lease."""
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Try to take the lease without waiting."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self) -> None:
+        """Release the lease."""
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+def build_collector(settings: Settings) -> GarbageCollector:
+    """Build a collector over the configured store and search index."""
+    return GarbageCollector(
+        DocumentStore.from_settings(settings),
+        SearchIndex(os.path.join(settings.UPLOAD_DIR, "index")),
+        settings
+    )
+
+async def run_collector(collector_factory: Callable[[], GarbageCollector], settings: Settings) -> None:
+    """Run collection passes forever in a worker thread, one process at a time."""
+    lease = CollectorLease(os.path.join(settings.UPLOAD_DIR, "locks", "gc.lock"))
+    while True:
+        await asyncio.sleep(settings.GC_INTERVAL_SECONDS)
+        if not lease.acquire():
+            continue
+        try:
+            await asyncio.to_thread(collector_factory().run_once)
+        except Exception as e:
+            logger.error("Error in garbage collection: %s", e)
+        finally:
+            lease.release()
@@ -0,0 +1,189 @@
+import base64
+import binascii
+import io
+import logging
+import mimetypes
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.core.exceptions import NotFoundError, ServiceError, ValidationError
+from app.storage.document_store import SAFE_NAME, DocumentStore
+
+logger = logging.getLogger(__name__)
+
+IMAGE_REFERENCE = re.compile(r"!\[([^\]]*)\]\(([^)\s]+)\)")
+DATA_URI = re.compile(r"^data:([\w/+.-]+);base64,", re.IGNORECASE)
+# Thumbnails are only generated at these widths, which bounds what can be cached
+THUMBNAIL_WIDTHS = (64, 128, 256, 512, 1024)
+IMAGE_MODES = ("url", "inline", "none")
+
+def image_url(document_id: str, image_id: str) -> str:
+    """URL path of an image asset."""
+    return f"/api/documents/{quote(document_id)}/images/{quote(image_id)}"
+
+def decode_image(value: str) -> Tuple[bytes, Optional[str]]:
+    """Decode base64 image data, with or without a data URI prefix; returns (bytes, media type)."""
+    media_type = None
+    match = DATA_URI.match(value)
+    if match:
+        media_type, value = match.group(1).lower(), value[match.end():]
+    try:
+        return base64.b64decode(value, validate=True), media_type
+    except (binascii.Error, ValueError) as e:
+        raise ServiceError(f"Invalid image data: {e}")
+
+def media_type_for(image_id: str) -> str:
+    """Media type of an image from its id's extension."""
+    return mimetypes.guess_type(image_id)[0] or "application/octet-stream"
+
+def is_inline(value: Optional[str]) -> bool:
+    """Whether a page image value holds the image data rather than a URL."""
+    return bool(value) and not value.startswith("/")
+
+def render_markdown(markdown: str, images: Dict[str, Optional[str]], resolve: Callable[[str], Optional[str]]) -> str:
+    """Rewrite references to known images in one pass over the markdown.
+
+    `resolve` maps an image id to its new target; returning None drops the
+    reference. References to unknown targets are left as they are.
+    """
+    if not images or "![" not in markdown:
+        return markdown
+
+    def replace(match: "re.Match[str]") -> str:
+        alt, target = match.group(1), match.group(2)
+        if target not in images:
+            return match.group(0)
+        new_target = resolve(target)
+        return f"![{alt}]({new_target})" if new_target is not None else ""
+
+    return IMAGE_REFERENCE.sub(replace, markdown)
+
+def make_thumbnail(data: bytes, width: int) -> Tuple[bytes, str]:
+    """Scale an image down to `width` pixels wide; returns (bytes, media type)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = image.format if image.format in ("JPEG", "PNG", "WEBP", "GIF") else "PNG"
+        if image.width > width:
+            image.thumbnail((width, max(1, image.height * width // image.width)))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format=image_format)
+    return out.getvalue(), Image.MIME[image_format]
+
+class ImageService:
+    """Stores OCR images as blob assets and serves them and their thumbnails.
+
+    OCR results carry every image as base64 inside the page metadata. Images
+    are written to blob storage once, and the page keeps only their URL, so
+    document responses stay small and images are fetched (and cached by
+    clients) individually. Documents processed before this keep base64 in
+    their metadata; their images are copied out on first request.
+    """
+
+    def __init__(self, document_store: DocumentStore):
+        """Initialize service."""
+        self.store = document_store
+
+    def store_page_images(self, document_id: str, pages: List[Dict[str, Any]]) -> None:
+        """Write the inline images of OCR pages to blob storage and replace them with URLs."""
+        for page in pages:
+            images = page.get("images")
+            if not images:
+                continue
+            for image_id, value in list(images.items()):
+                if not is_inline(value) or not SAFE_NAME.match(image_id):
+                    continue
+                data, _ = decode_image(value)
+                self.store.blob_store.put_stream(self.store.image_key(document_id, image_id), io.BytesIO(data))
+                images[image_id] = image_url(document_id, image_id)
+
+    def copy_images(self, source_id: str, target_id: str, pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copies of a document's pages for another document, with their image assets duplicated."""
+        blobs = self.store.blob_store
+        copies = []
+        for page in pages:
+            images = dict(page.get("images") or {})
+            for image_id, value in images.items():
+                if is_inline(value) or not SAFE_NAME.match(image_id):
+                    continue
+                source_key = self.store.image_key(source_id, image_id)
+                if blobs.size(source_key) is None:
+                    continue
+                blobs.put_stream(self.store.image_key(target_id, image_id), io.BytesIO(blobs.read(source_key)))
+                images[image_id] = image_url(target_id, image_id)
+            copies.append({**page, "images": images or None})
+        return copies
+
+    def _find_inline(self, document_id: str, image_id: str) -> Optional[str]:
+        """Base64 data of an image kept in the metadata of an older document."""
+        document = self.store.get_document(document_id)
+        if not document:
+            raise NotFoundError("Document not found")
+        for page in document.get("pages") or []:
+            value = (page.get("images") or {}).get(image_id)
+            if value is not None:
+                return value if is_inline(value) else None
+        return None
+
+    def get_image(self, document_id: str, image_id: str, width: Optional[int] = None) -> Tuple[bytes, str]:
+        """Image bytes and media type, optionally as a thumbnail generated on first request."""
+        if not SAFE_NAME.match(image_id):
+            raise NotFoundError("Image not found")
+        if width is not None and width not in THUMBNAIL_WIDTHS:
+            raise ValidationError(f"Thumbnail width must be one of {', '.join(map(str, THUMBNAIL_WIDTHS))}")
+        blobs = self.store.blob_store
+
+        if width is not None:
+            thumb_key = self.store.image_key(document_id, image_id, width)
+            if blobs.size(thumb_key) is not None:
+                return blobs.read(thumb_key), media_type_for(image_id)
+
+        key = self.store.image_key(document_id, image_id)
+        if blobs.size(key) is not None:
+            data = blobs.read(key)
+        else:
+            value = self._find_inline(document_id, image_id)
+            if value is None:
+                raise NotFoundError("Image not found")
+            data, _ = decode_image(value)
+            blobs.put_stream(key, io.BytesIO(data))
+
+        if width is None:
+            return data, media_type_for(image_id)
+        try:
+            thumbnail, media_type = make_thumbnail(data, width)
+        except ImportError:
+            raise ServiceError("Thumbnails require Pillow")
+        except Exception as e:
+            raise ValidationError(f"Cannot create a thumbnail of this image: {e}")
+        blobs.put_stream(thumb_key, io.BytesIO(thumbnail), media_type)
+        return thumbnail, media_type
+
+    def render(self, document_id: str, images: str = "url") -> str:
+        """Markdown of every page with image references as URLs, inline data URIs or removed."""
+        if images not in IMAGE_MODES:
+            raise ValidationError(f"images must be one of {', '.join(IMAGE_MODES)}")
+        document = self.store.get_document(document_id)
+        if not document:
+            raise NotFoundError("Document not found")
+
+        def render_page(page: Dict[str, Any]) -> str:
+            page_images = page.get("images") or {}
+
+            def resolve(image_id: str) -> Optional[str]:
+                if images == "none":
+                    return None
+                if images == "url":
+                    return image_url(document_id, image_id)
+                value = page_images[image_id]
+                if is_inline(value):
+                    return value if DATA_URI.match(value) else f"data:{media_type_for(image_id)};base64,{value}"
+                data, media_type = self.get_image(document_id, image_id)
+                return f"data:{media_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+            return render_markdown(page.get("markdown") or "", page_images, resolve)
+
+        return "\n\n".join(render_page(page) for page in document.get("pages") or [])
@@ -0,0 +1,296 @@
+import asyncio
+import datetime
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+
+from app.config import Settings
+from app.core.exceptions import ServiceError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GENERATION_CONFIG: Dict[str, Any] = {
+    "temperature": 0.4,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+DEFAULT_SAFETY_SETTINGS: List[Dict[str, str]] = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting, about four characters per token."""
+    return len(text) // 4 + 1
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether a provider error is a rate limit or quota rejection (HTTP 429)."""
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "quota" in message
+
+@dataclass
+class LLMResult:
+    """A completion plus the usage reported by the provider."""
+    text: str
+    provider: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0  # input tokens served from a provider-side context cache
+
+class LLMProvider(ABC):
+    """Interface implemented by every LLM backend."""
+
+    name: str = "base"
+    supports_context_cache: bool = False
+
+    def __init__(self, model: str):
+        """Initialize provider for a model."""
+        self.model = model
+
+    @property
+    def label(self) -> str:
+        """Identifier used in logs and latency tracking."""
+        return f"{self.name}:{self.model}"
+
+    @classmethod
+    @abstractmethod
+    def from_settings(cls, model: str, settings: Settings) -> "LLMProvider":
+        """Build the provider from application settings."""
+
+    @abstractmethod
+    async def complete(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> LLMResult:
+        """Generate a completion for the prompt, with token usage."""
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a completion for the prompt."""
+        return (await self.complete(prompt, generation_config)).text
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[LLMResult]:
+        """Generate a completion in pieces.
+
+        Each piece carries its text; token counts are cumulative, so the last
+        piece reports the totals. Providers without streaming yield one piece.
+        """
+        yield await self.complete(prompt, generation_config)
+
+    async def create_context_cache(self, prefix: str, ttl: int) -> str:
+        """Register a prompt prefix with the provider; returns the cache name."""
+        raise ServiceError(f"Provider {self.label} does not support context caching")
+
+    async def complete_cached(
+        self,
+        cache_name: str,
+        suffix: str,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> LLMResult:
+        """Generate a completion for a cached prefix followed by `suffix`."""
+        raise ServiceError(f"Provider {self.label} does not support context caching")
+
+    async def delete_context_cache(self, cache_name: str) -> None:
+        """Release a cached prefix before it expires."""
+
+class GeminiProvider(LLMProvider):
+    """Provider backed by Google's Gemini API."""
+
+    name = "gemini"
+
+    def __init__(self, model: str, api_key: Optional[str], sdk: Any = None):
+        """Configure Gemini API, importing the SDK on first construction.
+
+        `sdk` replaces the `google.generativeai` module, e.g. with a mock.
+        """
+        super().__init__(model)
+        if not api_key:
+            raise ServiceError("GOOGLE_API_KEY is not configured")
+        if sdk is None:
+            import google.generativeai as sdk
+        self.api_key = api_key
+        self.genai = sdk
+        self.genai.configure(api_key=api_key)
+        self._cached_contents: Dict[str, Any] = {}
+
+    @property
+    def supports_context_cache(self) -> bool:
+        """Cached content is only offered for Gemini models, not e.g. Gemma."""
+        return self.model.split("/")[-1].startswith("gemini-")
+
+    @classmethod
+    def from_settings(cls, model: str, settings: Settings) -> "GeminiProvider":
+        """Build the provider from application settings."""
+        return cls(model=model, api_key=settings.GOOGLE_API_KEY)
+
+    async def complete(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> LLMResult:
+        """Generate a completion with the async Gemini client so it can be cancelled."""
+        model = self.genai.GenerativeModel(self.model)
+        return await self._generate(model, prompt, generation_config)
+
+    async def _generate(self, model: Any, prompt: str, generation_config: Optional[Dict[str, Any]]) -> LLMResult:
+        """Run a generation and collect its usage metadata."""
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=generation_config or DEFAULT_GENERATION_CONFIG,
+            safety_settings=DEFAULT_SAFETY_SETTINGS
+        )
+        return self._result(response)
+
+    def _result(self, response: Any) -> LLMResult:
+        """Text and usage metadata of a response or streamed chunk."""
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResult(
+            text=response.text,
+            provider=self.label,
+            input_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+            cached_tokens=getattr(usage, "cached_content_token_count", 0) or 0
+        )
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[LLMResult]:
+        """Stream a completion chunk by chunk."""
+        model = self.genai.GenerativeModel(self.model)
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=generation_config or DEFAULT_GENERATION_CONFIG,
+            safety_settings=DEFAULT_SAFETY_SETTINGS,
+            stream=True
+        )
+        async for chunk in response:
+            yield self._result(chunk)
+
+    async def create_context_cache(self, prefix: str, ttl: int) -> str:
+        """Create Gemini cached content holding the prefix."""
+        cached = await asyncio.to_thread(
+            self.genai.caching.CachedContent.create,
+            model=f"models/{self.model}",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=ttl)
+        )
+        self._cached_contents[cached.name] = cached
+        return cached.name
+
+    async def complete_cached(
+        self,
+        cache_name: str,
+        suffix: str,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> LLMResult:
+        """Generate from cached content, fetching its handle once per process."""
+        cached = self._cached_contents.get(cache_name)
+        if cached is None:
+            cached = await asyncio.to_thread(self.genai.caching.CachedContent.get, cache_name)
+            self._cached_contents[cache_name] = cached
+        model = self.genai.GenerativeModel.from_cached_content(cached_content=cached)
+        return await self._generate(model, suffix, generation_config)
+
+    async def delete_context_cache(self, cache_name: str) -> None:
+        """Delete Gemini cached content."""
+        cached = self._cached_contents.pop(cache_name, None)
+        if cached is None:
+            cached = await asyncio.to_thread(self.genai.caching.CachedContent.get, cache_name)
+        await asyncio.to_thread(cached.delete)
+
+class LocalProvider(LLMProvider):
+    """Deterministic in-process stand-in for tests and offline development."""
+
+    name = "local"
+    supports_context_cache = True
+
+    def __init__(self, model: str = "echo", delay: float = 0.0):
+        """Initialize local provider with an optional artificial delay in seconds."""
+        super().__init__(model)
+        self.delay = delay
+        self._caches: Dict[str, str] = {}
+
+    @classmethod
+    def from_settings(cls, model: str, settings: Settings) -> "LocalProvider":
+        """Build the provider from application settings."""
+        return cls(model=model, delay=settings.LLM_LOCAL_DELAY)
+
+    def _echo(self, prompt: str) -> LLMResult:
+        """The tail of the prompt as a completion."""
+        text = f"[{self.label}] {prompt.strip()[-200:]}"
+        return LLMResult(text=text, provider=self.label,
+                         input_tokens=estimate_tokens(prompt), output_tokens=estimate_tokens(text))
+
+    async def complete(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> LLMResult:
+        """Return the tail of the prompt after the configured delay."""
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._echo(prompt)
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[LLMResult]:
+        """Yield the echoed completion word by word, spreading the delay over the words."""
+        result = self._echo(prompt)
+        words = result.text.split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                await asyncio.sleep(self.delay / len(words))
+            last = i == len(words) - 1
+            yield LLMResult(
+                text=word if last else word + " ",
+                provider=self.label,
+                input_tokens=result.input_tokens if last else 0,
+                output_tokens=result.output_tokens if last else 0
+            )
+
+    async def create_context_cache(self, prefix: str, ttl: int) -> str:
+        """Keep the prefix in memory."""
+        name = f"local/{uuid.uuid4().hex}"
+        self._caches[name] = prefix
+        return name
+
+    async def complete_cached(
+        self,
+        cache_name: str,
+        suffix: str,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> LLMResult:
+        """Answer as if the cached prefix were sent, reporting it as cached input."""
+        prefix = self._caches.get(cache_name)
+        if prefix is None:
+            raise ServiceError(f"Unknown context cache: {cache_name}")
+        result = await self.complete(prefix + suffix, generation_config)
+        result.cached_tokens = estimate_tokens(prefix)
+        return result
+
+    async def delete_context_cache(self, cache_name: str) -> None:
+        """Forget the prefix."""
+        self._caches.pop(cache_name, None)
+
+PROVIDER_REGISTRY: Dict[str, Type[LLMProvider]] = {}
+
+def register_provider(provider_cls: Type[LLMProvider]) -> Type[LLMProvider]:
+    """Register a provider class under its name."""
+    PROVIDER_REGISTRY[provider_cls.name] = provider_cls
+    return provider_cls
+
+def create_provider(name: str, model: str, settings: Settings) -> LLMProvider:
+    """Instantiate a registered provider."""
+    provider_cls = PROVIDER_REGISTRY.get(name)
+    if provider_cls is None:
+        raise ServiceError(f"Unknown LLM provider: {name}")
+    return provider_cls.from_settings(model, settings)
+
+register_provider(GeminiProvider)
+register_provider(LocalProvider)
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.config import get_settings
+from app.core.exceptions import ServiceError
+from app.services.llm_providers import LLMProvider, LLMResult, create_provider
+
+logger = logging.getLogger(__name__)
+
+class LatencyTracker:
+    """Rolling window of call latencies per provider.
+
+    Calls cancelled before they finished are recorded with their elapsed
+    time, a lower bound on their true latency, so slow calls that lose a
+    hedge still pull the percentiles up.
+    """
+
+    def __init__(self, window: int = 200):
+        """Initialize tracker with a bounded sample window."""
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, label: str, seconds: float) -> None:
+        """Record a latency sample for a provider."""
+        samples = self._samples.get(label)
+        if samples is None:
+            samples = self._samples[label] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, label: str, q: float) -> Optional[float]:
+        """Return the q-th latency percentile, or None without samples."""
+        samples = self._samples.get(label)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+@dataclass
+class CachedPrefix:
+    """A prompt prefix held in the primary provider's context cache."""
+    name: str
+    suffix: str
+
+class RoutingPolicy(ABC):
+    """Decides which provider(s) answer a prompt.
+
+    With a `CachedPrefix`, the primary answers from its cache with only the
+    suffix, while fallback and hedge requests send the full prompt.
+    """
+
+    def __init__(self, primary: LLMProvider, tracker: Optional[LatencyTracker] = None):
+        """Initialize policy with its primary provider."""
+        self.primary = primary
+        self.tracker = tracker or LatencyTracker()
+
+    async def _call(
+        self,
+        provider: LLMProvider,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]],
+        cache: Optional[CachedPrefix] = None
+    ) -> LLMResult:
+        """Call a provider and record its latency, or its elapsed time when cancelled."""
+        started = time.perf_counter()
+        try:
+            if cache is not None and provider is self.primary:
+                result = await provider.complete_cached(cache.name, cache.suffix, generation_config)
+            else:
+                result = await provider.complete(prompt, generation_config)
+        except asyncio.CancelledError:
+            # Censored sample: the call would have taken at least this long
+            self.tracker.record(provider.label, time.perf_counter() - started)
+            raise
+        self.tracker.record(provider.label, time.perf_counter() - started)
+        return result
+
+    @abstractmethod
+    async def complete(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        cache: Optional[CachedPrefix] = None
+    ) -> LLMResult:
+        """Generate a completion for the prompt, with token usage."""
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a completion for the prompt."""
+        return (await self.complete(prompt, generation_config)).text
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[LLMResult]:
+        """Stream from the primary provider.
+
+        If it fails before producing any output the prompt is routed through
+        `complete`, so fallback providers still apply; a failure mid-stream is
+        raised since part of the answer has already been delivered.
+        """
+        started = time.perf_counter()
+        emitted = False
+        try:
+            async for piece in self.primary.stream(prompt, generation_config):
+                emitted = True
+                yield piece
+        except Exception as e:
+            if emitted:
+                raise
+            logger.warning("Streaming from %s failed, routing the prompt instead: %s", self.primary.label, e)
+            yield await self.complete(prompt, generation_config)
+            return
+        self.tracker.record(self.primary.label, time.perf_counter() - started)
+
+class SinglePolicy(RoutingPolicy):
+    """Send every request to the primary provider."""
+
+    async def complete(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        cache: Optional[CachedPrefix] = None
+    ) -> LLMResult:
+        """Generate a completion with the primary provider."""
+        return await self._call(self.primary, prompt, generation_config, cache)
+
+class FallbackPolicy(RoutingPolicy):
+    """Retry on the secondary provider when the primary fails."""
+
+    def __init__(self, primary: LLMProvider, secondary: LLMProvider, tracker: Optional[LatencyTracker] = None):
+        """Initialize policy with primary and secondary providers."""
+        super().__init__(primary, tracker)
+        self.secondary = secondary
+
+    async def complete(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        cache: Optional[CachedPrefix] = None
+    ) -> LLMResult:
+        """Generate a completion, falling back on primary errors."""
+        try:
+            return await self._call(self.primary, prompt, generation_config, cache)
+        except Exception as e:
+            logger.warning("Primary provider %s failed, falling back to %s: %s",
+                           self.primary.label, self.secondary.label, e)
+            return await self._call(self.secondary, prompt, generation_config)
+
+class HedgedPolicy(FallbackPolicy):
+    """Send a duplicate request to the secondary provider when the primary is slow.
+
+    The hedge fires after a fixed delay, or after the primary's observed latency
+    percentile once enough samples exist. The first successful answer wins and
+    the other request is cancelled.
+    """
+
+    def __init__(
+        self,
+        primary: LLMProvider,
+        secondary: LLMProvider,
+        tracker: Optional[LatencyTracker] = None,
+        hedge_delay: Optional[float] = None,
+        percentile: float = 0.95,
+        min_delay: float = 0.5,
+        max_delay: float = 10.0
+    ):
+        """Initialize hedging policy."""
+        super().__init__(primary, secondary, tracker)
+        self.hedge_delay = hedge_delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    def current_delay(self) -> float:
+        """Delay after which the hedge request is sent."""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        observed = self.tracker.percentile(self.primary.label, self.percentile)
+        if observed is None:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, observed))
+
+    async def complete(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        cache: Optional[CachedPrefix] = None
+    ) -> LLMResult:
+        """Generate a completion, hedging slow primary calls."""
+        delay = self.current_delay()
+        primary = asyncio.create_task(self._call(self.primary, prompt, generation_config, cache))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if primary in done:
+                if primary.exception() is None:
+                    return primary.result()
+                logger.warning("Primary provider %s failed, routing to %s: %s",
+                               self.primary.label, self.secondary.label, primary.exception())
+                return await self._call(self.secondary, prompt, generation_config)
+
+            logger.info("Hedging request to %s after %.2fs", self.secondary.label, delay)
+            pending.add(asyncio.create_task(self._call(self.secondary, prompt, generation_config)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+ROUTING_POLICIES = ("single", "fallback", "hedged")
+
+@lru_cache()
+def get_routing_policy() -> RoutingPolicy:
+    """Build the process-wide routing policy from settings."""
+    settings = get_settings()
+    policy = settings.LLM_ROUTING_POLICY
+    if policy not in ROUTING_POLICIES:
+        raise ServiceError(f"Unknown LLM routing policy: {policy}")
+
+    tracker = LatencyTracker(window=settings.LLM_LATENCY_WINDOW)
+    primary = create_provider(settings.LLM_PRIMARY_PROVIDER, settings.LLM_PRIMARY_MODEL, settings)
+    if policy == "single":
+        return SinglePolicy(primary, tracker)
+
+    secondary = create_provider(
+        settings.LLM_SECONDARY_PROVIDER or settings.LLM_PRIMARY_PROVIDER,
+        settings.LLM_SECONDARY_MODEL or settings.LLM_PRIMARY_MODEL,
+        settings
+    )
+    if policy == "fallback":
+        return FallbackPolicy(primary, secondary, tracker)
+    return HedgedPolicy(
+        primary,
+        secondary,
+        tracker,
+        hedge_delay=settings.LLM_HEDGE_DELAY,
+        percentile=settings.LLM_HEDGE_PERCENTILE,
+        min_delay=settings.LLM_HEDGE_MIN_DELAY,
+        max_delay=settings.LLM_HEDGE_MAX_DELAY
+    )
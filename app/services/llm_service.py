@@ -1,77 +1,194 @@
 import logging
-import google.generativeai as genai
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
 from app.core.exceptions import ServiceError
+from app.services.llm_providers import DEFAULT_GENERATION_CONFIG, LLMResult
+from app.services.llm_router import RoutingPolicy
+from app.services.prompt_builder import AssembledPrompt, PromptBuilder, document_prefix, turn_suffix
+
+if TYPE_CHECKING:
+    from app.services.context_cache import ContextCacheManager
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class StageStats:
+    """Token usage and latency of one chat stage."""
+    stage: str
+    calls: int = 0
+    cached: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    seconds: float = 0.0
+    
+    def add(self, result: LLMResult) -> None:
+        """Account for one provider call."""
+        self.calls += 1
+        self.input_tokens += result.input_tokens
+        self.output_tokens += result.output_tokens
+        self.cached_input_tokens += result.cached_tokens
+
 class LLMService:
-    """Service for interacting with Google's Gemini API."""
+    """Service for generating document answers through the configured LLM providers."""
     
-    def __init__(self, api_key: str):
-        """Initialize Gemini API."""
-        self.api_key = api_key
-        genai.configure(api_key=api_key)
-        logger.info("Gemini service initialized")
+    def __init__(
+        self,
+        router: RoutingPolicy,
+        context_cache: Optional["ContextCacheManager"] = None,
+        prompt_builder: Optional[PromptBuilder] = None
+    ):
+        """Initialize service with a routing policy, optional provider-side prefix cache and prompt budget."""
+        self.router = router
+        self.context_cache = context_cache
+        self.prompt_builder = prompt_builder or PromptBuilder()
     
-    def generate_response(self, context: str, query: str) -> str:
-        """Generate a response using Google Gemini API."""
-        logger.info(f"Generating response for query: {query[:50]}...")
+    @staticmethod
+    def document_prefix(context: str) -> str:
+        """Stable start of every prompt for a document, suitable for provider-side caching."""
+        return document_prefix(context)
+    
+    @staticmethod
+    def turn_suffix(query: str) -> str:
+        """Per-turn end of the prompt."""
+        return turn_suffix(query)
+    
+    def _assemble(
+        self,
+        context: str,
+        query: str,
+        document_id: Optional[str],
+        history: Sequence[Dict[str, Any]],
+        summary: Optional[str]
+    ) -> AssembledPrompt:
+        """Build a budgeted prompt and log its size."""
+        prompt = self.prompt_builder.build(context, query, history, summary)
+        logger.info(
+            "Assembled prompt for document %s: %s tokens (system %s, document %s, summary %s, history %s, question %s), "
+            "max output %s, %d messages dropped%s",
+            document_id, prompt.sizes["total"], prompt.sizes["system"], prompt.sizes["document"], prompt.sizes["summary"],
+            prompt.sizes["history"], prompt.sizes["question"], prompt.max_output_tokens, prompt.dropped_messages,
+            ", document truncated" if prompt.truncated else ""
+        )
+        return prompt
+    
+    async def answer(
+        self,
+        context: str,
+        query: str,
+        document_id: Optional[str] = None,
+        history: Sequence[Dict[str, Any]] = (),
+        summary: Optional[str] = None
+    ) -> Tuple[str, StageStats]:
+        """Answer a query over the full document in one call, with usage stats.
         
-        try:
-            # Check for empty context
-            if not context or len(context) < 10:
-                return "Error: No document content available to answer your question."
-                
-            # Create a prompt with the document content and query
-            prompt = f"""I have a document with the following content:
-
-                        {context}
-
-                        Based on this document, please answer the following question:
+        With a document id and a context cache, the document prefix is sent
+        from the provider's cache instead of on every turn. Earlier turns
+        (`history`, after the rolling `summary`) are included within the
+        prompt budget.
+        """
+        stats = StageStats("answer")
+        
+        # Check for empty context
+        if not context or len(context) < 10:
+            return "Error: No document content available to answer your question.", stats
+        
+        # Split the prompt into the document prefix and this turn's history and question
+        prompt = self._assemble(context, query, document_id, history, summary)
+        
+        # Generate response
+        started = time.perf_counter()
+        if self.context_cache and document_id:
+            result = await self.context_cache.complete(document_id, prompt.prefix, prompt.suffix, prompt.generation_config)
+        else:
+            result = await self.router.complete(prompt.prefix + prompt.suffix, prompt.generation_config)
+        stats.add(result)
+        stats.seconds = round(time.perf_counter() - started, 3)
+        return result.text, stats
+    
+    async def stream_answer(
+        self,
+        context: str,
+        query: str,
+        stats: StageStats,
+        document_id: Optional[str] = None,
+        history: Sequence[Dict[str, Any]] = (),
+        summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Answer like `answer`, yielding the text as it is generated and filling `stats`.
+        
+        When the document prefix would be served from the context cache, the
+        cached answer is yielded in one piece instead, since the cache saves
+        more than streaming gains.
+        """
+        if not context or len(context) < 10:
+            yield "Error: No document content available to answer your question."
+            return
+        
+        prompt = self._assemble(context, query, document_id, history, summary)
+        started = time.perf_counter()
+        if self.context_cache and document_id and self.context_cache.usable(self.router.primary, prompt.prefix):
+            result = await self.context_cache.complete(document_id, prompt.prefix, prompt.suffix, prompt.generation_config)
+            stats.add(result)
+            yield result.text
+        else:
+            text = []
+            last = None
+            async for piece in self.router.stream(prompt.prefix + prompt.suffix, prompt.generation_config):
+                text.append(piece.text)
+                last = piece
+                if piece.text:
+                    yield piece.text
+            if last is not None:
+                stats.add(LLMResult("".join(text), last.provider, last.input_tokens, last.output_tokens, last.cached_tokens))
+        stats.seconds = round(time.perf_counter() - started, 3)
+    
+    @staticmethod
+    def passages_prompt(passages: List[Dict[str, Any]], query: str) -> str:
+        """Prompt asking a question of numbered passages from several documents."""
+        excerpts = "\n\n".join(
+            f"[{i}] {passage.get('filename') or passage['document_id']} (document {passage['document_id']}), "
+            f"page {passage['page_number']}:\n{passage['text']}"
+            for i, passage in enumerate(passages, start=1)
+        )
+        return f"""I have excerpts from several documents. Each excerpt is numbered and labelled with its source document and page.
+                        
+                        {excerpts}
+                        
+                        Based on these excerpts, please answer the following question:
                         {query}
-
-                        If you can find information related to the query in the document, please answer based on that information.
-                        If the document doesn't specifically mention the exact information asked, please try to infer from related content or clearly state that the specific information isn't available in the document.
+                        
+                        Cite the excerpts you use by their numbers, e.g. [1], and say which document each fact comes from.
+                        If the excerpts don't contain the information asked, clearly state that it isn't available in the documents.
                         """
-            
-            # Generate response
-            model = genai.GenerativeModel('gemma-3-27b-it')
-            
-            generation_config = {
-                "temperature": 0.4,
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 2048,
-            }
-            
-            safety_settings = [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-            ]
-            
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
+    
+    async def answer_passages(self, passages: List[Dict[str, Any]], query: str) -> Tuple[str, StageStats]:
+        """Answer a query from passages of several documents in one call, with usage stats."""
+        stats = StageStats("answer")
+        if not passages:
+            return "Error: No document content available to answer your question.", stats
+        
+        started = time.perf_counter()
+        result = await self.router.complete(
+            self.passages_prompt(passages, query),
+            {**DEFAULT_GENERATION_CONFIG, "max_output_tokens": self.prompt_builder.output_tokens}
+        )
+        stats.add(result)
+        stats.seconds = round(time.perf_counter() - started, 3)
+        return result.text, stats
+    
+    async def generate_response(self, context: str, query: str) -> str:
+        """Generate a response using the routed LLM providers."""
+        logger.info("Generating response for query: %s...", query[:50])
+        
+        try:
+            response, _ = await self.answer(context, query)
             
             logger.info("Response generated successfully")
-            return response.text
-            
+            return response
+        
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return f"Error generating response: {str(e)}"
\ No newline at end of file
+            logger.error("Error generating response: %s", e)
+            return f"Error generating response: {str(e)}"
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.llm_providers import estimate_tokens
+from app.services.llm_router import RoutingPolicy
+from app.services.llm_service import StageStats
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+NO_ANSWER = "NO_RELEVANT_INFORMATION"
+
+MAP_PROMPT = """Below is an excerpt (pages {first_page}-{last_page}) of a longer document.
+
+{text}
+
+Question: {query}
+
+Answer the question using only this excerpt and mention the page numbers you used.
+If the excerpt contains nothing relevant to the question, reply with exactly {no_answer}.
+"""
+
+REDUCE_PROMPT = """Several parts of a long document were searched separately for the answer to a question.
+
+Question: {query}
+
+Partial answers, each labelled with the pages it is based on:
+
+{partials}
+
+Combine the partial answers into one complete answer to the question. Resolve
+duplicates and contradictions, keep the page references, and do not add
+information that is not in the partial answers.
+"""
+
+@dataclass
+class Chunk:
+    """A run of consecutive pages that fits in one model call."""
+    index: int
+    first_page: int
+    last_page: int
+    text: str
+
+def split_into_chunks(pages: List[Dict[str, Any]], chunk_tokens: int) -> List[Chunk]:
+    """Pack pages into chunks of at most `chunk_tokens` estimated tokens.
+
+    Chunks are page-aligned so their boundaries, and therefore their cache
+    keys, stay stable as more pages of a partial document arrive. A single
+    page larger than the budget is split on its own.
+    """
+    max_chars = chunk_tokens * 4
+    chunks: List[Chunk] = []
+    buffer: List[str] = []
+    first_page = last_page = None
+
+    def flush() -> None:
+        if buffer:
+            chunks.append(Chunk(len(chunks), first_page, last_page, "\n\n".join(buffer)))
+            buffer.clear()
+
+    for page in pages:
+        text = (page.get("markdown") or "").strip()
+        if not text:
+            continue
+        number = page.get("page_number")
+        if buffer and estimate_tokens("\n\n".join(buffer + [text])) > chunk_tokens:
+            flush()
+        if not buffer:
+            first_page = number
+        last_page = number
+        if len(text) <= max_chars:
+            buffer.append(text)
+            continue
+        for start in range(0, len(text), max_chars):
+            buffer.append(text[start:start + max_chars])
+            flush()
+            first_page = number
+    flush()
+    return chunks
+
+def chunk_cache_key(chunk: Chunk, query: str, model: str) -> str:
+    """Content-addressed cache key of a chunk answer."""
+    normalized = " ".join(query.lower().split())
+    digest = hashlib.sha256()
+    for part in (model, normalized, chunk.text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class MapReduceService:
+    """Answers questions over documents larger than the model context.
+
+    The document is split into page-aligned chunks, the question is asked of
+    every chunk in parallel (at most `concurrency` calls at a time), and the
+    relevant partial answers are reduced into one response. Chunk answers are
+    cached by chunk content and question, so a repeated question only pays for
+    chunks that changed and the reduce step.
+    """
+
+    def __init__(self, router: RoutingPolicy, document_store: DocumentStore, chunk_tokens: int = 24000, concurrency: int = 4):
+        """Initialize service."""
+        self.router = router
+        self.document_store = document_store
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+
+    async def _map_chunk(
+        self,
+        document_id: str,
+        chunk: Chunk,
+        query: str,
+        stats: StageStats,
+        semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
+        """Answer the question from one chunk, using the cache when possible."""
+        key = chunk_cache_key(chunk, query, self.router.primary.label)
+        cached = self.document_store.get_chunk_answer(document_id, key)
+        if cached is not None:
+            stats.cached += 1
+            answer = cached["answer"]
+        else:
+            prompt = MAP_PROMPT.format(
+                first_page=chunk.first_page, last_page=chunk.last_page,
+                text=chunk.text, query=query, no_answer=NO_ANSWER
+            )
+            async with semaphore:
+                result = await self.router.complete(prompt)
+            stats.add(result)
+            answer = result.text.strip()
+            self.document_store.save_chunk_answer(document_id, key, {
+                "answer": answer,
+                "pages": [chunk.first_page, chunk.last_page],
+                "created_at": time.time(),
+            })
+        return None if answer.startswith(NO_ANSWER) else answer
+
+    async def _reduce_group(self, query: str, group: List[str], stats: StageStats, semaphore: asyncio.Semaphore) -> str:
+        """Combine one group of partial answers."""
+        if len(group) == 1:
+            return group[0]
+        async with semaphore:
+            result = await self.router.complete(REDUCE_PROMPT.format(query=query, partials="\n\n---\n\n".join(group)))
+        stats.add(result)
+        return result.text.strip()
+
+    async def _reduce(self, query: str, partials: List[str], stats: StageStats) -> str:
+        """Combine partial answers, in rounds when they do not fit in one call."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while len(partials) > 1:
+            groups: List[List[str]] = [[]]
+            for partial in partials:
+                if groups[-1] and estimate_tokens("\n\n".join(groups[-1] + [partial])) > self.chunk_tokens:
+                    groups.append([])
+                groups[-1].append(partial)
+            if len(groups) == len(partials):
+                # Every partial fills a call on its own; combine pairwise so each round shrinks
+                groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+            partials = list(await asyncio.gather(*(
+                self._reduce_group(query, group, stats, semaphore) for group in groups
+            )))
+        return partials[0]
+
+    async def generate_response(self, document_id: str, pages: List[Dict[str, Any]], query: str) -> Tuple[str, List[StageStats]]:
+        """Answer a query over all pages with map-reduce; returns the answer and per-stage stats."""
+        logger.info("Generating map-reduce response for document %s, query: %s...", document_id, query[:50])
+        map_stats = StageStats("map")
+        reduce_stats = StageStats("reduce")
+
+        chunks = split_into_chunks(pages, self.chunk_tokens)
+        if not chunks:
+            return "Error: No document content available to answer your question.", [map_stats, reduce_stats]
+
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        answers = await asyncio.gather(*(
+            self._map_chunk(document_id, chunk, query, map_stats, semaphore) for chunk in chunks
+        ))
+        map_stats.seconds = round(time.perf_counter() - started, 3)
+
+        partials = [
+            f"Pages {chunk.first_page}-{chunk.last_page}:\n{answer}"
+            for chunk, answer in zip(chunks, answers) if answer is not None
+        ]
+        logger.debug("Map stage: %d chunks, %d relevant, %d cached", len(chunks), len(partials), map_stats.cached)
+        if not partials:
+            return "The document doesn't appear to contain information about this question.", [map_stats, reduce_stats]
+
+        started = time.perf_counter()
+        if len(partials) == 1:
+            response = answers[next(i for i, answer in enumerate(answers) if answer is not None)]
+        else:
+            response = await self._reduce(query, partials, reduce_stats)
+        reduce_stats.seconds = round(time.perf_counter() - started, 3)
+        return response, [map_stats, reduce_stats]
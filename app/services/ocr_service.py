@@ -1,27 +1,55 @@
 import os
+import re
 import tempfile
+import threading
 import logging
-from typing import Dict, Any
-from mistralai import Mistral
-from mistralai import DocumentURLChunk, ImageURLChunk
-from mistralai.models import OCRResponse
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 
+from app.config import get_settings
 from app.core.exceptions import ServiceError
+from app.services.image_service import render_markdown
+
+if TYPE_CHECKING:
+    from mistralai.models import OCRResponse
 
 logger = logging.getLogger(__name__)
 
+# How the OCR API rejects a page range that starts past the last page
+_PAGE_RANGE_ERROR = re.compile(r"page.*(out of (range|bounds)|exceed|does not exist|invalid)", re.IGNORECASE)
+
+class PageRangeError(ServiceError):
+    """Raised when the requested pages lie past the end of the document."""
+
 class OCRService:
-    """Service for interacting with Mistral API."""
+    """Service for interacting with Mistral API.
     
-    def __init__(self, api_key: str):
-        """Initialize Mistral client."""
+    The `mistralai` SDK is imported and the client created on first use, so
+    workers that never run OCR do not pay for it at startup.
+    """
+    
+    def __init__(self, api_key: Optional[str]):
+        """Initialize service."""
         self.api_key = api_key
-        self.client = Mistral(api_key=api_key)
-        logger.info("Mistral service initialized")
+        self._client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """Mistral client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    if not self.api_key:
+                        raise ServiceError("MISTRAL_API_KEY is not configured")
+                    from mistralai import Mistral
+                    self._client = Mistral(api_key=self.api_key)
+                    logger.info("Mistral service initialized")
+        return self._client
     
     def upload_pdf(self, content: bytes, filename: str) -> str:
         """Upload a PDF to Mistral's API and retrieve a signed URL for processing."""
-        logger.info(f"Uploading PDF: {filename}")
+        logger.info("Uploading PDF: %s", filename)
         
         try:
             with tempfile.TemporaryDirectory() as temp_dir:
@@ -37,23 +65,30 @@ class OCRService:
                     )
                 
                 signed_url = self.client.files.get_signed_url(file_id=file_upload.id)
-                logger.info(f"PDF uploaded successfully, signed URL obtained")
+                logger.info("PDF uploaded successfully, signed URL obtained")
                 return signed_url.url
-                
+        
         except Exception as e:
-            logger.error(f"Error uploading PDF: {str(e)}")
+            logger.error("Error uploading PDF: %s", e)
             raise ServiceError(f"Error uploading PDF: {str(e)}")
     
-    def process_ocr(self, document_source: Dict[str, Any]) -> OCRResponse:
-        """Process document with OCR API based on source type."""
-        logger.info(f"Processing OCR for document source type: {document_source['type']}")
+    def process_ocr(self, document_source: Dict[str, Any], pages: Optional[List[int]] = None) -> "OCRResponse":
+        """Process document with OCR API based on source type.
+        
+        `pages` restricts document sources to the given zero-based page indices;
+        a range past the last page raises `PageRangeError`.
+        """
+        logger.info("Processing OCR for document source type: %s", document_source['type'])
         
         try:
+            from mistralai import DocumentURLChunk, ImageURLChunk
+            
             if document_source["type"] == "document_url":
                 return self.client.ocr.process(
                     document=DocumentURLChunk(document_url=document_source["document_url"]),
                     model="mistral-ocr-latest",
-                    include_image_base64=True
+                    include_image_base64=True,
+                    **({"pages": pages} if pages is not None else {})
                 )
             elif document_source["type"] == "image_url":
                 return self.client.ocr.process(
@@ -63,24 +98,27 @@ class OCRService:
                 )
             else:
                 raise ServiceError(f"Unsupported document source type: {document_source['type']}")
-                
+        
         except Exception as e:
-            logger.error(f"Error processing OCR: {str(e)}")
+            if pages is not None and _PAGE_RANGE_ERROR.search(str(e)):
+                raise PageRangeError(f"Error processing OCR: {str(e)}")
+            logger.error("Error processing OCR: %s", e)
             raise ServiceError(f"Error processing OCR: {str(e)}")
     
     def replace_images_in_markdown(self, markdown_str: str, images_dict: dict) -> str:
-        """Replace image placeholders with base64 encoded images in markdown."""
-        for img_name, base64_str in images_dict.items():
-            markdown_str = markdown_str.replace(f"![{img_name}]({img_name})", f"![{img_name}]({base64_str})")
-        return markdown_str
+        """Replace image placeholders with base64 encoded images in markdown, in one pass."""
+        return render_markdown(markdown_str, images_dict, images_dict.get)
     
-    def get_combined_markdown(self, ocr_response: OCRResponse) -> str:
+    def get_combined_markdown(self, ocr_response: "OCRResponse") -> str:
         """Combine markdown from all pages with their respective images."""
-        markdowns = list[str] = []
+        markdowns: List[str] = []
         for page in ocr_response.pages:
-            image_data = {}
-            for img in page.images:
-                image_data[img.id] = img.image_base64
+            image_data = {img.id: img.image_base64 for img in page.images}
             markdowns.append(self.replace_images_in_markdown(page.markdown, image_data))
+        
+        return "\n\n".join(markdowns)
 
-        return "\n\n".join(markdowns)
\ No newline at end of file
+@lru_cache()
+def get_ocr_service() -> OCRService:
+    """Process-wide OCR service, so the client is created once per worker."""
+    return OCRService(get_settings().MISTRAL_API_KEY)
\ No newline at end of file
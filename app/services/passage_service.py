@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import Settings, get_settings
+from app.core.exceptions import NotFoundError
+from app.services.llm_providers import estimate_tokens
+from app.storage.document_store import DocumentStore
+from app.storage.search_index import B, K1, strip_markdown_images, tokenize
+
+logger = logging.getLogger(__name__)
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Bump when the passage layout changes so stored states are rebuilt
+STATE_VERSION = 1
+
+def split_passages(pages: List[Dict[str, Any]], passage_tokens: int) -> List[Dict[str, Any]]:
+    """Split pages into passages of about `passage_tokens` tokens.
+
+    Passages never cross pages; paragraphs are kept whole where they fit,
+    and longer paragraphs are cut on character boundaries.
+    """
+    max_chars = passage_tokens * 4
+    passages = []
+    for page in pages:
+        buffer: List[str] = []
+        size = 0
+
+        def flush() -> None:
+            nonlocal buffer, size
+            text = "\n\n".join(buffer).strip()
+            if text:
+                terms = tokenize(text)
+                passages.append({
+                    "page_number": page["page_number"],
+                    "text": text,
+                    "length": len(terms),
+                    "tf": dict(Counter(terms)),
+                })
+            buffer, size = [], 0
+
+        text = strip_markdown_images(page.get("markdown") or "")
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            paragraph = paragraph.strip()
+            while len(paragraph) > max_chars:
+                flush()
+                buffer, size = [paragraph[:max_chars]], max_chars
+                paragraph = paragraph[max_chars:]
+            if buffer and size + len(paragraph) > max_chars:
+                flush()
+            if paragraph:
+                buffer.append(paragraph)
+                size += len(paragraph)
+        flush()
+    return passages
+
+def content_fingerprint(document: Dict[str, Any]) -> str:
+    """Hash of the page text a passage state was built from."""
+    digest = hashlib.sha1(f"{STATE_VERSION}".encode("ascii"))
+    for page in document.get("pages") or []:
+        digest.update(f"\0{page.get('page_number')}\0".encode("utf-8"))
+        digest.update((page.get("markdown") or "").encode("utf-8"))
+    return digest.hexdigest()
+
+class PassageService:
+    """Retrieves the passages most relevant to a question across several documents.
+
+    Each document's passages and term statistics are built once and stored
+    next to its chat history, so they are only rebuilt when its pages change;
+    recently used states are also kept in memory. A question is scored with
+    BM25 over the selected documents only, and passages are chosen under one
+    shared token budget, starting with the best passage of every document so
+    each one is represented.
+    """
+
+    def __init__(self, document_store: DocumentStore, passage_tokens: int = 300, cache_documents: int = 256):
+        """Initialize service."""
+        self.store = document_store
+        self.passage_tokens = passage_tokens
+        self.cache_documents = cache_documents
+        self._states: "OrderedDict[str, Tuple[Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, document_store: DocumentStore, settings: Settings) -> "PassageService":
+        """Build a service from application settings."""
+        return cls(
+            document_store,
+            passage_tokens=settings.CHAT_PASSAGE_TOKENS,
+            cache_documents=settings.CHAT_PASSAGE_CACHE_DOCUMENTS
+        )
+
+    def state(self, document_id: str) -> Dict[str, Any]:
+        """Passages and document frequencies of a document, building them if its pages changed."""
+        version = self.store.get_document_version(document_id)
+        with self._lock:
+            cached = self._states.get(document_id)
+            if cached is not None and version is not None and cached[0] == version:
+                self._states.move_to_end(document_id)
+                return cached[1]
+
+        document = self.store.get_document(document_id)
+        if not document:
+            raise NotFoundError(f"Document not found: {document_id}")
+        fingerprint = content_fingerprint(document)
+        state = self.store.get_passages(document_id)
+        if state is None or state.get("fingerprint") != fingerprint:
+            passages = split_passages(document.get("pages") or [], self.passage_tokens)
+            df: Counter = Counter()
+            for passage in passages:
+                df.update(passage["tf"].keys())
+            state = {"fingerprint": fingerprint, "passages": passages, "df": dict(df)}
+            self.store.save_passages(document_id, state)
+            logger.debug("Built %d passages for document %s", len(passages), document_id)
+        state["filename"] = document.get("filename")
+
+        with self._lock:
+            self._states[document_id] = (version, state)
+            self._states.move_to_end(document_id)
+            while len(self._states) > self.cache_documents:
+                self._states.popitem(last=False)
+        return state
+
+    async def gather(self, document_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """States of several documents, loaded in parallel."""
+        states = await asyncio.gather(*(asyncio.to_thread(self.state, document_id) for document_id in document_ids))
+        return dict(zip(document_ids, states))
+
+    def select(self, states: Dict[str, Dict[str, Any]], query: str, budget_tokens: int) -> List[Dict[str, Any]]:
+        """Passages to answer a query from, within the token budget, in document and page order."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        total = sum(len(state["passages"]) for state in states.values())
+        if not total:
+            return []
+        avg_length = sum(p["length"] for state in states.values() for p in state["passages"]) / total or 1.0
+        idf = {}
+        for term in terms:
+            df = sum(state["df"].get(term, 0) for state in states.values())
+            idf[term] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+        scored: List[Tuple[float, str, int]] = []
+        for document_id, state in states.items():
+            for position, passage in enumerate(state["passages"]):
+                score = 0.0
+                for term in terms:
+                    tf = passage["tf"].get(term)
+                    if tf:
+                        norm = tf + K1 * (1 - B + B * passage["length"] / avg_length)
+                        score += idf[term] * tf * (K1 + 1) / norm
+                scored.append((score, document_id, position))
+
+        best_per_document: Dict[str, Tuple[float, str, int]] = {}
+        for item in scored:
+            if item[0] > 0 and (item[1] not in best_per_document or item[0] > best_per_document[item[1]][0]):
+                best_per_document[item[1]] = item
+        order = {document_id: i for i, document_id in enumerate(states)}
+        if best_per_document:
+            # Documents without a match are still represented by their opening passage
+            leading = [
+                (0.0, document_id, 0) for document_id, state in states.items()
+                if document_id not in best_per_document and state["passages"]
+            ]
+            ranked = sorted((item for item in scored if item[0] > 0), reverse=True)
+            candidates = sorted(best_per_document.values(), reverse=True) + leading + ranked
+        else:
+            # Nothing matches the question's terms: take documents from their start, in turn
+            candidates = sorted(scored, key=lambda item: (item[2], order[item[1]]))
+
+        chosen: Dict[Tuple[str, int], float] = {}
+        used = 0
+        for score, document_id, position in candidates:
+            if (document_id, position) in chosen:
+                continue
+            cost = estimate_tokens(states[document_id]["passages"][position]["text"])
+            if used + cost > budget_tokens:
+                continue
+            chosen[(document_id, position)] = score
+            used += cost
+
+        return [
+            {
+                "document_id": document_id,
+                "filename": states[document_id].get("filename"),
+                "page_number": states[document_id]["passages"][position]["page_number"],
+                "text": states[document_id]["passages"][position]["text"],
+                "score": round(score, 4),
+            }
+            for (document_id, position), score in sorted(chosen.items(), key=lambda item: (order[item[0][0]], item[0][1]))
+        ]
+
+@lru_cache()
+def get_passage_service() -> PassageService:
+    """Process-wide passage service, so retrieval states stay in memory between requests."""
+    settings = get_settings()
+    return PassageService.from_settings(DocumentStore.from_settings(settings), settings)
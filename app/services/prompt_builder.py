@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import Settings
+from app.services.llm_providers import DEFAULT_GENERATION_CONFIG, estimate_tokens
+from app.services.llm_router import RoutingPolicy
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Tokens kept free for the question, so the document part does not depend on it
+QUESTION_TOKENS = 512
+MIN_OUTPUT_TOKENS = 256
+TRUNCATION_NOTE = "\n\n[Document truncated to fit the prompt budget]"
+
+SUMMARY_PROMPT = """Summarize this conversation about a document so that it can be continued later.
+Keep the questions asked and the facts, names, numbers and dates given in the answers.
+Write at most {words} words.
+
+{previous}Conversation:
+{turns}
+
+Summary:"""
+
+def document_prefix(context: str) -> str:
+    """Stable start of every prompt for a document, suitable for provider-side caching."""
+    return f"""I have a document with the following content:
+            
+                        {context}
+                        
+                        """
+
+def turn_suffix(query: str, history: str = "") -> str:
+    """Per-turn end of the prompt, after the conversation so far."""
+    return f"""{history}Based on this document, please answer the following question:
+                        {query}
+                        
+                        If you can find information related to the query in the document, please answer based on that information.
+                        If the document doesn't specifically mention the exact information asked, please try to infer from related content or clearly state that the specific information isn't available in the document.
+                        """
+
+def format_turns(messages: Sequence[Dict[str, Any]]) -> str:
+    """Messages as "User: ..." / "Assistant: ..." lines."""
+    return "\n".join(
+        f"{'User' if message.get('role') == 'user' else 'Assistant'}: {message.get('content', '')}"
+        for message in messages
+    )
+
+def format_history(summary: Optional[str], messages: Sequence[Dict[str, Any]]) -> str:
+    """History section of a prompt, empty when there is no history."""
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    if messages:
+        parts.append(f"Recent conversation:\n{format_turns(messages)}")
+    return "".join(f"{part}\n\n" for part in parts)
+
+@dataclass
+class AssembledPrompt:
+    """A prompt split into its cacheable document prefix and per-turn suffix."""
+    prefix: str
+    suffix: str
+    max_output_tokens: int
+    sizes: Dict[str, int] = field(default_factory=dict)
+    truncated: bool = False
+    dropped_messages: int = 0
+
+    @property
+    def generation_config(self) -> Dict[str, Any]:
+        """Generation settings with the output budget of this prompt."""
+        return {**DEFAULT_GENERATION_CONFIG, "max_output_tokens": self.max_output_tokens}
+
+class PromptBuilder:
+    """Assembles chat prompts within an explicit token budget.
+
+    The model's context window is split between the output, the fixed
+    instruction text, the document, the conversation history and the
+    question. History gets at most `history_tokens` (a rolling summary first,
+    then the newest turns that fit), and the document gets what remains,
+    independent of the question and history, so its prefix stays stable
+    between turns. Sizes are estimated locally with `estimate_tokens`.
+    """
+
+    def __init__(
+        self,
+        context_window: int = 128000,
+        output_tokens: int = 2048,
+        history_tokens: int = 4000,
+        recent_turns: int = 4
+    ):
+        """Initialize budgets, in estimated tokens."""
+        self.context_window = context_window
+        self.output_tokens = output_tokens
+        self.history_tokens = history_tokens
+        self.recent_turns = recent_turns
+        self.system_tokens = estimate_tokens(document_prefix("") + turn_suffix(""))
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "PromptBuilder":
+        """Build a prompt builder from application settings."""
+        return cls(
+            context_window=settings.LLM_CONTEXT_WINDOW,
+            output_tokens=settings.LLM_MAX_OUTPUT_TOKENS,
+            history_tokens=settings.CHAT_HISTORY_TOKENS,
+            recent_turns=settings.CHAT_HISTORY_RECENT_TURNS
+        )
+
+    @property
+    def document_tokens(self) -> int:
+        """Budget of the document part."""
+        return max(0, self.context_window - self.output_tokens - self.system_tokens - self.history_tokens - QUESTION_TOKENS)
+
+    def _fit_history(self, summary: Optional[str], messages: Sequence[Dict[str, Any]], budget: int) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """The summary and the newest messages that fit in the budget."""
+        if summary:
+            summary_tokens = estimate_tokens(summary)
+            if summary_tokens > budget:
+                summary = summary[:budget * 4]
+                summary_tokens = budget
+            budget -= summary_tokens
+        kept: List[Dict[str, Any]] = []
+        for message in reversed(messages[-self.recent_turns * 2:] if self.recent_turns else []):
+            cost = estimate_tokens(message.get("content") or "") + 2
+            if cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        kept.reverse()
+        return summary, kept
+
+    def build(
+        self,
+        document: str,
+        query: str,
+        history: Sequence[Dict[str, Any]] = (),
+        summary: Optional[str] = None
+    ) -> AssembledPrompt:
+        """Assemble the prompt for one turn."""
+        truncated = estimate_tokens(document) > self.document_tokens
+        if truncated:
+            document = document[:self.document_tokens * 4] + TRUNCATION_NOTE
+
+        question_tokens = estimate_tokens(query)
+        # A long question takes its excess from the history budget
+        history_budget = max(0, self.history_tokens - max(0, question_tokens - QUESTION_TOKENS))
+        summary, kept = self._fit_history(summary, history, history_budget)
+
+        prefix = document_prefix(document)
+        suffix = turn_suffix(query, format_history(summary, kept))
+        sizes = {
+            "system": self.system_tokens,
+            "document": estimate_tokens(document),
+            "summary": estimate_tokens(summary) if summary else 0,
+            "history": sum(estimate_tokens(message.get("content") or "") for message in kept),
+            "question": question_tokens,
+        }
+        sizes["total"] = estimate_tokens(prefix + suffix)
+        max_output = max(MIN_OUTPUT_TOKENS, min(self.output_tokens, self.context_window - sizes["total"]))
+        return AssembledPrompt(prefix, suffix, max_output, sizes, truncated, len(history) - len(kept))
+
+class HistoryCompactor:
+    """Folds older chat turns into a rolling summary stored with the chat log.
+
+    Once twice `recent_turns` turns are not covered by the summary, those
+    beyond the newest `recent_turns` are summarized together with the
+    previous summary in one model call, and the summary records the
+    timestamp of the last message it covers. Prompts then carry the summary
+    plus the messages after it, so history stays bounded however long the
+    conversation runs.
+    """
+
+    def __init__(self, router: RoutingPolicy, document_store: DocumentStore, builder: PromptBuilder, summary_tokens: int = 512):
+        """Initialize compactor."""
+        self.router = router
+        self.store = document_store
+        self.builder = builder
+        self.summary_tokens = summary_tokens
+
+    @classmethod
+    def from_settings(cls, router: RoutingPolicy, document_store: DocumentStore, settings: Settings) -> "HistoryCompactor":
+        """Build a compactor from application settings."""
+        return cls(router, document_store, PromptBuilder.from_settings(settings), settings.CHAT_SUMMARY_TOKENS)
+
+    def conversation(
+        self,
+        document_id: str,
+        messages: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Summary of a document's chat and the messages it does not cover yet.
+
+        `messages` defaults to the stored history; sessions pass the turns
+        they hold in memory.
+        """
+        entry = self.store.get_chat_summary(document_id)
+        if messages is None:
+            messages = self.store.get_chat_history(document_id)
+        if not entry:
+            return None, list(messages)
+        covered_until = entry["covered_until"]
+        return entry["summary"], [message for message in messages if (message.get("timestamp") or "") > covered_until]
+
+    def _pending(self, document_id: str) -> Optional[Tuple[int, int]]:
+        """Uncovered message count and estimated tokens from the stored counters.
+
+        None when the summary predates the counters, so the log must be read.
+        """
+        entry = self.store.get_chat_summary(document_id) or {}
+        if entry and "covered_chars" not in entry:
+            return None
+        stats = self.store.get_chat_stats(document_id)
+        count = stats["messages"] - entry.get("covered_messages", 0)
+        chars = stats["chars"] - entry.get("covered_chars", 0)
+        return count, chars // 4 + count
+
+    def _is_due(self, count: int, tokens: int) -> bool:
+        """Whether enough history is uncovered to fold some of it."""
+        # Wait until twice the recent window is uncovered, so each summary call folds several turns
+        return count >= max(4 * self.builder.recent_turns, 2) or tokens > self.builder.history_tokens
+
+    def _history(self, document_id: str) -> Tuple[Optional[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Summary, messages it covers and messages it does not, from the stored log."""
+        messages = self.store.get_chat_history(document_id)
+        summary, uncovered = self.conversation(document_id, messages)
+        return summary, messages[:len(messages) - len(uncovered)], uncovered
+
+    async def compact(self, document_id: str) -> bool:
+        """Fold turns older than the recent window into the summary; returns whether it changed.
+
+        The stored counters decide whether compaction is due, so the log is
+        only read on the turns that fold part of it. File access runs in a
+        worker thread.
+        """
+        try:
+            pending = await asyncio.to_thread(self._pending, document_id)
+            if pending is not None and not self._is_due(*pending):
+                return False
+            summary, covered, uncovered = await asyncio.to_thread(self._history, document_id)
+            uncovered_tokens = sum(estimate_tokens(message.get("content") or "") for message in uncovered)
+            if not self._is_due(len(uncovered), uncovered_tokens):
+                return False
+            keep = self.builder.recent_turns * 2
+            to_fold = uncovered[:max(len(uncovered) - keep, 1)]
+            # Fold whole turns, so a question is never summarized without its answer
+            if to_fold[-1].get("role") == "user" and len(to_fold) < len(uncovered):
+                to_fold = uncovered[:len(to_fold) + 1]
+
+            started = time.perf_counter()
+            previous = f"Summary of the conversation so far:\n{summary}\n\n" if summary else ""
+            turns = format_turns(to_fold)[:self.builder.history_tokens * 8]
+            prompt = SUMMARY_PROMPT.format(words=self.summary_tokens * 3 // 4, previous=previous, turns=turns)
+            result = await self.router.complete(
+                prompt, {**DEFAULT_GENERATION_CONFIG, "temperature": 0.2, "max_output_tokens": self.summary_tokens}
+            )
+            folded = covered + to_fold
+            await asyncio.to_thread(self.store.save_chat_summary, document_id, {
+                "summary": result.text.strip(),
+                "covered_until": to_fold[-1].get("timestamp") or "",
+                "covered_messages": len(folded),
+                "covered_chars": sum(len(message.get("content") or "") for message in folded),
+                "updated_at": time.time(),
+            })
+            logger.info("Compacted %d chat messages of document %s into a %d token summary in %.2fs",
+                        len(to_fold), document_id, estimate_tokens(result.text), time.perf_counter() - started)
+            return True
+        except Exception as e:
+            logger.warning("Could not compact chat history of document %s: %s", document_id, e)
+            return False
@@ -0,0 +1,317 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.exceptions import NotFoundError, ValidationError
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR_CELL = re.compile(r"^:?-{3,}:?$")
+NUMBER = re.compile(r"^[+-]?(\d{1,3}(,\d{3})+|\d+)?(\.\d+)?$")
+CURRENCY_SYMBOLS = "$€£¥₹"
+EMPTY_CELLS = {"", "-", "—", "–", "n/a", "na"}
+TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "by", "for", "from", "in", "is", "of", "on",
+    "the", "to", "was", "were", "what", "which", "with", "how", "much", "many", "did",
+}
+
+AGGREGATES = ("sum", "avg", "min", "max", "count")
+AGGREGATE_WORDS = {
+    "total": "sum", "sum": "sum",
+    "average": "avg", "mean": "avg", "avg": "avg",
+    "highest": "max", "maximum": "max", "max": "max", "largest": "max",
+    "lowest": "min", "minimum": "min", "min": "min", "smallest": "min",
+}
+FILTER_OPS = ("eq", "ne", "gt", "gte", "lt", "lte", "contains")
+# Row labels of a table's own totals, left out of aggregates over its rows
+TOTAL_LABEL = re.compile(r"^\W*(grand\s+|sub-?)?totals?\b", re.IGNORECASE)
+
+def _tokens(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords."""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+def _split_row(line: str) -> List[str]:
+    """Cells of a markdown table row."""
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+def parse_markdown_tables(markdown: str) -> List[Tuple[List[str], List[List[str]]]]:
+    """Find pipe tables in markdown; returns (headers, rows) for each."""
+    tables = []
+    lines = markdown.splitlines()
+    i = 0
+    while i < len(lines) - 1:
+        header, separator = lines[i].strip(), lines[i + 1].strip()
+        separator_cells = _split_row(separator) if separator.startswith("|") else []
+        if header.startswith("|") and separator_cells and all(SEPARATOR_CELL.match(c) for c in separator_cells):
+            headers = _split_row(header)
+            rows = []
+            i += 2
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                cells = _split_row(lines[i])
+                rows.append((cells + [""] * len(headers))[:len(headers)])
+                i += 1
+            if rows:
+                tables.append((headers, rows))
+        else:
+            i += 1
+    return tables
+
+def parse_number(cell: str) -> Tuple[Optional[float], str]:
+    """Parse a numeric cell such as "$1,234.50", "(12)" or "7.5%"; returns (value, unit).
+
+    The value is None when the cell is not a number.
+    """
+    text = cell.strip().replace(" ", "")
+    negative = False
+    unit = ""
+    # Sign, parentheses and currency symbol may come in either order: "-$5", "$(5)", "($5)"
+    for _ in range(2):
+        if text.startswith("-"):
+            negative, text = not negative, text[1:]
+        if text.startswith("(") and text.endswith(")"):
+            negative, text = not negative, text[1:-1]
+        if text and text[0] in CURRENCY_SYMBOLS and not unit:
+            unit, text = text[0], text[1:]
+    if not unit and text.endswith("%"):
+        unit, text = "%", text[:-1]
+    if not text or not NUMBER.match(text) or not any(c.isdigit() for c in text):
+        return None, ""
+    value = float(text.replace(",", ""))
+    return (-value if negative else value), unit
+
+def build_table(table_id: str, page: int, headers: List[str], rows: List[List[str]]) -> Dict[str, Any]:
+    """Convert parsed rows into a typed columnar table."""
+    columns = []
+    data: Dict[str, List[Any]] = {}
+    seen: Dict[str, int] = {}
+    for index, header in enumerate(headers):
+        name = header or f"column_{index + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+
+        cells = [row[index] for row in rows]
+        parsed = [parse_number(cell) if cell.lower() not in EMPTY_CELLS else (None, None) for cell in cells]
+        present = [p for p, cell in zip(parsed, cells) if cell.lower() not in EMPTY_CELLS]
+        units = {unit for _, unit in present}
+        if present and all(value is not None for value, _ in present) and len(units) == 1:
+            columns.append({"name": name, "type": "number", "unit": units.pop()})
+            data[name] = [value for value, _ in parsed]
+        else:
+            columns.append({"name": name, "type": "string", "unit": ""})
+            data[name] = [None if cell.lower() in EMPTY_CELLS else cell for cell in cells]
+    return {"table_id": table_id, "page": page, "columns": columns, "row_count": len(rows), "data": data}
+
+def extract_tables(pages: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Typed columnar tables from every page's markdown."""
+    tables = []
+    for page in pages:
+        page_number = page.get("page_number")
+        for index, (headers, rows) in enumerate(parse_markdown_tables(page.get("markdown") or "")):
+            tables.append(build_table(f"p{page_number}-t{index + 1}", page_number, headers, rows))
+    return tables
+
+def format_value(value: Any, unit: str) -> str:
+    """Display a typed cell value."""
+    if value is None:
+        return "n/a"
+    if isinstance(value, float):
+        sign, value = ("-" if value < 0 else ""), abs(value)
+        text = f"{value:,.2f}".rstrip("0").rstrip(".") if value != int(value) else f"{int(value):,}"
+        if unit == "%":
+            return f"{sign}{text}%"
+        return f"{sign}{unit}{text}"
+    return str(value)
+
+def _matches(value: Any, op: str, operand: Any) -> bool:
+    """Evaluate one filter against a cell."""
+    if value is None:
+        return False
+    if op == "contains":
+        return str(operand).lower() in str(value).lower()
+    if isinstance(value, float):
+        try:
+            operand = float(operand)
+        except (TypeError, ValueError):
+            return False
+    elif op in ("eq", "ne"):
+        value, operand = str(value).lower(), str(operand).lower()
+    if op == "eq":
+        return value == operand
+    if op == "ne":
+        return value != operand
+    try:
+        return {"gt": value > operand, "gte": value >= operand, "lt": value < operand, "lte": value <= operand}[op]
+    except TypeError:
+        return False
+
+def _aggregate(func: str, values: List[Any]) -> Optional[float]:
+    """Apply an aggregate to non-null values."""
+    present = [value for value in values if value is not None]
+    if func == "count":
+        return float(len(present))
+    numbers = [value for value in present if isinstance(value, float)]
+    if not numbers:
+        return None
+    if func == "sum":
+        return sum(numbers)
+    if func == "avg":
+        return sum(numbers) / len(numbers)
+    return min(numbers) if func == "min" else max(numbers)
+
+def query_table(
+    table: Dict[str, Any],
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Dict[str, Any]]] = None,
+    aggregate: Optional[Dict[str, str]] = None,
+    group_by: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List[str], List[List[Any]]]:
+    """Filter, project and optionally aggregate a columnar table; returns (column names, rows)."""
+    data = table["data"]
+    names = [column["name"] for column in table["columns"]]
+    for name in (columns or []) + [f["column"] for f in filters or []] + ([group_by] if group_by else []):
+        if name not in data:
+            raise ValidationError(f"Unknown column: {name}")
+    for f in filters or []:
+        if f["op"] not in FILTER_OPS:
+            raise ValidationError(f"Unknown filter operator: {f['op']}")
+
+    selected = [
+        i for i in range(table["row_count"])
+        if all(_matches(data[f["column"]][i], f["op"], f.get("value")) for f in filters or [])
+    ]
+
+    if aggregate:
+        func, column = aggregate["func"], aggregate.get("column")
+        if func not in AGGREGATES:
+            raise ValidationError(f"Unknown aggregate: {func}")
+        if column is not None and column not in data:
+            raise ValidationError(f"Unknown column: {column}")
+        source = data[column] if column else [True] * table["row_count"]
+        label = f"{func}({column or '*'})"
+        if not group_by:
+            return [label], [[_aggregate(func, [source[i] for i in selected])]]
+        groups: Dict[Any, List[Any]] = {}
+        for i in selected:
+            groups.setdefault(data[group_by][i], []).append(source[i])
+        rows = [[key, _aggregate(func, values)] for key, values in groups.items()]
+        return [group_by, label], rows[:limit]
+
+    projection = columns or names
+    return projection, [[data[name][i] for name in projection] for i in selected[:limit]]
+
+@dataclass
+class TableAnswer:
+    """A question answered from a table without the LLM."""
+    text: str
+    table_id: str
+    page: int
+
+def _contains(question_tokens: List[str], phrase: str) -> int:
+    """Number of phrase tokens when all of them occur in the question, else 0."""
+    tokens = _tokens(phrase)
+    return len(tokens) if tokens and all(token in question_tokens for token in tokens) else 0
+
+def answer_from_tables(tables: List[Dict[str, Any]], question: str) -> Optional[TableAnswer]:
+    """Answer a lookup or aggregate question from tables, or None when it is not clearly tabular.
+
+    A lookup needs a numeric column header and a row label that both appear
+    in the question ("Q3 revenue"); an aggregate needs an aggregate word and a
+    numeric column header ("average revenue"). Aggregates skip the table's own
+    total and subtotal rows. Ambiguous matches return None so the caller can
+    fall back to the LLM.
+    """
+    question_tokens = _tokens(question)
+    func = next((AGGREGATE_WORDS[word] for word in TOKEN.findall(question.lower()) if word in AGGREGATE_WORDS), None)
+    candidates: List[Tuple[int, str, TableAnswer]] = []
+
+    for table in tables:
+        data = table["data"]
+        label_column = next((c["name"] for c in table["columns"] if c["type"] == "string"), None)
+        rows = [
+            i for i in range(table["row_count"])
+            if not (label_column and TOTAL_LABEL.match(data[label_column][i] or ""))
+        ]
+        for column in table["columns"]:
+            if column["type"] != "number" or column["name"] == label_column:
+                continue
+            header_score = _contains(question_tokens, column["name"])
+            if not header_score:
+                continue
+
+            matched_row = False
+            if label_column:
+                for i, label in enumerate(data[label_column]):
+                    label_score = _contains(question_tokens, label or "")
+                    if not label_score:
+                        continue
+                    matched_row = True
+                    value = format_value(data[column["name"]][i], column["unit"])
+                    text = f"{column['name']} for {label}: {value} (table on page {table['page']})"
+                    candidates.append((header_score + label_score, value, TableAnswer(text, table["table_id"], table["page"])))
+
+            if func and not matched_row:
+                values = [data[column["name"]][i] for i in rows if data[column["name"]][i] is not None]
+                if not values:
+                    continue
+                value = format_value(_aggregate(func, values), "" if func == "count" else column["unit"])
+                name = {"sum": "Total", "avg": "Average", "min": "Minimum", "max": "Maximum", "count": "Count"}[func]
+                text = f"{name} {column['name']}: {value} over {len(values)} rows (table on page {table['page']})"
+                candidates.append((header_score, value, TableAnswer(text, table["table_id"], table["page"])))
+
+    if not candidates:
+        return None
+    best = max(score for score, _, _ in candidates)
+    top = [(value, answer) for score, value, answer in candidates if score == best]
+    if len({value for value, _ in top}) > 1:
+        return None
+    return top[0][1]
+
+class TableService:
+    """Extracts, stores and queries the tables of a document."""
+
+    def __init__(self, document_store: DocumentStore):
+        """Initialize service."""
+        self.store = document_store
+
+    def extract_and_save(self, document_id: str, pages: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extract tables from OCR pages and persist them."""
+        tables = extract_tables(pages)
+        self.store.save_tables(document_id, tables)
+        logger.debug("Extracted %d tables from document %s", len(tables), document_id)
+        return tables
+
+    def get_tables(self, document_id: str) -> List[Dict[str, Any]]:
+        """Tables of a document, extracting them on first use for documents processed earlier."""
+        tables = self.store.get_tables(document_id)
+        if tables is not None:
+            return tables
+        document = self.store.get_document(document_id)
+        if not document:
+            raise NotFoundError("Document not found")
+        if document.get("status") != "completed":
+            return extract_tables(document.get("pages") or [])
+        return self.extract_and_save(document_id, document.get("pages") or [])
+
+    def get_table(self, document_id: str, table_id: str) -> Dict[str, Any]:
+        """One table of a document."""
+        for table in self.get_tables(document_id):
+            if table["table_id"] == table_id:
+                return table
+        raise NotFoundError("Table not found")
+
+    def answer(self, document_id: str, question: str) -> Optional[TableAnswer]:
+        """Answer a question from the document's tables when it is clearly tabular."""
+        tables = self.get_tables(document_id)
+        return answer_from_tables(tables, question) if tables else None
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+from uuid import uuid4
+
+from app.config import Settings
+from app.core.exceptions import ConflictError, NotFoundError, ValidationError
+from app.storage import serialization
+from app.storage.atomic import atomic_write, is_temp_file, read_bytes, remove_path
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+
+# Running sha256 per upload session in this process, with the offset it covers
+_hashers: Dict[str, Tuple[int, Any]] = {}
+_hashers_lock = threading.Lock()
+
+class UploadService:
+    """Resumable chunked uploads written straight into a document's blob.
+
+    A session creates the document in status "receiving" and starts a
+    blob upload at its final key. Chunks are appended strictly in order;
+    every chunk except the last must be exactly `chunk_size` bytes so it maps
+    onto one multipart part. A sha256 of the content is kept incrementally
+    and recomputed from storage only when a session moves between workers.
+    Sessions are JSON files under `UPLOAD_DIR/sessions`.
+    """
+
+    def __init__(self, document_store: DocumentStore, settings: Settings):
+        """Initialize service."""
+        self.store = document_store
+        self.settings = settings
+        self.chunk_size = settings.UPLOAD_CHUNK_SIZE
+        self.sessions_dir = os.path.join(settings.UPLOAD_DIR, "sessions")
+        os.makedirs(self.sessions_dir, exist_ok=True)
+
+    def _session_file(self, upload_id: str) -> str:
+        """Session file path."""
+        return os.path.join(self.sessions_dir, f"{upload_id}.json")
+
+    def _save_session(self, session: Dict[str, Any]) -> None:
+        """Persist a session."""
+        atomic_write(self._session_file(session["upload_id"]), serialization.dumps(session))
+
+    def get_session(self, upload_id: str) -> Dict[str, Any]:
+        """Load a session or raise NotFoundError."""
+        data = read_bytes(self._session_file(upload_id))
+        if data is None:
+            raise NotFoundError("Upload session not found")
+        session = serialization.loads(data)
+        if session["expires_at"] < time.time():
+            raise NotFoundError("Upload session expired")
+        return session
+
+    def create_session(
+        self,
+        filename: str,
+        size: int,
+        content_type: Optional[str] = None,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create a document in status "receiving" and an upload session for its file."""
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            raise ValidationError("Only PDF and image files (PNG, JPG) are supported")
+        if size <= 0:
+            raise ValidationError("File is empty")
+        if size > self.settings.MAX_RESUMABLE_UPLOAD_SIZE:
+            raise ValidationError(
+                f"File too large. Maximum size is {self.settings.MAX_RESUMABLE_UPLOAD_SIZE / (1024 * 1024)}MB"
+            )
+
+        upload_id = uuid4().hex
+        document_id = str(uuid4())
+        blob_key = self.store.create_file_document(document_id, filename, size, status="receiving", upload_id=upload_id)
+        token = self.store.blob_store.begin_upload(blob_key, content_type)
+
+        now = time.time()
+        session = {
+            "upload_id": upload_id,
+            "document_id": document_id,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "offset": 0,
+            "parts": [],
+            "blob_key": blob_key,
+            "token": token,
+            "sha256": sha256.lower() if sha256 else None,
+            "created_at": now,
+            "expires_at": now + self.settings.UPLOAD_SESSION_TTL_HOURS * 3600,
+        }
+        self._save_session(session)
+        with _hashers_lock:
+            _hashers[upload_id] = (0, hashlib.sha256())
+        logger.info("Created upload session %s for document %s (%d bytes)", upload_id, document_id, size)
+        return session
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> Dict[str, Any]:
+        """Append a chunk at `offset`, which must equal the bytes received so far."""
+        session = self.get_session(upload_id)
+        expected = self._expected_length(session, offset)
+        if len(data) != expected:
+            raise ValidationError(f"Chunk at offset {offset} must be {expected} bytes, got {len(data)}")
+
+        with self.store.locks.lock(f"upload:{upload_id}"):
+            session = self.get_session(upload_id)
+            if offset != session["offset"]:
+                raise ConflictError("Chunk offset does not match the bytes received", extra={"offset": session["offset"]})
+
+            part_number = offset // session["chunk_size"] + 1
+            part = self.store.blob_store.write_part(session["blob_key"], session["token"], part_number, offset, data)
+            session["parts"].append(part)
+            session["offset"] = offset + len(data)
+            self._save_session(session)
+
+        with _hashers_lock:
+            covered, hasher = _hashers.get(upload_id, (None, None))
+            if covered == offset:
+                hasher.update(data)
+                _hashers[upload_id] = (session["offset"], hasher)
+            else:
+                _hashers.pop(upload_id, None)
+        return session
+
+    def _expected_length(self, session: Dict[str, Any], offset: int) -> int:
+        """Length the chunk at an offset must have."""
+        if offset < 0 or offset >= session["size"] or offset % session["chunk_size"]:
+            raise ConflictError("Invalid chunk offset", extra={"offset": session["offset"]})
+        return min(session["chunk_size"], session["size"] - offset)
+
+    def _digest(self, session: Dict[str, Any]) -> str:
+        """sha256 of the complete blob, from the running hash or by reading it back."""
+        with _hashers_lock:
+            covered, hasher = _hashers.pop(session["upload_id"], (None, None))
+        if covered == session["size"]:
+            return hasher.hexdigest()
+        logger.debug("Recomputing digest of upload %s from storage", session["upload_id"])
+        hasher = hashlib.sha256()
+        for chunk in self.store.blob_store.iter_range(session["blob_key"]):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        """Assemble the blob, verify its digest and mark the document uploaded."""
+        with self.store.locks.lock(f"upload:{upload_id}"):
+            session = self.get_session(upload_id)
+            if session["offset"] != session["size"]:
+                raise ConflictError("Upload is incomplete", extra={"offset": session["offset"]})
+
+            blobs = self.store.blob_store
+            blobs.complete_upload(session["blob_key"], session["token"], session["parts"])
+            digest = self._digest(session)
+            if session["sha256"] and digest != session["sha256"]:
+                self.store.delete_document(session["document_id"])
+                remove_path(self._session_file(upload_id))
+                raise ValidationError("Uploaded content does not match the declared sha256")
+
+            self.store.update_document(session["document_id"], status="uploaded", sha256=digest, upload_id=None)
+            remove_path(self._session_file(upload_id))
+        logger.info("Completed upload %s for document %s", upload_id, session["document_id"])
+        return session
+
+    def abort(self, upload_id: str) -> None:
+        """Cancel an upload and delete its document."""
+        with self.store.locks.lock(f"upload:{upload_id}"):
+            session = self.get_session(upload_id)
+            self._discard(session)
+
+    def _discard(self, session: Dict[str, Any]) -> None:
+        """Abort a session's blob upload and remove its document and session file."""
+        try:
+            self.store.blob_store.abort_upload(session["blob_key"], session["token"])
+        except Exception as e:
+            logger.warning("Error aborting blob upload for %s: %s", session["upload_id"], e)
+        self.store.delete_document(session["document_id"])
+        remove_path(self._session_file(session["upload_id"]))
+        with _hashers_lock:
+            _hashers.pop(session["upload_id"], None)
+
+    def iter_expired(self) -> Iterator[Dict[str, Any]]:
+        """Sessions past their expiry."""
+        now = time.time()
+        with os.scandir(self.sessions_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or is_temp_file(entry.name):
+                    continue
+                data = read_bytes(entry.path)
+                if data is None:
+                    continue
+                session = serialization.loads(data)
+                if session["expires_at"] < now:
+                    yield session
+
+    def purge_expired(self) -> int:
+        """Discard expired sessions; returns how many were removed."""
+        purged = 0
+        for session in list(self.iter_expired()):
+            with self.store.locks.lock(f"upload:{session['upload_id']}"):
+                self._discard(session)
+            purged += 1
+        return purged
@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.config import Settings
+from app.storage import serialization
+from app.storage.atomic import atomic_write, read_bytes, remove_path
+from app.storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+@dataclass
+class UrlCacheHit:
+    """An earlier OCR result that can be reused for a URL."""
+    document_id: str
+    reason: str  # "fresh", "not_modified" or "unchanged"
+
+class UrlCache:
+    """Remembers which document holds the OCR result of each processed URL.
+
+    Each entry records the response validators (ETag, Last-Modified) and a
+    sha256 of the content. Within the URL's TTL the earlier result is reused
+    as is; after that it is revalidated with a conditional GET, and reused
+    when the server answers 304 or sends identical content. Entries are JSON
+    files under `UPLOAD_DIR/url_cache`, keyed by a hash of the URL.
+    """
+
+    def __init__(
+        self,
+        document_store: DocumentStore,
+        cache_dir: str,
+        ttl: float = 3600,
+        ttl_rules: Optional[Dict[str, float]] = None,
+        timeout: float = 10.0,
+        max_hash_bytes: int = 100 * 1024 * 1024,
+        transport: Any = None
+    ):
+        """Initialize cache; `transport` replaces the httpx transport, e.g. in tests."""
+        self.store = document_store
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.ttl_rules = ttl_rules or {}
+        self.timeout = timeout
+        self.max_hash_bytes = max_hash_bytes
+        self.transport = transport
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, document_store: DocumentStore, settings: Settings) -> "UrlCache":
+        """Build a cache from application settings."""
+        return cls(
+            document_store,
+            os.path.join(settings.UPLOAD_DIR, "url_cache"),
+            ttl=settings.URL_CACHE_TTL_SECONDS,
+            ttl_rules=settings.URL_CACHE_TTL_RULES,
+            timeout=settings.URL_CACHE_TIMEOUT,
+            max_hash_bytes=settings.URL_CACHE_MAX_HASH_BYTES
+        )
+
+    def _entry_path(self, url: str) -> str:
+        """Entry file of a URL."""
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json")
+
+    def get_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        """Cache entry of a URL."""
+        data = read_bytes(self._entry_path(url))
+        return serialization.loads(data) if data is not None else None
+
+    def _save_entry(self, entry: Dict[str, Any]) -> None:
+        """Persist an entry."""
+        atomic_write(self._entry_path(entry["url"]), serialization.dumps(entry), fsync=False)
+
+    def forget(self, url: str) -> None:
+        """Drop a URL's entry."""
+        remove_path(self._entry_path(url))
+
+    def ttl_for(self, url: str, override: Optional[float] = None) -> float:
+        """TTL of a URL: the override, else the longest matching prefix rule, else the default."""
+        if override is not None:
+            return override
+        matches = [prefix for prefix in self.ttl_rules if url.startswith(prefix)]
+        return self.ttl_rules[max(matches, key=len)] if matches else self.ttl
+
+    async def fetch_validators(self, url: str, entry: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """GET a URL, conditionally when an entry is given; returns its validators, or None on 304."""
+        import httpx
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True, transport=self.transport) as client:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    return None
+                response.raise_for_status()
+                hasher = hashlib.sha256()
+                size = 0
+                async for chunk in response.aiter_bytes(HASH_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_hash_bytes:
+                        hasher = None
+                        break
+                    hasher.update(chunk)
+                return {
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                    "content_sha256": hasher.hexdigest() if hasher else None,
+                }
+
+    def _reusable(self, document_id: str) -> bool:
+        """Whether a document still holds a complete OCR result."""
+        document = self.store.get_document(document_id)
+        return bool(document) and document.get("status") == "completed"
+
+    async def lookup(self, url: str, ttl: Optional[float] = None) -> Optional[UrlCacheHit]:
+        """An earlier result for the URL that is still valid, revalidating it when its TTL has passed."""
+        entry = self.get_entry(url)
+        if not entry or not self._reusable(entry["document_id"]):
+            return None
+        if time.time() - entry["checked_at"] < self.ttl_for(url, ttl):
+            return UrlCacheHit(entry["document_id"], "fresh")
+
+        try:
+            validators = await self.fetch_validators(url, entry)
+        except Exception as e:
+            logger.warning("Could not revalidate %s, running OCR again: %s", url, e)
+            return None
+        if validators is None:
+            reason = "not_modified"
+        elif validators["content_sha256"] and validators["content_sha256"] == entry.get("content_sha256"):
+            reason = "unchanged"
+            entry.update(validators)
+        else:
+            logger.info("Content of %s changed since it was processed", url)
+            return None
+        entry["checked_at"] = time.time()
+        self._save_entry(entry)
+        return UrlCacheHit(entry["document_id"], reason)
+
+    def record(self, url: str, document_id: str, validators: Optional[Dict[str, Any]]) -> None:
+        """Remember the document holding a URL's OCR result and the validators of its content."""
+        if validators is None:
+            return
+        self._save_entry({
+            "url": url,
+            "document_id": document_id,
+            "checked_at": time.time(),
+            **validators,
+        })
+
+    def repoint(self, url: str, document_id: str) -> None:
+        """Point an entry at a newer copy of the result, so it outlives the original document."""
+        entry = self.get_entry(url)
+        if entry:
+            entry["document_id"] = document_id
+            self._save_entry(entry)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+from app.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+def _warm_ocr(settings: Settings) -> bool:
+    """Import the Mistral SDK and create the shared OCR client."""
+    if not settings.MISTRAL_API_KEY:
+        return False
+    from app.services.ocr_service import get_ocr_service
+    get_ocr_service().client
+    return True
+
+def _warm_llm(settings: Settings) -> bool:
+    """Build the routing policy, which imports and configures the LLM SDKs."""
+    providers = {settings.LLM_PRIMARY_PROVIDER, settings.LLM_SECONDARY_PROVIDER}
+    if "gemini" in providers and not settings.GOOGLE_API_KEY:
+        return False
+    from app.services.llm_router import get_routing_policy
+    get_routing_policy()
+    return True
+
+WARMUP_STEPS: Dict[str, Callable[[Settings], bool]] = {
+    "ocr": _warm_ocr,
+    "llm": _warm_llm,
+}
+
+class WarmupService:
+    """Initializes lazily loaded clients ahead of the first request and tracks readiness.
+
+    Each component is "pending" until its step runs, then "ready", "failed",
+    or "disabled" when it is not configured. The worker is ready once no
+    component is pending or failed. With warm-up off, components stay
+    "deferred" and are initialized by the first request that needs them.
+    """
+
+    def __init__(self, settings: Settings):
+        """Initialize component states."""
+        self.settings = settings
+        initial = "pending" if settings.WARMUP_ON_STARTUP else "deferred"
+        self.components: Dict[str, Dict[str, Any]] = {name: {"status": initial} for name in WARMUP_STEPS}
+
+    @property
+    def ready(self) -> bool:
+        """Whether every component has finished warming up successfully."""
+        return all(c["status"] not in ("pending", "failed") for c in self.components.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Readiness body for the API."""
+        return {"status": "ready" if self.ready else "starting", "components": self.components}
+
+    async def run(self) -> None:
+        """Run every warm-up step in a worker thread so startup is not blocked."""
+        for name, step in WARMUP_STEPS.items():
+            started = time.perf_counter()
+            try:
+                enabled = await asyncio.to_thread(step, self.settings)
+                status = {"status": "ready" if enabled else "disabled"}
+            except Exception as e:
+                logger.error("Error warming up %s: %s", name, e)
+                status = {"status": "failed", "error": str(e)}
+            status["seconds"] = round(time.perf_counter() - started, 3)
+            self.components[name] = status
+        logger.info("Warm-up finished: %s", self.components)
+
+@lru_cache()
+def get_warmup_service() -> WarmupService:
+    """Process-wide warm-up state."""
+    return WarmupService(get_settings())
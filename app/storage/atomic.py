@@ -0,0 +1,84 @@
+import os
+import shutil
+import threading
+from typing import Iterable, Optional
+
+def temp_path_for(path: str) -> str:
+    """Unique temporary path next to the target, so the final rename stays on one filesystem."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def atomic_write(path: str, data: bytes, fsync: bool = True) -> None:
+    """Write a file by writing a temporary sibling and renaming it over the target.
+
+    Readers see either the old or the new content, never a partial write.
+    """
+    tmp_path = temp_path_for(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def fsync_paths(paths: Iterable[str]) -> None:
+    """Flush files written without fsync, then the directories holding their entries."""
+    directories = []
+    for path in paths:
+        _fsync(path)
+        directory = os.path.dirname(path)
+        if directory not in directories:
+            directories.append(directory)
+    for directory in directories:
+        _fsync(directory)
+
+def _fsync(path: str) -> None:
+    """Fsync a file or directory by path."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def is_temp_file(name: str) -> bool:
+    """Whether a directory entry is an in-flight temporary file."""
+    return name.endswith(".tmp")
+
+def read_bytes(path: str) -> Optional[bytes]:
+    """Read a file, returning None when it does not exist."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def disk_usage(path: str) -> int:
+    """Total size in bytes of a file or directory tree."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+def remove_path(path: str) -> int:
+    """Remove a file or directory tree; returns the bytes reclaimed."""
+    if not os.path.lexists(path):
+        return 0
+    size = disk_usage(path)
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
@@ -0,0 +1,331 @@
+import os
+import shutil
+import logging
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from app.core.exceptions import ServiceError
+from app.storage.atomic import remove_path, temp_path_for
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class BlobStore(ABC):
+    """Storage for original document files, addressed by slash-separated keys."""
+
+    @abstractmethod
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Store a blob from a readable stream; returns its size in bytes."""
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Stream bytes `start` to `end` (inclusive, or to the end) of a blob."""
+
+    @abstractmethod
+    def size(self, key: str) -> Optional[int]:
+        """Size of a blob, or None when it does not exist."""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every blob under a prefix; returns the number of bytes removed."""
+
+    def read(self, key: str) -> bytes:
+        """Read a whole blob."""
+        return b"".join(self.iter_range(key))
+
+    def presigned_url(self, key: str, expires: int = 3600) -> Optional[str]:
+        """Time-limited download URL, or None when the backend cannot serve directly."""
+        return None
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of a blob, when the backend is local."""
+        return None
+
+    @abstractmethod
+    def begin_upload(self, key: str, content_type: Optional[str] = None) -> str:
+        """Start a blob written in parts; returns an upload token."""
+
+    @abstractmethod
+    def write_part(self, key: str, token: str, part_number: int, offset: int, data: bytes) -> Dict[str, Any]:
+        """Write one part of an upload; returns what `complete_upload` needs to know about it."""
+
+    @abstractmethod
+    def complete_upload(self, key: str, token: str, parts: List[Dict[str, Any]]) -> None:
+        """Assemble the written parts into the blob."""
+
+    @abstractmethod
+    def abort_upload(self, key: str, token: str) -> None:
+        """Discard the parts of an upload."""
+
+class LocalBlobStore(BlobStore):
+    """Blobs stored as files under a root directory."""
+
+    def __init__(self, root: str):
+        """Initialize store root."""
+        self.root = root
+
+    def local_path(self, key: str) -> str:
+        """Filesystem path of a blob."""
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Copy a stream into place via a temporary file and rename."""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = temp_path_for(path)
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Stream a byte range from the file."""
+        with open(self.local_path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(COPY_CHUNK_SIZE if remaining is None else min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def size(self, key: str) -> Optional[int]:
+        """Size of the file."""
+        try:
+            return os.path.getsize(self.local_path(key))
+        except FileNotFoundError:
+            return None
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete the file or directory at a prefix."""
+        return remove_path(self.local_path(prefix.rstrip("/")))
+
+    def begin_upload(self, key: str, content_type: Optional[str] = None) -> str:
+        """Create the partial file next to the final path."""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(f"{path}.part", "ab").close()
+        return ""
+
+    def write_part(self, key: str, token: str, part_number: int, offset: int, data: bytes) -> Dict[str, Any]:
+        """Write a part at its offset in the partial file."""
+        with open(f"{self.local_path(key)}.part", "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        return {"part_number": part_number}
+
+    def complete_upload(self, key: str, token: str, parts: List[Dict[str, Any]]) -> None:
+        """Rename the partial file into place."""
+        path = self.local_path(key)
+        os.replace(f"{path}.part", path)
+
+    def abort_upload(self, key: str, token: str) -> None:
+        """Remove the partial file."""
+        remove_path(f"{self.local_path(key)}.part")
+
+def _is_not_found(error: Exception) -> bool:
+    """Whether a botocore ClientError reports a missing object."""
+    response = getattr(error, "response", None) or {}
+    code = str(response.get("Error", {}).get("Code", ""))
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("404", "NoSuchKey", "NotFound") or status == 404
+
+class S3BlobStore(BlobStore):
+    """Blobs stored in an S3-compatible object store (AWS S3, MinIO, ...).
+
+    Uploads use multipart upload so large files are streamed in
+    `part_size` pieces, and downloads can be handed to clients as presigned
+    URLs so file bytes never pass through the API process. `client` can be any
+    object with the boto3 S3 client interface, e.g. a local stand-in in tests.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        client: Any = None,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024
+    ):
+        """Initialize S3 client."""
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ServiceError("The S3 blob backend requires boto3 to be installed")
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=region,
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_access_key
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        # S3 requires every part except the last to be at least 5MB
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+
+    def _key(self, key: str) -> str:
+        """Object key including the configured prefix."""
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Upload a stream with multipart upload, aborting on failure."""
+        object_key = self._key(key)
+        extra = {"ContentType": content_type} if content_type else {}
+
+        first = stream.read(self.part_size)
+        if len(first) < self.part_size:
+            self.client.put_object(Bucket=self.bucket, Key=object_key, Body=first, **extra)
+            return len(first)
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=object_key, **extra)["UploadId"]
+        parts = []
+        size = 0
+        try:
+            chunk = first
+            while chunk:
+                part = self.client.upload_part(
+                    Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                    PartNumber=len(parts) + 1, Body=chunk
+                )
+                parts.append({"PartNumber": len(parts) + 1, "ETag": part["ETag"]})
+                size += len(chunk)
+                chunk = stream.read(self.part_size)
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=object_key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+            raise
+        return size
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Stream a byte range with a ranged GET."""
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key), Range=byte_range)
+        body = response["Body"]
+        while True:
+            chunk = body.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def size(self, key: str) -> Optional[int]:
+        """Object size from a HEAD request; credential, network and throttling errors are raised."""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete all objects under a prefix."""
+        removed = 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            objects = page.get("Contents", [])
+            if not objects:
+                continue
+            removed += sum(obj["Size"] for obj in objects)
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": obj["Key"]} for obj in objects]}
+            )
+        return removed
+
+    def begin_upload(self, key: str, content_type: Optional[str] = None) -> str:
+        """Create a multipart upload; parts must be at least 5MB except the last."""
+        extra = {"ContentType": content_type} if content_type else {}
+        return self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key), **extra)["UploadId"]
+
+    def write_part(self, key: str, token: str, part_number: int, offset: int, data: bytes) -> Dict[str, Any]:
+        """Upload one part."""
+        part = self.client.upload_part(
+            Bucket=self.bucket, Key=self._key(key), UploadId=token, PartNumber=part_number, Body=data
+        )
+        return {"PartNumber": part_number, "ETag": part["ETag"]}
+
+    def complete_upload(self, key: str, token: str, parts: List[Dict[str, Any]]) -> None:
+        """Complete the multipart upload."""
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self._key(key), UploadId=token,
+            MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])}
+        )
+
+    def abort_upload(self, key: str, token: str) -> None:
+        """Abort the multipart upload."""
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=token)
+
+    def presigned_url(self, key: str, expires: int = 3600) -> Optional[str]:
+        """Presigned GET URL for an object."""
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires
+        )
+
+def create_blob_store(settings) -> BlobStore:
+    """Build the configured blob store, reusing one instance per configuration.
+
+    Stores are built for every request through `DocumentStore.from_settings`,
+    and creating an S3 client is slow, so instances are cached on the
+    settings they are built from.
+    """
+    return _cached_blob_store(
+        settings.BLOB_BACKEND,
+        settings.UPLOAD_DIR,
+        settings.S3_BUCKET,
+        settings.S3_PREFIX,
+        settings.S3_ENDPOINT_URL,
+        settings.S3_REGION,
+        settings.S3_ACCESS_KEY_ID,
+        settings.S3_SECRET_ACCESS_KEY,
+        settings.S3_MULTIPART_CHUNK_SIZE
+    )
+
+@lru_cache(maxsize=8)
+def _cached_blob_store(
+    backend: str,
+    upload_dir: str,
+    bucket: Optional[str],
+    prefix: str,
+    endpoint_url: Optional[str],
+    region: Optional[str],
+    access_key_id: Optional[str],
+    secret_access_key: Optional[str],
+    part_size: int
+) -> BlobStore:
+    """Blob store for one configuration."""
+    if backend == "local":
+        return LocalBlobStore(upload_dir)
+    if backend == "s3":
+        if not bucket:
+            raise ServiceError("S3_BUCKET must be set for the S3 blob backend")
+        return S3BlobStore(
+            bucket=bucket,
+            prefix=prefix,
+            endpoint_url=endpoint_url,
+            region=region,
+            access_key_id=access_key_id,
+            secret_access_key=secret_access_key,
+            part_size=part_size
+        )
+    raise ServiceError(f"Unknown blob backend: {backend}")
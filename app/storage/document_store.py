@@ -1,18 +1,61 @@
 import os
-import json
 import shutil
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional
+import re
+from typing import BinaryIO, Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+from app.storage import serialization
+from app.storage.atomic import atomic_write, fsync_paths, is_temp_file, read_bytes, remove_path
+from app.storage.blob_store import BlobStore, LocalBlobStore, create_blob_store
+from app.storage.locks import StripedFileLock
+
 logger = logging.getLogger(__name__)
 
+SAFE_NAME = re.compile(r"^(?!\.+\Z)[\w.-]+\Z")  # a file name without path separators, "." or ".."
+
+def shard_prefix(document_id: str, depth: int) -> List[str]:
+    """Hash-prefix directory names for a document id, two hex characters per level."""
+    digest = hashlib.md5(document_id.encode("utf-8")).hexdigest()
+    return [digest[i * 2:i * 2 + 2] for i in range(depth)]
+
+def chat_stats(messages: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Message count and total content length of a chat history."""
+    return {"messages": len(messages), "chars": sum(len(message.get("content") or "") for message in messages)}
+
+def is_shard_dir(name: str) -> bool:
+    """Whether a directory name is a shard level rather than a legacy document directory."""
+    return len(name) == 2 and all(c in "0123456789abcdef" for c in name)
+
 class DocumentStore:
-    """Service for storing and retrieving documents and processing results."""
+    """Service for storing and retrieving documents and processing results.
+    
+    Metadata, files and chat histories live under hash-prefix shard
+    directories (`metadata/ab/cd/{id}.json` for a depth of 2). Reads fall back
+    to the legacy flat layout, and documents found there are moved to their
+    shard on the next write, so an existing tree can be migrated online.
+    
+    Read-modify-write operations on a document hold its striped cross-process
+    lock, so several worker processes can share one store.
     
-    def __init__(self, upload_dir: str = "uploads"):
+    Original files go to a pluggable `BlobStore` under the key
+    `files/{shard}/{id}/document{ext}`; the default local backend maps that
+    key onto the same path under `upload_dir`.
+    """
+    
+    def __init__(
+        self,
+        upload_dir: str = "uploads",
+        shard_depth: int = 2,
+        lock_stripes: int = 1024,
+        blob_store: Optional[BlobStore] = None
+    ):
         """Initialize document store."""
         self.upload_dir = upload_dir
+        self.shard_depth = shard_depth
+        self.blob_store = blob_store or LocalBlobStore(upload_dir)
+        self.locks = StripedFileLock(os.path.join(upload_dir, "locks"), stripes=lock_stripes)
         self.metadata_dir = os.path.join(upload_dir, "metadata")
         self.files_dir = os.path.join(upload_dir, "files")
         self.chat_dir = os.path.join(upload_dir, "chat")
@@ -22,39 +65,62 @@ class DocumentStore:
         os.makedirs(self.files_dir, exist_ok=True)
         os.makedirs(self.chat_dir, exist_ok=True)
         
-        logger.info(f"Document store initialized with upload directory: {upload_dir}")
+        logger.debug("Document store initialized with upload directory: %s", upload_dir)
+    
+    @classmethod
+    def from_settings(cls, settings) -> "DocumentStore":
+        """Build a store from application settings."""
+        return cls(
+            upload_dir=settings.UPLOAD_DIR,
+            shard_depth=settings.STORE_SHARD_DEPTH,
+            lock_stripes=settings.STORE_LOCK_STRIPES,
+            blob_store=create_blob_store(settings)
+        )
     
     def save_document(self, document_id: str, file_path: str, filename: str) -> str:
-        """Save document file and initialize metadata."""
-        logger.info(f"Saving document: {document_id}, filename: {filename}")
-        
-        # Create document directory
-        doc_dir = os.path.join(self.files_dir, document_id)
-        os.makedirs(doc_dir, exist_ok=True)
+        """Save document file and initialize metadata; returns the blob key."""
+        with open(file_path, "rb") as f:
+            return self.save_document_stream(document_id, f, filename)
+    
+    def save_document_stream(
+        self,
+        document_id: str,
+        stream: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None
+    ) -> str:
+        """Stream a document file into blob storage and initialize metadata; returns the blob key."""
+        logger.info("Saving document: %s, filename: %s", document_id, filename)
         
         # Save file
-        file_ext = os.path.splitext(filename)[1]
-        dest_path = os.path.join(doc_dir, f"document{file_ext}")
-        shutil.copy(file_path, dest_path)
+        key = self.blob_key(document_id, filename)
+        size = self.blob_store.put_stream(key, stream, content_type)
         
         # Create metadata
+        self.create_file_document(document_id, filename, size, status="uploaded")
+        
+        return key
+    
+    def create_file_document(self, document_id: str, filename: str, size: int, status: str, **kwargs) -> str:
+        """Initialize metadata of a file document stored under its blob key; returns the key."""
+        key = self.blob_key(document_id, filename)
         metadata = {
             "document_id": document_id,
             "filename": filename,
-            "original_path": dest_path,
+            "blob_key": key,
+            "size": size,
             "created_at": datetime.now().isoformat(),
-            "status": "uploaded",
-            "type": "file"
+            "status": status,
+            "type": "file",
+            **kwargs
         }
         
-        # Save metadata
         self._save_metadata(document_id, metadata)
-        
-        return dest_path
+        return key
     
     def save_url(self, document_id: str, url: str) -> None:
         """Save document URL and initialize metadata."""
-        logger.info(f"Saving document URL: {document_id}, URL: {url}")
+        logger.info("Saving document URL: %s, URL: %s", document_id, url)
         
         # Create metadata
         metadata = {
@@ -71,126 +137,460 @@ class DocumentStore:
     
     def update_document(self, document_id: str, **kwargs) -> None:
         """Update document metadata."""
-        logger.info(f"Updating document: {document_id}")
-        
-        # Get existing metadata
-        metadata = self._get_metadata(document_id)
-        if not metadata:
-            logger.error(f"Document not found: {document_id}")
-            return
+        logger.debug("Updating document: %s", document_id)
         
-        # Update metadata
-        metadata.update(kwargs)
-        metadata["updated_at"] = datetime.now().isoformat()
-        
-        # Save updated metadata
-        self._save_metadata(document_id, metadata)
+        with self.locks.lock(document_id):
+            # Get existing metadata
+            metadata = self._get_metadata(document_id)
+            if not metadata:
+                logger.error("Document not found: %s", document_id)
+                return
+            
+            # Update metadata
+            metadata.update(kwargs)
+            metadata["updated_at"] = datetime.now().isoformat()
+            
+            # Save updated metadata
+            self._save_metadata(document_id, metadata)
     
     def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
-        """Get document metadata and content."""
-        logger.info(f"Retrieving document: {document_id}")
+        """Get document metadata and content.
+        
+        While OCR is in progress (or after it failed part way) the pages so
+        far are read from the document's page log.
+        """
+        logger.debug("Retrieving document: %s", document_id)
         
         # Get metadata
         metadata = self._get_metadata(document_id)
         if not metadata:
-            logger.warning(f"Document not found: {document_id}")
+            logger.warning("Document not found: %s", document_id)
             return None
         
+        if "pages" not in metadata and metadata.get("pages_available"):
+            pages = self.get_logged_pages(document_id)
+            metadata["pages"] = pages
+            metadata["content"], metadata["display_content"] = serialization.page_texts(pages)
+        
         return metadata
     
-    def save_chat_message(self, document_id: str, role: str, content: str) -> None:
-        """Save chat message for a document."""
-        logger.info(f"Saving chat message for document: {document_id}, role: {role}")
+    def append_pages(self, document_id: str, pages: List[Dict[str, Any]]) -> None:
+        """Append newly processed OCR pages to the document's page log.
         
-        # Create chat directory for document if it doesn't exist
-        doc_chat_dir = os.path.join(self.chat_dir, document_id)
-        os.makedirs(doc_chat_dir, exist_ok=True)
+        Each OCR chunk writes only its own pages; the completed result is then
+        stored in the metadata once and the log cleared.
+        """
+        page_log = self._page_log_file(document_id)
+        os.makedirs(os.path.dirname(page_log), exist_ok=True)
+        with self.locks.lock(document_id):
+            with open(page_log, "ab") as f:
+                f.write(b"".join(serialization.dumps(page) + b"\n" for page in pages))
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def get_logged_pages(self, document_id: str) -> List[Dict[str, Any]]:
+        """Pages in the document's page log, skipping a line cut short by a crash."""
+        data = read_bytes(self._page_log_file(document_id))
+        pages = []
+        for line in (data or b"").splitlines():
+            try:
+                pages.append(serialization.loads(line))
+            except ValueError:
+                continue
+        return pages
+    
+    def clear_page_log(self, document_id: str) -> None:
+        """Remove the document's page log."""
+        remove_path(self._page_log_file(document_id))
+    
+    def list_document_ids(self) -> Iterator[str]:
+        """Iterate over the ids of all stored documents, in either layout."""
+        for _, _, files in os.walk(self.metadata_dir):
+            for name in files:
+                if name.endswith(".json") and not is_temp_file(name):
+                    yield name[:-len(".json")]
+    
+    def delete_document(self, document_id: str) -> int:
+        """Delete a document's metadata, original file and chat history in both layouts.
         
-        # Read existing chat history
-        chat_file = os.path.join(doc_chat_dir, "chat_history.json")
-        chat_history = []
+        Returns the number of bytes reclaimed.
+        """
+        logger.info("Deleting document: %s", document_id)
         
-        if os.path.exists(chat_file):
-            try:
-                with open(chat_file, "r") as f:
-                    chat_history = json.load(f)
-            except Exception as e:
-                logger.error(f"Error reading chat history: {str(e)}")
+        reclaimed = 0
+        with self.locks.lock(document_id):
+            for path in (self._metadata_path(document_id), self._metadata_path(document_id, legacy=True)):
+                reclaimed += remove_path(path)
+            for base_dir in (self.files_dir, self.chat_dir):
+                for path in (self._sharded_path(base_dir, document_id), os.path.join(base_dir, document_id)):
+                    reclaimed += remove_path(path)
+            if not isinstance(self.blob_store, LocalBlobStore):
+                reclaimed += self.blob_store.delete_prefix(self.blob_key(document_id))
+        return reclaimed
+    
+    def document_paths(self, document_id: str) -> List[str]:
+        """Existing metadata, file and chat paths of a document."""
+        candidates = [
+            self._metadata_path(document_id),
+            self._metadata_path(document_id, legacy=True),
+            self._sharded_path(self.files_dir, document_id),
+            os.path.join(self.files_dir, document_id),
+            self._sharded_path(self.chat_dir, document_id),
+            os.path.join(self.chat_dir, document_id),
+        ]
+        return list(dict.fromkeys(path for path in candidates if os.path.exists(path)))
+    
+    def iter_document_dirs(self, base_dir: str) -> Iterator[Tuple[str, str]]:
+        """Iterate (document_id, path) over per-document directories under `files/` or `chat/`."""
+        def walk(path: str, level: int) -> Iterator[Tuple[str, str]]:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if not entry.is_dir():
+                        continue
+                    if level < self.shard_depth and is_shard_dir(entry.name):
+                        yield from walk(entry.path, level + 1)
+                    elif level == self.shard_depth or (level == 0 and not is_shard_dir(entry.name)):
+                        yield entry.name, entry.path
+        
+        yield from walk(base_dir, 0)
+    
+    def get_document_version(self, document_id: str) -> Optional[str]:
+        """Get a content version for a document without reading its metadata."""
+        metadata_file = self._find_metadata_path(document_id)
+        if metadata_file is None:
+            return None
+        try:
+            stat = os.stat(metadata_file)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    
+    def blob_key(self, document_id: str, filename: Optional[str] = None) -> str:
+        """Blob key of a document's original file, or of its directory without a filename."""
+        key = "/".join(["files", *shard_prefix(document_id, self.shard_depth), document_id])
+        if filename is None:
+            return key + "/"
+        return f"{key}/document{os.path.splitext(filename)[1]}"
+    
+    def image_key(self, document_id: str, image_id: str, width: Optional[int] = None) -> str:
+        """Blob key of an OCR image, or of its thumbnail at a width, next to the document file."""
+        if not SAFE_NAME.match(image_id):
+            raise ValueError(f"Invalid image id: {image_id}")
+        if width is not None:
+            return f"{self.blob_key(document_id)}thumbs/{width}/{image_id}"
+        return f"{self.blob_key(document_id)}images/{image_id}"
+    
+    def document_blob_key(self, document: Dict[str, Any]) -> Optional[str]:
+        """Blob key of a stored document's original file.
         
-        # Add new message
-        chat_history.append({
+        Older metadata only has an absolute `original_path`, which goes stale
+        when the layout migration moves the file, so the key is derived from
+        the document id instead, falling back to the flat layout for files not
+        moved yet.
+        """
+        if document.get("blob_key"):
+            return document["blob_key"]
+        original_path = document.get("original_path")
+        if not original_path:
+            return None
+        document_id = document["document_id"]
+        key = self.blob_key(document_id, original_path)
+        if self.blob_store.size(key) is None:
+            legacy_key = f"files/{document_id}/{os.path.basename(original_path)}"
+            if self.blob_store.size(legacy_key) is not None:
+                return legacy_key
+        return key
+    
+    def save_chat_message(self, document_id: str, role: str, content: str) -> None:
+        """Save chat message for a document."""
+        logger.debug("Saving chat message for document: %s, role: %s", document_id, role)
+        self.append_chat_messages(document_id, [{
             "role": role,
             "content": content,
             "timestamp": datetime.now().isoformat()
-        })
+        }])
+    
+    def append_chat_messages(self, document_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Append several chat messages to a document's history in one write."""
+        if not messages:
+            return
         
-        # Save updated chat history
-        try:
-            with open(chat_file, "w") as f:
-                json.dump(chat_history, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving chat history: {str(e)}")
+        # Create chat directory for document if it doesn't exist
+        chat_file = self._chat_file(document_id)
+        os.makedirs(os.path.dirname(chat_file), exist_ok=True)
+        
+        with self.locks.lock(document_id):
+            # Read existing chat history
+            chat_history = self.get_chat_history(document_id)
+            
+            # Add new messages
+            chat_history.extend(messages)
+            
+            # Save updated chat history
+            try:
+                atomic_write(chat_file, serialization.dumps(chat_history))
+                atomic_write(self._chat_stats_file(document_id), serialization.dumps(chat_stats(chat_history)))
+            except Exception as e:
+                logger.error("Error saving chat history: %s", e)
+                return
+            self._remove_legacy(self.chat_dir, document_id, is_dir=True)
     
     def get_chat_history(self, document_id: str) -> List[Dict[str, Any]]:
         """Get chat history for a document."""
-        logger.info(f"Retrieving chat history for document: {document_id}")
+        logger.debug("Retrieving chat history for document: %s", document_id)
         
-        # Get chat file path
-        chat_file = os.path.join(self.chat_dir, document_id, "chat_history.json")
+        # Read chat history, falling back to the legacy layout
+        for chat_file in (self._chat_file(document_id), self._chat_file(document_id, legacy=True)):
+            try:
+                data = read_bytes(chat_file)
+                if data is not None:
+                    return serialization.loads(data)
+            except Exception as e:
+                logger.error("Error reading chat history: %s", e)
+                return []
         
         # Return empty list if chat file doesn't exist
-        if not os.path.exists(chat_file):
-            return []
+        return []
+    
+    def get_chat_stats(self, document_id: str) -> Dict[str, int]:
+        """Message count and total content length of a document's chat history.
+        
+        Kept next to the history so callers need not read the whole log;
+        histories written before it existed are counted once on first use.
+        """
+        data = read_bytes(self._chat_stats_file(document_id))
+        if data is not None:
+            return serialization.loads(data)
+        with self.locks.lock(document_id):
+            stats = chat_stats(self.get_chat_history(document_id))
+            if stats["messages"]:
+                stats_file = self._chat_stats_file(document_id)
+                os.makedirs(os.path.dirname(stats_file), exist_ok=True)
+                atomic_write(stats_file, serialization.dumps(stats))
+        return stats
+    
+    def chat_history_modified(self, document_id: str) -> Optional[float]:
+        """Last modification time of a document's chat history, or None without one."""
+        for chat_file in (self._chat_file(document_id), self._chat_file(document_id, legacy=True)):
+            try:
+                return os.path.getmtime(chat_file)
+            except FileNotFoundError:
+                continue
+        return None
+    
+    def delete_chat_history(self, document_id: str) -> int:
+        """Delete a document's chat history and its rolling summary; returns the bytes reclaimed.
+        
+        Other state kept next to the history (tables, passages, context cache
+        entries) is left in place.
+        """
+        reclaimed = 0
+        with self.locks.lock(document_id):
+            for path in (
+                self._chat_file(document_id),
+                self._chat_file(document_id, legacy=True),
+                self._chat_summary_file(document_id),
+                self._chat_stats_file(document_id)
+            ):
+                reclaimed += remove_path(path)
+        return reclaimed
+    
+    def import_documents(self, entries: List[Dict[str, Any]]) -> None:
+        """Write a batch of imported documents, each {"metadata": ..., "messages": [...]}.
         
-        # Read chat history
+        Files are written without a per-file fsync and only the files and
+        directories of the batch are flushed to disk at the end, which is
+        what makes bulk imports fast.
+        """
+        written = []
+        for entry in entries:
+            metadata = entry["metadata"]
+            document_id = metadata["document_id"]
+            with self.locks.lock(document_id):
+                metadata_file = self._metadata_path(document_id)
+                os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
+                atomic_write(metadata_file, serialization.dumps(metadata), fsync=False)
+                written.append(metadata_file)
+                self._remove_legacy(self.metadata_dir, f"{document_id}.json")
+                if entry.get("messages"):
+                    chat_file = self._chat_file(document_id)
+                    os.makedirs(os.path.dirname(chat_file), exist_ok=True)
+                    atomic_write(chat_file, serialization.dumps(entry["messages"]), fsync=False)
+                    stats_file = self._chat_stats_file(document_id)
+                    atomic_write(stats_file, serialization.dumps(chat_stats(entry["messages"])), fsync=False)
+                    written.extend((chat_file, stats_file))
+                if entry.get("summary"):
+                    summary_file = self._chat_summary_file(document_id)
+                    os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+                    atomic_write(summary_file, serialization.dumps(entry["summary"]), fsync=False)
+                    written.append(summary_file)
+        fsync_paths(written)
+    
+    def get_chunk_answer(self, document_id: str, key: str) -> Optional[Dict[str, Any]]:
+        """Cached map-reduce answer for one chunk of a document."""
+        data = read_bytes(self._chunk_answer_file(document_id, key))
+        return serialization.loads(data) if data is not None else None
+    
+    def save_chunk_answer(self, document_id: str, key: str, value: Dict[str, Any]) -> None:
+        """Cache a map-reduce chunk answer next to the document's chat history.
+        
+        Keys are content hashes, so entries are never rewritten with different
+        content and need no lock.
+        """
+        cache_file = self._chunk_answer_file(document_id, key)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            atomic_write(cache_file, serialization.dumps(value), fsync=False)
+        except Exception as e:
+            logger.error("Error saving chunk answer: %s", e)
+    
+    def get_context_cache(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Provider-side context cache entry of a document."""
+        data = read_bytes(self._context_cache_file(document_id))
+        return serialization.loads(data) if data is not None else None
+    
+    def save_context_cache(self, document_id: str, entry: Dict[str, Any]) -> None:
+        """Record a document's provider-side context cache."""
+        cache_file = self._context_cache_file(document_id)
         try:
-            with open(chat_file, "r") as f:
-                return json.load(f)
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            atomic_write(cache_file, serialization.dumps(entry), fsync=False)
         except Exception as e:
-            logger.error(f"Error reading chat history: {str(e)}")
-            return []
+            logger.error("Error saving context cache entry: %s", e)
+    
+    def delete_context_cache(self, document_id: str) -> None:
+        """Forget a document's provider-side context cache."""
+        remove_path(self._context_cache_file(document_id))
+    
+    def get_tables(self, document_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Extracted tables of a document, or None if they were never extracted."""
+        data = read_bytes(self._tables_file(document_id))
+        return serialization.loads(data) if data is not None else None
+    
+    def save_tables(self, document_id: str, tables: List[Dict[str, Any]]) -> None:
+        """Store a document's extracted tables as one compact columnar file."""
+        tables_file = self._tables_file(document_id)
+        try:
+            os.makedirs(os.path.dirname(tables_file), exist_ok=True)
+            atomic_write(tables_file, serialization.dumps(tables))
+        except Exception as e:
+            logger.error("Error saving tables: %s", e)
+    
+    def get_chat_summary(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Rolling summary of a document's older chat turns."""
+        data = read_bytes(self._chat_summary_file(document_id))
+        return serialization.loads(data) if data is not None else None
+    
+    def save_chat_summary(self, document_id: str, entry: Dict[str, Any]) -> None:
+        """Store the rolling summary next to the chat history."""
+        summary_file = self._chat_summary_file(document_id)
+        try:
+            os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+            atomic_write(summary_file, serialization.dumps(entry))
+        except Exception as e:
+            logger.error("Error saving chat summary: %s", e)
+    
+    def _chat_summary_file(self, document_id: str) -> str:
+        """Rolling chat summary path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "chat_summary.json")
+    
+    def _chat_stats_file(self, document_id: str) -> str:
+        """Chat history counters path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "chat_stats.json")
+    
+    def get_passages(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Passage retrieval state of a document, or None if it was never built."""
+        data = read_bytes(self._passages_file(document_id))
+        return serialization.loads(data) if data is not None else None
+    
+    def save_passages(self, document_id: str, state: Dict[str, Any]) -> None:
+        """Store a document's passage retrieval state."""
+        passages_file = self._passages_file(document_id)
+        try:
+            os.makedirs(os.path.dirname(passages_file), exist_ok=True)
+            atomic_write(passages_file, serialization.dumps(state), fsync=False)
+        except Exception as e:
+            logger.error("Error saving passages: %s", e)
+    
+    def _passages_file(self, document_id: str) -> str:
+        """Passage retrieval state path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "passages.json")
+    
+    def _page_log_file(self, document_id: str) -> str:
+        """OCR page log path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "ocr_pages.ndjson")
+    
+    def _tables_file(self, document_id: str) -> str:
+        """Extracted tables path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "tables.json")
+    
+    def _context_cache_file(self, document_id: str) -> str:
+        """Context cache entry path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "context_cache.json")
+    
+    def _chunk_answer_file(self, document_id: str, key: str) -> str:
+        """Map-reduce cache entry path."""
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "map", f"{key}.json")
+    
+    def _sharded_path(self, base_dir: str, name: str) -> str:
+        """Path of an entry under its shard directories."""
+        document_id = name[:-len(".json")] if name.endswith(".json") else name
+        return os.path.join(base_dir, *shard_prefix(document_id, self.shard_depth), name)
+    
+    def _metadata_path(self, document_id: str, legacy: bool = False) -> str:
+        """Metadata file path in the sharded or legacy layout."""
+        if legacy:
+            return os.path.join(self.metadata_dir, f"{document_id}.json")
+        return self._sharded_path(self.metadata_dir, f"{document_id}.json")
+    
+    def _find_metadata_path(self, document_id: str) -> Optional[str]:
+        """Existing metadata file, preferring the sharded layout."""
+        for path in (self._metadata_path(document_id), self._metadata_path(document_id, legacy=True)):
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def _chat_file(self, document_id: str, legacy: bool = False) -> str:
+        """Chat history file path in the sharded or legacy layout."""
+        if legacy:
+            return os.path.join(self.chat_dir, document_id, "chat_history.json")
+        return os.path.join(self._sharded_path(self.chat_dir, document_id), "chat_history.json")
+    
+    def _remove_legacy(self, base_dir: str, name: str, is_dir: bool = False) -> None:
+        """Remove an entry's legacy copy after it was written to its shard."""
+        if not self.shard_depth:
+            return
+        legacy_path = os.path.join(base_dir, name)
+        try:
+            if is_dir:
+                shutil.rmtree(legacy_path)
+            else:
+                os.remove(legacy_path)
+        except FileNotFoundError:
+            pass
     
     def _save_metadata(self, document_id: str, metadata: Dict[str, Any]) -> None:
         """Save document metadata."""
-        metadata_file = os.path.join(self.metadata_dir, f"{document_id}.json")
-        
-        # Convert metadata to JSON-serializable format
-        serializable_metadata = self._make_serializable(metadata)
+        metadata_file = self._metadata_path(document_id)
         
         try:
-            with open(metadata_file, "w") as f:
-                json.dump(serializable_metadata, f, indent=2)
+            os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
+            atomic_write(metadata_file, serialization.dumps(metadata))
         except Exception as e:
-            logger.error(f"Error saving metadata: {str(e)}")
-
-    def _make_serializable(self, obj):
-        """Convert object to JSON serializable format."""
-        if hasattr(obj, "__dict__"):
-            # Convert custom objects to dictionaries
-            return {k: self._make_serializable(v) for k, v in obj.__dict__.items()}
-        elif isinstance(obj, dict):
-            # Process each value in the dictionary
-            return {k: self._make_serializable(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            # Process each item in the list
-            return [self._make_serializable(i) for i in obj]
-        elif hasattr(obj, "to_dict") and callable(getattr(obj, "to_dict")):
-            # Use to_dict method if available
-            return self._make_serializable(obj.to_dict())
-        else:
-            # Return the object as is if it's likely JSON serializable
-            return obj
+            logger.error("Error saving metadata: %s", e)
+            return
+        self._remove_legacy(self.metadata_dir, f"{document_id}.json")
     
     def _get_metadata(self, document_id: str) -> Optional[Dict[str, Any]]:
         """Get document metadata."""
-        metadata_file = os.path.join(self.metadata_dir, f"{document_id}.json")
+        metadata_file = self._find_metadata_path(document_id)
         
-        if not os.path.exists(metadata_file):
+        if metadata_file is None:
             return None
         
         try:
-            with open(metadata_file, "r") as f:
-                return json.load(f)
+            data = read_bytes(metadata_file)
+            return serialization.loads(data) if data is not None else None
         except Exception as e:
-            logger.error(f"Error reading metadata: {str(e)}")
-            return None
\ No newline at end of file
+            logger.error("Error reading metadata: %s", e)
+            return None
@@ -0,0 +1,79 @@
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Process-wide state per lock file, shared by every StripedFileLock instance
+_registry_lock = threading.Lock()
+_stripes: Dict[str, "_Stripe"] = {}
+
+class _Stripe:
+    """One lock file plus the in-process reentrant lock guarding its descriptor."""
+
+    def __init__(self, path: str):
+        """Initialize stripe."""
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def acquire(self) -> None:
+        """Take the thread lock, then the advisory file lock on first entry."""
+        self.thread_lock.acquire()
+        try:
+            if self.depth == 0:
+                if self.file is None:
+                    self.file = open(self.path, "a")
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            self.depth += 1
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+    def release(self) -> None:
+        """Release the file lock on last exit, then the thread lock."""
+        try:
+            self.depth -= 1
+            if self.depth == 0:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.thread_lock.release()
+
+class StripedFileLock:
+    """Cross-process locks keyed by document id, striped over a fixed set of lock files.
+
+    Keys hash onto `stripes` lock files, so unrelated documents rarely contend
+    and the number of open descriptors stays bounded. Within a process a
+    reentrant lock serializes threads; across processes `flock` does.
+    """
+
+    def __init__(self, lock_dir: str, stripes: int = 1024):
+        """Initialize lock directory."""
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def stripe_for(self, key: str) -> int:
+        """Stripe index of a key."""
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16) % self.stripes
+
+    def _stripe(self, index: int) -> _Stripe:
+        """Shared stripe object for an index."""
+        path = os.path.join(self.lock_dir, f"stripe-{index:05d}.lock")
+        with _registry_lock:
+            stripe = _stripes.get(path)
+            if stripe is None:
+                stripe = _stripes[path] = _Stripe(path)
+            return stripe
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Hold the lock for a key for the duration of the block."""
+        stripe = self._stripe(self.stripe_for(key))
+        stripe.acquire()
+        try:
+            yield
+        finally:
+            stripe.release()
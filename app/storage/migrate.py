@@ -0,0 +1,133 @@
+"""Move an existing flat `uploads/` tree into the sharded DocumentStore layout.
+
+The server keeps running during migration: the store reads both layouts and
+prefers the sharded one, and each document is moved with renames in an
+order that always leaves a readable copy in place.
+
+Usage: python -m app.storage.migrate [--batch-size 500] [--pause 0.1] [--dry-run]
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Dict, Tuple
+
+from app.storage.atomic import atomic_write, is_temp_file, read_bytes
+from app.storage.document_store import DocumentStore, is_shard_dir
+
+logger = logging.getLogger(__name__)
+
+def _legacy_entries(base_dir: str, directories: bool):
+    """Top-level entries of a directory that belong to the flat layout."""
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            if entry.is_dir() != directories or is_temp_file(entry.name):
+                continue
+            if directories and is_shard_dir(entry.name):
+                continue
+            yield entry.name
+
+def _merge_dir(legacy_dir: str, sharded_dir: str, dry_run: bool) -> Tuple[int, int]:
+    """Move a legacy directory into its shard; returns (files moved, files skipped).
+
+    When the sharded directory already exists, as it does once the server has
+    written a page log, passages or a context cache entry there, the legacy
+    files are moved in one by one. Files present in both are newer in the
+    shard and stay in the legacy directory.
+    """
+    if not os.path.isdir(legacy_dir):
+        return 0, 0
+    if not os.path.exists(sharded_dir):
+        if not dry_run:
+            os.makedirs(os.path.dirname(sharded_dir), exist_ok=True)
+            os.rename(legacy_dir, sharded_dir)
+        return 1, 0
+
+    moved = skipped = 0
+    for root, _, files in os.walk(legacy_dir, topdown=False):
+        target_root = os.path.join(sharded_dir, os.path.relpath(root, legacy_dir))
+        for name in files:
+            if is_temp_file(name):
+                continue
+            if os.path.exists(os.path.join(target_root, name)):
+                skipped += 1
+                continue
+            moved += 1
+            if not dry_run:
+                os.makedirs(target_root, exist_ok=True)
+                os.rename(os.path.join(root, name), os.path.join(target_root, name))
+        if not dry_run:
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass  # still holds skipped files
+    return moved, skipped
+
+def migrate_document(store: DocumentStore, document_id: str, dry_run: bool = False) -> Dict[str, int]:
+    """Move one document's file directory, metadata and chat history to its shard."""
+    moved = {"files": 0, "metadata": 0, "chat": 0, "skipped": 0}
+
+    for key, base_dir in (("files", store.files_dir), ("chat", store.chat_dir)):
+        legacy_dir = os.path.join(base_dir, document_id)
+        count, skipped = _merge_dir(legacy_dir, store._sharded_path(base_dir, document_id), dry_run)
+        moved[key] = int(count > 0)
+        if skipped:
+            moved["skipped"] += skipped
+            logger.warning("Kept %d legacy %s files of document %s that also exist in its shard, in %s",
+                           skipped, key, document_id, legacy_dir)
+
+    legacy_metadata = store._metadata_path(document_id, legacy=True)
+    data = read_bytes(legacy_metadata)
+    if data is not None:
+        moved["metadata"] = 1
+        if not dry_run:
+            # The file's blob key is derived from the document id, so no path needs rewriting
+            sharded_metadata = store._metadata_path(document_id)
+            os.makedirs(os.path.dirname(sharded_metadata), exist_ok=True)
+            # A concurrent write may already have moved it; that copy is newer
+            if not os.path.exists(sharded_metadata):
+                atomic_write(sharded_metadata, data)
+            os.remove(legacy_metadata)
+
+    return moved
+
+def migrate_layout(store: DocumentStore, batch_size: int = 500, pause: float = 0.1, dry_run: bool = False) -> Dict[str, int]:
+    """Migrate every legacy document, pausing between batches to limit I/O pressure."""
+    if not store.shard_depth:
+        raise ValueError("Shard depth is 0; nothing to migrate")
+
+    document_ids = {name[:-len(".json")] for name in _legacy_entries(store.metadata_dir, directories=False)
+                    if name.endswith(".json")}
+    document_ids.update(_legacy_entries(store.files_dir, directories=True))
+    document_ids.update(_legacy_entries(store.chat_dir, directories=True))
+
+    totals = {"documents": 0, "files": 0, "metadata": 0, "chat": 0, "skipped": 0}
+    for i, document_id in enumerate(sorted(document_ids), start=1):
+        try:
+            with store.locks.lock(document_id):
+                moved = migrate_document(store, document_id, dry_run=dry_run)
+        except Exception as e:
+            logger.error("Error migrating document %s: %s", document_id, e)
+            continue
+        totals["documents"] += 1
+        for key, count in moved.items():
+            totals[key] += count
+        if i % batch_size == 0:
+            logger.info("Migrated %d/%d documents", i, len(document_ids))
+            time.sleep(pause)
+
+    return totals
+
+if __name__ == "__main__":
+    from app.config import get_settings
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    store = DocumentStore.from_settings(settings)
+    print(migrate_layout(store, batch_size=args.batch_size, pause=args.pause, dry_run=args.dry_run))
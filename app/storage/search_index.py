@@ -0,0 +1,292 @@
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.storage import serialization
+from app.storage.atomic import atomic_write
+from app.storage.locks import StripedFileLock
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase index terms."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+def strip_markdown_images(markdown: str) -> str:
+    """Remove image references, which carry no searchable text."""
+    return IMAGE_RE.sub(" ", markdown)
+
+class SearchIndex:
+    """Persistent page-level inverted index over OCR'd documents.
+
+    Postings are spread over hash buckets (`terms/{bucket}.json`, mapping
+    term -> document id -> page number -> [term frequency, page length]) so a
+    query only reads the buckets of its terms. A forward file per document (`docs/{id}.json`)
+    holds its terms and page texts, which makes deletes and snippets cheap.
+    Pages are ranked with BM25.
+
+    A document's terms touch most buckets, so adds and removes do not rewrite
+    them: each appends one line per bucket to `terms/{bucket}.log`, and
+    readers replay it over the bucket. A bucket is merged with its log once
+    the log grows past `compact_bytes` and the bucket's own size, which keeps
+    the rewriting per indexed byte constant.
+    """
+
+    def __init__(self, index_dir: str, bucket_bits: int = 12, compact_bytes: int = 64 * 1024):
+        """Initialize index directories."""
+        self.index_dir = index_dir
+        self.terms_dir = os.path.join(index_dir, "terms")
+        self.docs_dir = os.path.join(index_dir, "docs")
+        self.stats_file = os.path.join(index_dir, "stats.json")
+        self.bucket_chars = max(1, bucket_bits // 4)
+        self.compact_bytes = compact_bytes
+
+        os.makedirs(self.terms_dir, exist_ok=True)
+        os.makedirs(self.docs_dir, exist_ok=True)
+        # Writes touch shared buckets and stats, so they take one index-wide lock
+        self._locks = StripedFileLock(os.path.join(index_dir, "locks"), stripes=1)
+
+    def _bucket(self, term: str) -> str:
+        """Bucket name for a term."""
+        return hashlib.md5(term.encode("utf-8")).hexdigest()[:self.bucket_chars]
+
+    def _read(self, path: str, default: Any) -> Any:
+        """Read a JSON file, returning a default when it is missing."""
+        try:
+            with open(path, "rb") as f:
+                return serialization.loads(f.read())
+        except FileNotFoundError:
+            return default
+
+    def _write(self, path: str, data: Any) -> None:
+        """Write a JSON file atomically."""
+        atomic_write(path, serialization.dumps(data), fsync=False)
+
+    def _stats(self) -> Dict[str, int]:
+        """Corpus statistics used for scoring."""
+        return self._read(self.stats_file, {"documents": 0, "pages": 0, "length": 0})
+
+    def _bucket_paths(self, bucket: str) -> Tuple[str, str]:
+        """Merged postings file and delta log of a bucket."""
+        return os.path.join(self.terms_dir, f"{bucket}.json"), os.path.join(self.terms_dir, f"{bucket}.log")
+
+    def _read_bucket(self, bucket: str) -> Dict[str, Dict[str, Dict[str, List[int]]]]:
+        """A bucket's postings with its delta log applied."""
+        path, log_path = self._bucket_paths(bucket)
+        # The log is read first: a merge in between leaves its entries in the
+        # bucket as well, and replaying them again is harmless
+        try:
+            with open(log_path, "rb") as f:
+                log = f.read()
+        except FileNotFoundError:
+            log = b""
+        data = self._read(path, {})
+        # A trailing line without a newline is an append still in progress
+        for line in log.split(b"\n")[:-1]:
+            document_id, terms = serialization.loads(line)
+            _apply(data, document_id, terms)
+        return data
+
+    def _update_buckets(self, document_id: str, postings: Dict[str, Dict[str, List[int]]]) -> None:
+        """Replace a document's postings for the given terms; empty postings remove them."""
+        by_bucket: Dict[str, Dict[str, Dict[str, List[int]]]] = defaultdict(dict)
+        for term, pages in postings.items():
+            by_bucket[self._bucket(term)][term] = pages
+
+        for bucket, terms in by_bucket.items():
+            path, log_path = self._bucket_paths(bucket)
+            with open(log_path, "ab") as f:
+                f.write(serialization.dumps([document_id, terms]) + b"\n")
+                log_size = f.tell()
+            try:
+                bucket_size = os.path.getsize(path)
+            except FileNotFoundError:
+                bucket_size = 0
+            if log_size >= max(self.compact_bytes, bucket_size):
+                self._merge_bucket(bucket)
+
+    def _merge_bucket(self, bucket: str) -> None:
+        """Fold a bucket's delta log into it; the caller holds the write lock."""
+        path, log_path = self._bucket_paths(bucket)
+        self._write(path, self._read_bucket(bucket))
+        # Replaced rather than truncated, so readers holding the old log still read all of it
+        atomic_write(log_path, b"", fsync=False)
+
+    def compact(self) -> int:
+        """Merge every bucket with a pending delta log; returns the number merged."""
+        merged = 0
+        with self._locks.lock("index"):
+            for name in os.listdir(self.terms_dir):
+                if name.endswith(".log") and os.path.getsize(os.path.join(self.terms_dir, name)):
+                    self._merge_bucket(name[:-len(".log")])
+                    merged += 1
+        return merged
+
+    def _remove_locked(self, document_id: str) -> bool:
+        """Remove a document; the caller holds the write lock."""
+        forward_file = os.path.join(self.docs_dir, f"{document_id}.json")
+        forward = self._read(forward_file, None)
+        if forward is None:
+            return False
+
+        self._update_buckets(document_id, {term: {} for term in forward["terms"]})
+
+        stats = self._stats()
+        stats["documents"] -= 1
+        stats["pages"] -= len(forward["pages"])
+        stats["length"] -= sum(page["length"] for page in forward["pages"].values())
+        self._write(self.stats_file, stats)
+
+        os.remove(forward_file)
+        return True
+
+    def add_document(self, document_id: str, filename: str, pages: Iterable[Dict[str, Any]]) -> None:
+        """Index a document's pages, replacing any previous version."""
+        started = time.perf_counter()
+        postings: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+        forward_pages: Dict[str, Dict[str, Any]] = {}
+
+        for page in pages:
+            text = strip_markdown_images(page.get("markdown") or "")
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            page_number = str(page["page_number"])
+            for term, count in Counter(tokens).items():
+                postings[term][page_number] = [count, len(tokens)]
+            forward_pages[page_number] = {"length": len(tokens), "text": text}
+
+        with self._locks.lock("index"):
+            self._remove_locked(document_id)
+            self._update_buckets(document_id, postings)
+
+            stats = self._stats()
+            stats["documents"] += 1
+            stats["pages"] += len(forward_pages)
+            stats["length"] += sum(page["length"] for page in forward_pages.values())
+            self._write(self.stats_file, stats)
+
+            self._write(os.path.join(self.docs_dir, f"{document_id}.json"), {
+                "filename": filename,
+                "terms": sorted(postings),
+                "pages": forward_pages,
+            })
+
+        logger.debug("Indexed document %s: %d pages, %d terms in %.1fms",
+                     document_id, len(forward_pages), len(postings), (time.perf_counter() - started) * 1000)
+
+    def remove_document(self, document_id: str) -> bool:
+        """Remove a document from the index."""
+        with self._locks.lock("index"):
+            return self._remove_locked(document_id)
+
+    def search(self, query: str, limit: int = 10) -> Tuple[int, List[Dict[str, Any]]]:
+        """Rank pages matching a query; returns the match count and top hits."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+
+        stats = self._stats()
+        total_pages = max(stats["pages"], 1)
+        avg_length = stats["length"] / total_pages if stats["pages"] else 1.0
+
+        postings: Dict[str, Dict[str, Dict[str, List[int]]]] = {}
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for term in terms:
+            bucket = self._bucket(term)
+            if bucket not in buckets:
+                buckets[bucket] = self._read_bucket(bucket)
+            postings[term] = buckets[bucket].get(term, {})
+
+        forward_cache: Dict[str, Dict[str, Any]] = {}
+
+        def forward(document_id: str) -> Dict[str, Any]:
+            if document_id not in forward_cache:
+                forward_cache[document_id] = self._read(
+                    os.path.join(self.docs_dir, f"{document_id}.json"), {"filename": None, "pages": {}}
+                )
+            return forward_cache[document_id]
+
+        scores: Dict[Tuple[str, str], float] = defaultdict(float)
+        for term, documents in postings.items():
+            df = sum(len(pages) for pages in documents.values())
+            idf = math.log(1 + (total_pages - df + 0.5) / (df + 0.5))
+            for document_id, pages in documents.items():
+                for page_number, (tf, length) in pages.items():
+                    norm = tf + K1 * (1 - B + B * length / avg_length)
+                    scores[(document_id, page_number)] += idf * tf * (K1 + 1) / norm
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        hits = []
+        for (document_id, page_number), score in top:
+            document = forward(document_id)
+            page = document["pages"].get(page_number, {})
+            hits.append({
+                "document_id": document_id,
+                "filename": document.get("filename"),
+                "page_number": int(page_number),
+                "score": round(score, 4),
+                "snippet": make_snippet(page.get("text", ""), terms),
+            })
+        return len(scores), hits
+
+def _apply(data: Dict[str, Dict[str, Dict[str, List[int]]]], document_id: str,
+           terms: Dict[str, Dict[str, List[int]]]) -> None:
+    """Set or, for empty postings, remove a document's postings for some terms."""
+    for term, pages in terms.items():
+        entry = data.setdefault(term, {})
+        if pages:
+            entry[document_id] = pages
+        else:
+            entry.pop(document_id, None)
+            if not entry:
+                del data[term]
+
+def make_snippet(text: str, terms: List[str], width: int = 160) -> str:
+    """Cut a window of text around the first matching term."""
+    lowered = text.lower()
+    positions = []
+    for term in terms:
+        match = re.search(rf"\b{re.escape(term)}\b", lowered)
+        if match:
+            positions.append(match.start())
+    center = min(positions) if positions else 0
+    start = max(0, center - width // 2)
+    end = min(len(text), start + width)
+    snippet = " ".join(text[start:end].split())
+    return f"{'…' if start > 0 else ''}{snippet}{'…' if end < len(text) else ''}"
+
+def rebuild(document_store, index: SearchIndex) -> int:
+    """Index every completed document in a store; returns the number indexed."""
+    count = 0
+    for document_id in document_store.list_document_ids():
+        document = document_store.get_document(document_id)
+        if document and document.get("status") == "completed" and document.get("pages"):
+            index.add_document(document_id, document.get("filename"), document["pages"])
+            count += 1
+    index.compact()
+    return count
+
+if __name__ == "__main__":
+    from app.config import get_settings
+    from app.storage.document_store import DocumentStore
+
+    settings = get_settings()
+    indexed = rebuild(
+        DocumentStore.from_settings(settings),
+        SearchIndex(os.path.join(settings.UPLOAD_DIR, "index"))
+    )
+    print(f"Indexed {indexed} documents")
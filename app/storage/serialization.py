@@ -0,0 +1,114 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional dependency, falls back to the standard library
+    orjson = None
+
+# Fields of app.models.responses.OCRResponse, in response order
+OCR_RESPONSE_FIELDS = (
+    "document_id", "filename", "status", "content", "display_content", "pages", "pages_available", "error"
+)
+
+def dumps(obj: Any, compact: bool = True) -> bytes:
+    """Encode JSON-compatible data to UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=to_jsonable) if compact else orjson.dumps(
+            obj, default=to_jsonable, option=orjson.OPT_INDENT_2
+        )
+    return json.dumps(
+        obj,
+        default=to_jsonable,
+        separators=(",", ":") if compact else None,
+        indent=None if compact else 2,
+        ensure_ascii=False
+    ).encode("utf-8")
+
+def loads(data: bytes) -> Any:
+    """Decode JSON bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def to_jsonable(obj: Any) -> Any:
+    """Convert an arbitrary object to JSON-compatible data.
+
+    Used as the `default` hook, so it is only reached for values the encoder
+    does not handle natively.
+    """
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "to_dict") and callable(getattr(obj, "to_dict")):
+        return obj.to_dict()
+    if hasattr(obj, "__dict__"):
+        return {k: v for k, v in obj.__dict__.items() if not k.startswith("_")}
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _encode_image(image: Any) -> Dict[str, Any]:
+    """Encode one OCR image's placement; the base64 data is stored once, in `pages`."""
+    return {
+        "id": image.id,
+        "top_left_x": getattr(image, "top_left_x", None),
+        "top_left_y": getattr(image, "top_left_y", None),
+        "bottom_right_x": getattr(image, "bottom_right_x", None),
+        "bottom_right_y": getattr(image, "bottom_right_y", None),
+    }
+
+def _encode_dimensions(dimensions: Any) -> Optional[Dict[str, Any]]:
+    """Encode page dimensions."""
+    if dimensions is None:
+        return None
+    return {"dpi": dimensions.dpi, "height": dimensions.height, "width": dimensions.width}
+
+def encode_ocr_page(page: Any) -> Dict[str, Any]:
+    """Encode the layout of one page of a Mistral OCR result; markdown is stored in `pages`."""
+    return {
+        "index": page.index,
+        "images": [_encode_image(image) for image in page.images or []],
+        "dimensions": _encode_dimensions(getattr(page, "dimensions", None)),
+    }
+
+def encode_ocr_result(ocr_result: Any) -> Dict[str, Any]:
+    """Encode a Mistral OCR result by its known schema instead of walking `__dict__`."""
+    usage_info = getattr(ocr_result, "usage_info", None)
+    return {
+        "model": getattr(ocr_result, "model", None),
+        "pages": [encode_ocr_page(page) for page in ocr_result.pages],
+        "usage_info": {
+            "pages_processed": usage_info.pages_processed,
+            "doc_size_bytes": getattr(usage_info, "doc_size_bytes", None),
+        } if usage_info is not None else None,
+    }
+
+def response_pages(ocr_result: Any, offset: int = 0) -> List[Dict[str, Any]]:
+    """Build pages in the shape of the `PageContent` response model."""
+    return [
+        {
+            "page_number": offset + i + 1,
+            "markdown": page.markdown,
+            "images": {image.id: image.image_base64 for image in page.images or []} or None,
+        }
+        for i, page in enumerate(ocr_result.pages)
+    ]
+
+def page_texts(pages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """The `content` and page-labelled `display_content` of OCR pages."""
+    content = []
+    display_content = []
+    for page in pages:
+        page_content = (page.get("markdown") or "").strip()
+        if page_content:
+            content.append(page_content + "\n\n")
+            display_content.append(f"Page {page['page_number']}:\n{page_content}\n\n----------\n\n")
+    return "".join(content), "".join(display_content)
+
+def encode_document_response(document: Dict[str, Any]) -> bytes:
+    """Encode stored metadata as an `OCRResponse` body without pydantic validation.
+
+    Stored metadata already holds `pages` in the `PageContent` shape, so
+    projecting the response fields is enough.
+    """
+    return dumps({field: document.get(field) for field in OCR_RESPONSE_FIELDS})
@@ -0,0 +1,318 @@
+"""Export and import documents, OCR results and chat histories as gzip-compressed NDJSON.
+
+An export is one stream of JSON lines: a header, then for every document its
+metadata (including OCR pages), its chat history, its original file in
+base64 chunks and its OCR images, then a trailer. Exports are produced with constant
+memory and can be served over HTTP as they are generated.
+
+Imports write documents in batches and record their progress next to the
+input file, so an interrupted import resumes where it stopped. Completed
+documents are added to the search index as they are written; their tables
+are extracted on first use.
+
+Usage:
+    python -m app.storage.transfer export OUTPUT [--since DATE] [--until DATE] [--status STATUS] [--no-files]
+    python -m app.storage.transfer import INPUT [--batch-size 100] [--since DATE] [--until DATE] [--status STATUS]
+"""
+import argparse
+import base64
+import gzip
+import io
+import logging
+import os
+import tempfile
+import time
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from app.storage import serialization
+from app.storage.atomic import atomic_write, read_bytes, remove_path
+from app.storage.document_store import DocumentStore
+from app.storage.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FILE_CHUNK_SIZE = 512 * 1024
+FLUSH_SIZE = 256 * 1024
+# Metadata that only makes sense on the exporting host
+LOCAL_FIELDS = ("original_path",)
+
+def matches(metadata: Dict[str, Any], since: Optional[str], until: Optional[str], statuses: Optional[Sequence[str]]) -> bool:
+    """Whether a document passes the creation date range and status filters.
+
+    Dates are ISO 8601 strings, compared the way `created_at` is stored.
+    """
+    created_at = metadata.get("created_at") or ""
+    if since and created_at < since:
+        return False
+    if until and created_at >= until:
+        return False
+    return not statuses or metadata.get("status") in statuses
+
+def iter_export_records(
+    store: DocumentStore,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    statuses: Optional[Sequence[str]] = None,
+    include_files: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """Records of every matching document, one document at a time."""
+    yield {"type": "header", "version": FORMAT_VERSION, "created_at": time.time()}
+    exported = 0
+    for document_id in sorted(store.list_document_ids()):
+        metadata = store.get_document(document_id)
+        if not metadata or not matches(metadata, since, until, statuses):
+            continue
+        yield {"type": "document", "document": {k: v for k, v in metadata.items() if k not in LOCAL_FIELDS}}
+
+        messages = store.get_chat_history(document_id)
+        if messages:
+            record = {"type": "chat", "document_id": document_id, "messages": messages}
+            summary = store.get_chat_summary(document_id)
+            if summary:
+                record["summary"] = summary
+            yield record
+
+        key = store.document_blob_key(metadata) if metadata.get("type") == "file" else None
+        if include_files and key and store.blob_store.size(key) is not None:
+            offset = 0
+            for chunk in _rechunk(store.blob_store.iter_range(key), FILE_CHUNK_SIZE):
+                yield {"type": "file", "document_id": document_id, "offset": offset, "data": base64.b64encode(chunk).decode("ascii")}
+                offset += len(chunk)
+
+        # Images extracted to blob storage; older documents keep them inline in `pages`
+        for page in metadata.get("pages") or []:
+            for image_id, value in (page.get("images") or {}).items():
+                if not value or not value.startswith("/"):
+                    continue
+                image_key = store.image_key(document_id, image_id)
+                if store.blob_store.size(image_key) is not None:
+                    data = base64.b64encode(store.blob_store.read(image_key)).decode("ascii")
+                    yield {"type": "image", "document_id": document_id, "image_id": image_id, "data": data}
+        exported += 1
+    yield {"type": "end", "documents": exported}
+
+def _rechunk(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Regroup a byte stream into pieces of `size` bytes (the last may be shorter)."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+def gzip_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode records as gzip-compressed NDJSON, in pieces of roughly `FLUSH_SIZE` bytes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending: List[bytes] = []
+    pending_size = 0
+    for record in records:
+        out = compressor.compress(serialization.dumps(record) + b"\n")
+        if out:
+            pending.append(out)
+            pending_size += len(out)
+        if pending_size >= FLUSH_SIZE:
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+    pending.append(compressor.flush())
+    yield b"".join(pending)
+
+def export_to_file(store: DocumentStore, path: str, **filters) -> None:
+    """Write an export to a file."""
+    with open(path, "wb") as f:
+        for piece in gzip_ndjson(iter_export_records(store, **filters)):
+            f.write(piece)
+
+class Importer:
+    """Imports an export stream into a DocumentStore in batches.
+
+    A document is committed once all of its records have been read; every
+    `batch_size` documents the batch is written and the input line reached is
+    saved to the checkpoint file. Restarting with the same checkpoint skips
+    the lines already imported. Original files are spooled to temporary files
+    and images are written to blob storage as they are read, so memory stays
+    constant regardless of file and batch size. With a `search_index`,
+    completed documents are indexed as each batch is written.
+    """
+
+    def __init__(
+        self,
+        store: DocumentStore,
+        checkpoint_path: Optional[str] = None,
+        batch_size: int = 100,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        statuses: Optional[Sequence[str]] = None,
+        search_index: Optional[SearchIndex] = None
+    ):
+        """Initialize importer."""
+        self.store = store
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.filters = (since, until, statuses)
+        self.search_index = search_index
+        self.totals = {"documents": 0, "skipped": 0, "files": 0, "indexed": 0}
+
+        self._batch: List[Dict[str, Any]] = []
+        self._current: Optional[Dict[str, Any]] = None
+        self._line = 0
+
+    def _load_checkpoint(self) -> int:
+        """Input line reached by a previous run."""
+        data = read_bytes(self.checkpoint_path) if self.checkpoint_path else None
+        if data is None:
+            return 0
+        checkpoint = serialization.loads(data)
+        self.totals.update(checkpoint.get("totals", {}))
+        return checkpoint["line"]
+
+    def _save_checkpoint(self, line: int) -> None:
+        """Record the input line up to which everything has been written."""
+        if self.checkpoint_path:
+            atomic_write(self.checkpoint_path, serialization.dumps({"line": line, "totals": self.totals}))
+
+    def run(self, lines: Iterable[bytes]) -> Dict[str, int]:
+        """Import records from NDJSON lines; returns totals including earlier runs."""
+        resume_from = self._load_checkpoint()
+        if resume_from:
+            logger.info("Resuming import after line %d", resume_from)
+        try:
+            for self._line, line in enumerate(lines, start=1):
+                if self._line <= resume_from or not line.strip():
+                    continue
+                self._handle(serialization.loads(line))
+            self._finish_document()
+            self._flush()
+        finally:
+            self._discard_current()
+            for entry in self._batch:
+                if entry.get("spool"):
+                    entry["spool"].close()
+        return self.totals
+
+    def _handle(self, record: Dict[str, Any]) -> None:
+        """Apply one record."""
+        kind = record["type"]
+        if kind == "header":
+            if record.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported export version: {record.get('version')}")
+        elif kind == "document":
+            self._finish_document()
+            metadata = record["document"]
+            if matches(metadata, *self.filters):
+                self._current = {"metadata": metadata, "messages": [], "spool": None}
+            else:
+                self.totals["skipped"] += 1
+                self._current = {"skip": True}
+        elif kind in ("chat", "file", "image"):
+            current = self._current
+            if current is None or current.get("skip"):
+                return
+            if record["document_id"] != current["metadata"]["document_id"]:
+                raise ValueError(f"Record for {record['document_id']} outside its document at line {self._line}")
+            if kind == "chat":
+                current["messages"] = record["messages"]
+                current["summary"] = record.get("summary")
+            elif kind == "image":
+                # Written straight away so images never accumulate in memory; rewriting them on resume is harmless
+                key = self.store.image_key(current["metadata"]["document_id"], record["image_id"])
+                self.store.blob_store.put_stream(key, io.BytesIO(base64.b64decode(record["data"])))
+            else:
+                if current["spool"] is None:
+                    current["spool"] = tempfile.TemporaryFile()
+                current["spool"].seek(record["offset"])
+                current["spool"].write(base64.b64decode(record["data"]))
+        elif kind == "end":
+            self._finish_document()
+
+    def _finish_document(self) -> None:
+        """Queue the current document and write the batch when it is full."""
+        current, self._current = self._current, None
+        if current is None or current.get("skip"):
+            return
+        self._batch.append(current)
+        if len(self._batch) >= self.batch_size:
+            self._flush(self._line - 1)
+
+    def _flush(self, line: Optional[int] = None) -> None:
+        """Write the queued documents and checkpoint."""
+        batch, self._batch = self._batch, []
+        for entry in batch:
+            spool = entry.pop("spool", None)
+            if spool is not None:
+                spool.seek(0)
+                self._write_file(entry["metadata"], spool)
+                spool.close()
+                self.totals["files"] += 1
+        self.store.import_documents(batch)
+        self.totals["documents"] += len(batch)
+        self._index(batch)
+        self._save_checkpoint(self._line if line is None else line)
+        if batch:
+            logger.info("Imported %d documents", self.totals["documents"])
+
+    def _index(self, batch: List[Dict[str, Any]]) -> None:
+        """Add the batch's completed documents to the search index; failures do not fail the import."""
+        if self.search_index is None:
+            return
+        for entry in batch:
+            metadata = entry["metadata"]
+            if metadata.get("status") != "completed" or not metadata.get("pages"):
+                continue
+            try:
+                self.search_index.add_document(metadata["document_id"], metadata.get("filename"), metadata["pages"])
+                self.totals["indexed"] += 1
+            except Exception as e:
+                logger.error("Error indexing imported document %s: %s", metadata["document_id"], e)
+
+    def _write_file(self, metadata: Dict[str, Any], spool: BinaryIO) -> None:
+        """Store a document's original file and point its metadata at it."""
+        key = self.store.blob_key(metadata["document_id"], metadata.get("filename") or "")
+        metadata["size"] = self.store.blob_store.put_stream(key, spool)
+        metadata["blob_key"] = key
+
+    def _discard_current(self) -> None:
+        """Close the spool of a document that was not committed."""
+        if self._current and self._current.get("spool"):
+            self._current["spool"].close()
+
+def import_from_file(
+    store: DocumentStore,
+    path: str,
+    batch_size: int = 100,
+    search_index: Optional[SearchIndex] = None,
+    **filters
+) -> Dict[str, int]:
+    """Import an export file, resuming from `<path>.progress` if present."""
+    checkpoint_path = f"{path}.progress"
+    with gzip.open(path, "rb") as f:
+        totals = Importer(store, checkpoint_path, batch_size=batch_size, search_index=search_index, **filters).run(f)
+    remove_path(checkpoint_path)
+    return totals
+
+if __name__ == "__main__":
+    from app.config import get_settings
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="Export file (.ndjson.gz)")
+    parser.add_argument("--since", help="Only documents created at or after this ISO date")
+    parser.add_argument("--until", help="Only documents created before this ISO date")
+    parser.add_argument("--status", action="append", dest="statuses", help="Only documents with this status (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents written per batch on import")
+    parser.add_argument("--no-files", action="store_true", help="Leave original files out of the export")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    store = DocumentStore.from_settings(settings)
+    filters = {"since": args.since, "until": args.until, "statuses": args.statuses}
+    if args.command == "export":
+        export_to_file(store, args.path, include_files=not args.no_files, **filters)
+        print(f"Exported to {args.path}")
+    else:
+        search_index = SearchIndex(os.path.join(settings.UPLOAD_DIR, "index"))
+        print(import_from_file(store, args.path, batch_size=args.batch_size, search_index=search_index, **filters))
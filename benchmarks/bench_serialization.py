@@ -0,0 +1,108 @@
+"""Benchmark DocumentStore serialization.
+
+Reports encode and decode time per MB of stored metadata for the legacy path
+(recursive walk + indented json), the schema-aware encoder with the standard
+library, and the schema-aware encoder with orjson when it is installed.
+
+Usage: python -m benchmarks.bench_serialization [--pages 200] [--repeat 5]
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+from mistralai.models import OCRImageObject, OCRPageDimensions, OCRPageObject, OCRResponse, OCRUsageInfo
+
+from app.storage import serialization
+
+def build_ocr_result(pages: int) -> OCRResponse:
+    """Build a synthetic OCR result with text and one image per page."""
+    image = "data:image/jpeg;base64," + base64.b64encode(os.urandom(24 * 1024)).decode("ascii")
+    return OCRResponse(
+        model="mistral-ocr-latest",
+        usage_info=OCRUsageInfo(pages_processed=pages, doc_size_bytes=pages * 40000),
+        pages=[
+            OCRPageObject(
+                index=i,
+                markdown=f"# Page {i}\n\n" + "Lorem ipsum dolor sit amet, consectetur adipiscing. " * 120
+                         + f"\n\n![img-{i}.jpeg](img-{i}.jpeg)\n\n| a | b |\n|---|---|\n| {i} | {i * 2} |",
+                images=[OCRImageObject(
+                    id=f"img-{i}.jpeg", top_left_x=0, top_left_y=0,
+                    bottom_right_x=100, bottom_right_y=100, image_base64=image
+                )],
+                dimensions=OCRPageDimensions(dpi=200, height=2200, width=1700),
+            )
+            for i in range(pages)
+        ],
+    )
+
+def legacy_make_serializable(obj):
+    """The pre-encoder recursive walk, kept for comparison."""
+    if hasattr(obj, "__dict__"):
+        return {k: legacy_make_serializable(v) for k, v in obj.__dict__.items()}
+    elif isinstance(obj, dict):
+        return {k: legacy_make_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_make_serializable(i) for i in obj]
+    elif hasattr(obj, "to_dict") and callable(getattr(obj, "to_dict")):
+        return legacy_make_serializable(obj.to_dict())
+    return obj
+
+def timed(fn, repeat: int) -> float:
+    """Best wall time of several runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def report(name: str, encode_seconds: float, decode_seconds: float, size: int) -> None:
+    """Print per-MB timings."""
+    mb = size / (1024 * 1024)
+    print(f"{name:<24} size={mb:8.2f}MB  encode={encode_seconds * 1000 / mb:8.2f}ms/MB  "
+          f"decode={decode_seconds * 1000 / mb:8.2f}ms/MB")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ocr_result = build_ocr_result(args.pages)
+    metadata = {"document_id": "bench", "status": "completed", "ocr_result": ocr_result}
+
+    legacy = json.dumps(legacy_make_serializable(metadata), indent=2).encode("utf-8")
+    report(
+        "legacy json indent=2",
+        timed(lambda: json.dumps(legacy_make_serializable(metadata), indent=2), args.repeat),
+        timed(lambda: json.loads(legacy), args.repeat),
+        len(legacy),
+    )
+
+    def schema_metadata():
+        return {**metadata, "ocr_result": serialization.encode_ocr_result(ocr_result),
+                "pages": serialization.response_pages(ocr_result)}
+
+    stdlib = json.dumps(schema_metadata(), separators=(",", ":")).encode("utf-8")
+    report(
+        "schema-aware json",
+        timed(lambda: json.dumps(schema_metadata(), separators=(",", ":")).encode("utf-8"), args.repeat),
+        timed(lambda: json.loads(stdlib), args.repeat),
+        len(stdlib),
+    )
+
+    if serialization.orjson is not None:
+        fast = serialization.dumps(schema_metadata())
+        report(
+            "schema-aware orjson",
+            timed(lambda: serialization.dumps(schema_metadata()), args.repeat),
+            timed(lambda: serialization.loads(fast), args.repeat),
+            len(fast),
+        )
+    else:
+        print("orjson not installed, skipping")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark application import time.
+
+Imports `app.main` in fresh interpreters with `-X importtime` and reports
+the wall time of the import plus the slowest modules by cumulative import
+time, so regressions from eager SDK imports show up per module.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--top 15] [--module app.main]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, Tuple
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def measure(module: str) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """Import a module in a fresh interpreter; returns wall seconds and {module: (self_us, cumulative_us)}."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(), check=True
+    )
+    elapsed = time.perf_counter() - started
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return elapsed, modules
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="app.main")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    walls = sorted(elapsed for elapsed, _ in runs)
+    # Best of N per module filters out noise from the rest of the machine
+    best: Dict[str, Tuple[int, int]] = {}
+    for _, modules in runs:
+        for name, times in modules.items():
+            if name not in best or times[1] < best[name][1]:
+                best[name] = times
+
+    print(f"import {args.module}: best {walls[0] * 1000:.0f} ms, median {walls[len(walls) // 2] * 1000:.0f} ms "
+          f"over {args.repeat} runs, {len(best)} modules")
+    print(f"{'module':<50} {'self ms':>9} {'cumulative ms':>14}")
+    for name, (self_us, cumulative_us) in sorted(best.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+
+    print("\napp modules")
+    for name, (self_us, cumulative_us) in sorted(best.items()):
+        if name == "app" or name.startswith("app."):
+            print(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -64,7 +64,7 @@ const FileUpload = () => {
         ) : (
           <div>
             <p className="font-medium mb-1">Drag & drop a file here, or click to select</p>
-            <p className="text-sm text-gray-500">Support PDF, JPG, PNG (Max 10MB)</p>
+            <p className="text-sm text-gray-500">Support PDF, JPG, PNG (Max 500MB)</p>
           </div>
         )}
       </div>
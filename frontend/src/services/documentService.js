@@ -1,5 +1,7 @@
 import api from './api';
 
+const MAX_CHUNK_RETRIES = 5;
+
 const documentService = {
   /**
    * Upload a document (PDF or image) for processing
@@ -8,18 +10,40 @@ const documentService = {
    */
   uploadDocument: async (file) => {
     try {
-      const formData = new FormData();
-      formData.append('file', file);
+      // Start a resumable upload session
+      const { data: session } = await api.post('/api/uploads', {
+        filename: file.name,
+        size: file.size,
+        content_type: file.type || null,
+      });
+
+      // Send chunks in order, resuming from the server's offset after failures
+      let offset = session.offset;
+      let failures = 0;
+      while (offset < file.size) {
+        const chunk = file.slice(offset, offset + session.chunk_size);
+        try {
+          const { data } = await api.put(`/api/uploads/${session.upload_id}`, chunk, {
+            params: { offset },
+            headers: { 'Content-Type': 'application/octet-stream' },
+            timeout: 120000, // 2 minutes per chunk on slow links
+          });
+          offset = data.offset;
+          failures = 0;
+          console.log('Upload progress:', Math.round((offset * 100) / file.size));
+        } catch (error) {
+          failures += 1;
+          if (failures > MAX_CHUNK_RETRIES || (error.response && error.response.status < 500 && error.response.status !== 409)) {
+            throw error;
+          }
+          await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** failures));
+          const { data } = await api.get(`/api/uploads/${session.upload_id}`);
+          offset = data.offset;
+        }
+      }
 
-      const response = await api.post('/api/documents/upload', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-        timeout: 30000, // 30 second timeout for large files
-        onUploadProgress: (progressEvent) => {
-          const percentCompleted = Math.round((progressEvent.loaded * 100) / progressEvent.total);
-          console.log('Upload progress:', percentCompleted);
-        },
+      const response = await api.post(`/api/uploads/${session.upload_id}/complete`, null, {
+        timeout: 60000,
       });
       return response.data;
     } catch (error) {
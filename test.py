@@ -1,5 +1,6 @@
 import streamlit as st
 import base64
+import hashlib
 import tempfile
 import os
 from mistralai import Mistral
@@ -14,6 +15,21 @@ load_dotenv()
 api_key = os.getenv("MISTRAL_API_KEY", "")
 google_api_key = os.getenv("GOOGLE_API_KEY", "")
 
+# Clients and key checks are cached across reruns and sessions, per API key
+@st.cache_resource(show_spinner=False)
+def get_mistral_client(key):
+    """Mistral client for an API key, created once."""
+    return Mistral(key)
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_model(key):
+    """Gemini model for an API key, created once."""
+    return genai.GenerativeModel('gemma-3-27b-it')
+
+def file_hash(content):
+    """sha256 of file content, used as the OCR cache key."""
+    return hashlib.sha256(content).hexdigest()
+
 # OCR Processing Functions
 def upload_pdf(client, content, filename):
     """Uploads a PDF to Mistral's API and retrieves a signed URL for processing."""
@@ -77,20 +93,41 @@ def process_ocr(client, document_source):
         )
     else:
         raise ValueError(f"Unsupported document source type: {document_source['type']}")
-    
-def display_pdf(pdf_path):
-    """
-    Display a PDF file in Streamlit using PDF file viewer
-    
-    Args:
-        pdf_path (str): Path to the PDF file to display
-    """
-    # Open and read the PDF file
-    with open(pdf_path, "rb") as f:
-        base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-    
-    # Embed PDF viewer HTML
-    pdf_display = f"""
+
+def extract_content(ocr_response):
+    """Clean content for the model, display content with page numbers, and the page count."""
+    raw_content = []
+    display_content = []
+    for i, page in enumerate(ocr_response.pages):
+        page_content = page.markdown.strip()
+        if page_content:  # Only add non-empty pages
+            raw_content.append(page_content)
+            display_content.append(f"Page {i+1}:\n{page_content}")
+    return "\n\n".join(raw_content), "\n\n----------\n\n".join(display_content), len(raw_content)
+
+# OCR results are cached by content hash (or URL), so the same document is only sent once.
+# Arguments starting with "_" are not hashed by Streamlit.
+@st.cache_data(show_spinner=False, max_entries=32)
+def ocr_pdf(content_hash, _client, _content, filename):
+    """OCR an uploaded PDF; cached by its content hash."""
+    signed_url = upload_pdf(_client, _content, filename)
+    return extract_content(process_ocr(_client, {"type": "document_url", "document_url": signed_url}))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def ocr_image(content_hash, _client, _image_url):
+    """OCR an image given as a data URL; cached by its content hash."""
+    return extract_content(process_ocr(_client, {"type": "image_url", "image_url": _image_url}))
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def ocr_url(url, _client):
+    """OCR a document URL; cached for an hour, since the document may change."""
+    return extract_content(process_ocr(_client, {"type": "document_url", "document_url": url}))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def pdf_iframe(content_hash, _content):
+    """PDF viewer HTML with the file embedded as base64; encoded once per file."""
+    base64_pdf = base64.b64encode(_content).decode('utf-8')
+    return f"""
         <iframe
             src="data:application/pdf;base64,{base64_pdf}"
             width="100%"
@@ -99,13 +136,19 @@ def display_pdf(pdf_path):
         </iframe>
     """
     
-    # Display the PDF using HTML
-    st.markdown(pdf_display, unsafe_allow_html=True)
+def display_pdf(content):
+    """
+    Display a PDF file in Streamlit using PDF file viewer
+    
+    Args:
+        content (bytes): Content of the PDF file to display
+    """
+    st.markdown(pdf_iframe(file_hash(content), content), unsafe_allow_html=True)
 
 def generate_response(context, query):
     """Generate a response using Google Gemini API"""
     try:
-        # Initialize the Google Gemini API
+        # Point the Google Gemini API at the current key (no request is made)
         genai.configure(api_key=google_api_key)
         
         # Check for empty context
@@ -128,8 +171,8 @@ If the document doesn't specifically mention the exact information asked, please
         print(f"Sending prompt with {len(context)} characters of context")
         print(f"First 500 chars of context: {context[:500]}...")
         
-        # Generate response
-        model = genai.GenerativeModel('gemma-3-27b-it')
+        # Generate response with the cached model for this key
+        model = get_gemini_model(google_api_key)
         
         generation_config = {
             "temperature": 0.4,
@@ -171,10 +214,11 @@ If the document doesn't specifically mention the exact information asked, please
         print(traceback.format_exc())
         return f"Error generating response: {str(e)}"
     
+@st.cache_resource(show_spinner=False, ttl=3600)
 def test_google_api(api_key):
     """
-    Test if the provided Google API key is valid by attempting to create a model client
-    and make a simple request.
+    Test if the provided Google API key is valid by listing the models it can use.
+    The result is cached per key, so reruns do not repeat the request.
     
     Args:
         api_key (str): The Google API key to test
@@ -183,10 +227,12 @@ def test_google_api(api_key):
         tuple: (bool, str) - (is_valid, message)
     """
     try:
-        import google.generativeai as genai
         genai.configure(api_key=api_key)
         
-        # Try to list models as a validation test
+        # Listing models is a cheap validation test, unlike a generation round trip
+        for model in genai.list_models():
+            if "generateContent" in model.supported_generation_methods:
+                return True, "connected successfully"
                 
         return False, "No Gemini models found with this API key"
         
@@ -228,7 +274,7 @@ def main():
         # Initialize Mistral client with the API key
         mistral_client = None
         if api_key:
-            mistral_client = Mistral(api_key)  # Assuming Mistral is the client class from the imported module
+            mistral_client = get_mistral_client(api_key)
             if mistral_client:
                 st.sidebar.success("✅ Mistral API connected successfully")
         
@@ -265,41 +311,27 @@ def main():
         if mistral_client:
             input_method = st.radio("Select Input Type:", ["PDF Upload", "Image Upload", "URL"])
             
-            document_source = None
+            # Runs the cached OCR call for the chosen input: () -> (content, display content, page count)
+            run_ocr = None
             
             if input_method == "URL":
                 url = st.text_input("Document URL:")
                 if url and st.button("Load Document from URL"):
-                    document_source = {
-                        "type": "document_url",
-                        "document_url": url
-                    }
+                    run_ocr = lambda: ocr_url(url, mistral_client)
             
             elif input_method == "PDF Upload":
                 uploaded_file = st.file_uploader("Choose PDF file", type=["pdf"])
                 if uploaded_file and st.button("Process PDF"):
-                    content = uploaded_file.read()
-                    
-                    # Save the uploaded PDF temporarily for display purposes
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                        tmp.write(content)
-                        pdf_path = tmp.name
+                    content = uploaded_file.getvalue()
+                    content_hash = file_hash(content)
                     
-                    try:
-                        # Prepare document source for OCR processing
-                        document_source = {
-                            "type": "document_url",
-                            "document_url": upload_pdf(mistral_client, content, uploaded_file.name)
-                        }
-                        
-                        # Display the uploaded PDF
-                        st.header("Uploaded PDF")
-                        display_pdf(pdf_path)
-                    except Exception as e:
-                        st.error(f"Error processing PDF: {str(e)}")
-                        # Clean up the temporary file
-                        if os.path.exists(pdf_path):
-                            os.unlink(pdf_path)
+                    # Keep the PDF for the preview, which is only rendered on request
+                    st.session_state.pdf_content = content
+                    run_ocr = lambda: ocr_pdf(content_hash, mistral_client, content, uploaded_file.name)
+                
+                if st.session_state.get("pdf_content") and st.checkbox("Show uploaded PDF"):
+                    st.header("Uploaded PDF")
+                    display_pdf(st.session_state.pdf_content)
             
             elif input_method == "Image Upload":
                 uploaded_image = st.file_uploader("Choose Image file", type=["png", "jpg", "jpeg"])
@@ -314,48 +346,27 @@ def main():
                         image.save(buffered, format="PNG")
                         img_str = base64.b64encode(buffered.getvalue()).decode()
                         
-                        # Prepare document source for OCR processing
-                        document_source = {
-                            "type": "image_url",
-                            "image_url": f"data:image/png;base64,{img_str}"
-                        }
+                        # Prepare document source for OCR processing, cached by the uploaded bytes
+                        image_hash = file_hash(uploaded_image.getvalue())
+                        image_url = f"data:image/png;base64,{img_str}"
+                        run_ocr = lambda: ocr_image(image_hash, mistral_client, image_url)
                     except Exception as e:
                         st.error(f"Error processing image: {str(e)}")
             
             # Process document if source is provided
-            if document_source:
+            if run_ocr:
                 with st.spinner("Processing document..."):
                     try:
-                        ocr_response = process_ocr(mistral_client, document_source)
+                        final_content, display_formatted, page_count = run_ocr()
                         
-                        if ocr_response and ocr_response.pages:
-                            # Extract all text without page markers for clean content
-                            raw_content = []
-                            
-                            for page in ocr_response.pages:
-                                page_content = page.markdown.strip()
-                                if page_content:  # Only add non-empty pages
-                                    raw_content.append(page_content)
-                            
-                            # Join all content into one clean string for the model
-                            final_content = "\n\n".join(raw_content)
-                            
-                            # Also create a display version with page numbers for the UI
-                            display_content = []
-                            for i, page in enumerate(ocr_response.pages):
-                                page_content = page.markdown.strip()
-                                if page_content:
-                                    display_content.append(f"Page {i+1}:\n{page_content}")
-                            
-                            display_formatted = "\n\n----------\n\n".join(display_content)
-                            
+                        if final_content:
                             # Store both versions
                             st.session_state.document_content = final_content  # Clean version for the model
                             st.session_state.display_content = display_formatted  # Formatted version for display
                             st.session_state.document_loaded = True
                             
                             # Show success information about extracted content
-                            st.success(f"Document processed successfully! Extracted {len(final_content)} characters from {len(raw_content)} pages.")
+                            st.success(f"Document processed successfully! Extracted {len(final_content)} characters from {page_count} pages.")
                         else:
                             st.warning("No content extracted from document.")
                     
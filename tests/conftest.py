@@ -0,0 +1,14 @@
+import pytest
+
+from app.config import get_settings
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Application settings with an empty upload directory and no background work."""
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("GC_ENABLED", "false")
+    monkeypatch.setenv("WARMUP_ON_STARTUP", "false")
+    monkeypatch.setenv("OCR_RETRY_BACKOFF", "0")
+    get_settings.cache_clear()
+    yield get_settings()
+    get_settings.cache_clear()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.core import admission
+from app.core.admission import AdmissionController, AdmissionMiddleware
+from app.core.exceptions import OverloadedError
+
+def streaming_app(controller, observed, chunks=3):
+    """ASGI app streaming `chunks` body pieces and recording the chat load while it does."""
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for index in range(chunks):
+            observed.append(controller.chat_in_flight)
+            await send({"type": "http.response.body", "body": b"line\n", "more_body": index < chunks - 1})
+        observed.append(controller.chat_in_flight)
+
+    return app
+
+def call(app, path):
+    scope = {"type": "http", "method": "POST", "path": path, "headers": [], "client": ("10.0.0.1", 1234)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = AdmissionController(chat_max_concurrent=10, chats_per_minute=0, chat_batch_weight=4)
+    monkeypatch.setattr(admission, "get_admission_controller", lambda: controller)
+    return controller
+
+def test_streamed_chat_holds_its_slot_until_the_last_chunk(controller):
+    observed = []
+    call(AdmissionMiddleware(streaming_app(controller, observed)), "/api/chat/doc-1")
+
+    assert observed == [1, 1, 1, 0]
+    assert controller.chat_in_flight == 0
+
+def test_batch_counts_its_fan_out(controller):
+    observed = []
+    call(AdmissionMiddleware(streaming_app(controller, observed)), "/api/chat/batch")
+
+    assert observed == [4, 4, 4, 0]
+    # Batch durations do not feed the Retry-After estimate of single chats
+    assert controller.durations["chat"] == 5.0
+
+def test_batch_is_rejected_without_room_for_its_fan_out(controller):
+    controller.chat_in_flight = 7
+    with pytest.raises(OverloadedError):
+        controller.admit("chat", "client", controller.weight("chat", "/api/chat/batch"))
+    controller.admit("chat", "client", controller.weight("chat", "/api/chat/doc-1"))
+    assert controller.chat_in_flight == 8
+
+def test_slot_is_released_when_the_app_fails(controller):
+    async def failing(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        raise RuntimeError("stream broke")
+
+    with pytest.raises(RuntimeError):
+        call(AdmissionMiddleware(failing), "/api/chat/batch")
+    assert controller.chat_in_flight == 0
@@ -0,0 +1,193 @@
+import io
+import sys
+import types
+
+import pytest
+
+from app.config import Settings
+from app.storage.blob_store import LocalBlobStore, S3BlobStore, create_blob_store
+from app.storage.document_store import DocumentStore
+
+def test_s3_client_is_created_once_per_configuration(monkeypatch, tmp_path):
+    created = []
+    fake_boto3 = types.ModuleType("boto3")
+    fake_boto3.client = lambda *args, **kwargs: created.append(kwargs) or object()
+    monkeypatch.setitem(sys.modules, "boto3", fake_boto3)
+
+    settings = Settings(UPLOAD_DIR=str(tmp_path), BLOB_BACKEND="s3", S3_BUCKET="cache-test-bucket")
+    first = DocumentStore.from_settings(settings).blob_store
+    second = DocumentStore.from_settings(settings).blob_store
+    assert isinstance(first, S3BlobStore)
+    assert first is second
+    assert len(created) == 1
+
+    other = create_blob_store(Settings(UPLOAD_DIR=str(tmp_path), BLOB_BACKEND="s3", S3_BUCKET="other-bucket"))
+    assert other is not first
+    assert len(created) == 2
+
+def test_local_store_is_reused(tmp_path):
+    settings = Settings(UPLOAD_DIR=str(tmp_path))
+    store = create_blob_store(settings)
+    assert isinstance(store, LocalBlobStore)
+    assert create_blob_store(settings) is store
+
+class ClientError(Exception):
+    """Shape of botocore's ClientError: the parsed error response on `.response`."""
+
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+class FakeS3Client:
+    """In-memory stand-in for the subset of the boto3 S3 client the backend uses."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.completed = 0
+        self.aborted = []
+        self.head_error = None
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        self.objects[Key] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key, **extra):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.completed += 1
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+
+    def get_object(self, Bucket, Key, Range):
+        start, _, end = Range[len("bytes="):].partition("-")
+        data = self.objects[Key][int(start):int(end) + 1 if end else None]
+        return {"Body": io.BytesIO(data)}
+
+    def head_object(self, Bucket, Key):
+        if self.head_error is not None:
+            raise self.head_error
+        if Key not in self.objects:
+            raise ClientError("404", 404)
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": key, "Size": len(data)} for key, data in client.objects.items() if key.startswith(Prefix)]}
+
+        return Paginator()
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.example/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+class FailingStream(io.BytesIO):
+    """Stream that fails after its first read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads > 1:
+            raise IOError("client went away")
+        return super().read(size)
+
+def make_stores(tmp_path):
+    """One store of each backend; S3 raises `part_size` to its 5MB minimum."""
+    return [LocalBlobStore(str(tmp_path)), S3BlobStore("bucket", prefix="docs", client=FakeS3Client(), part_size=1)]
+
+@pytest.mark.parametrize("backend", [0, 1], ids=["local", "s3"])
+def test_put_read_range_and_delete(tmp_path, backend):
+    store = make_stores(tmp_path)[backend]
+    data = bytes(range(256)) * 100
+    assert store.put_stream("files/ab/doc-1/document.pdf", io.BytesIO(data)) == len(data)
+    store.put_stream("files/ab/doc-1/images/img-0.jpeg", io.BytesIO(b"jpeg"))
+
+    assert store.size("files/ab/doc-1/document.pdf") == len(data)
+    assert store.read("files/ab/doc-1/document.pdf") == data
+    assert b"".join(store.iter_range("files/ab/doc-1/document.pdf", 10, 19)) == data[10:20]
+    assert b"".join(store.iter_range("files/ab/doc-1/document.pdf", len(data) - 5)) == data[-5:]
+    assert store.size("files/ab/doc-2/document.pdf") is None
+
+    assert store.delete_prefix("files/ab/doc-1/") == len(data) + 4
+    assert store.size("files/ab/doc-1/document.pdf") is None
+    assert store.size("files/ab/doc-1/images/img-0.jpeg") is None
+
+@pytest.mark.parametrize("backend", [0, 1], ids=["local", "s3"])
+def test_uploads_in_parts(tmp_path, backend):
+    store = make_stores(tmp_path)[backend]
+    key = "files/cd/doc-3/document.pdf"
+    token = store.begin_upload(key, "application/pdf")
+    store.write_part(key, token, 1, 0, b"hello, ")
+    # Resending a part replaces what was written from its offset on
+    parts = [
+        store.write_part(key, token, 1, 0, b"hello"),
+        store.write_part(key, token, 2, 5, b"world"),
+    ]
+    store.complete_upload(key, token, parts)
+    assert store.read(key) == b"helloworld"
+
+    token = store.begin_upload("files/cd/doc-4/document.pdf")
+    store.write_part("files/cd/doc-4/document.pdf", token, 1, 0, b"partial")
+    store.abort_upload("files/cd/doc-4/document.pdf", token)
+    assert store.size("files/cd/doc-4/document.pdf") is None
+
+def test_s3_large_streams_use_multipart_and_abort_on_failure():
+    client = FakeS3Client()
+    store = S3BlobStore("bucket", prefix="docs", client=client)
+    part = store.part_size
+    data = b"x" * (part * 2 + 10)
+
+    assert store.put_stream("files/ab/doc-1/document.pdf", io.BytesIO(data)) == len(data)
+    assert client.objects["docs/files/ab/doc-1/document.pdf"] == data
+    assert client.completed == 1 and not client.uploads
+
+    store.put_stream("files/ab/doc-1/small.txt", io.BytesIO(b"small"))
+    assert client.completed == 1
+
+    with pytest.raises(IOError):
+        store.put_stream("files/ab/doc-2/document.pdf", FailingStream(data))
+    assert client.aborted and not client.uploads
+    assert "docs/files/ab/doc-2/document.pdf" not in client.objects
+
+def test_only_s3_hands_out_presigned_urls(tmp_path):
+    local, s3 = make_stores(tmp_path)
+    assert local.presigned_url("files/ab/doc-1/document.pdf") is None
+    assert s3.presigned_url("files/ab/doc-1/document.pdf", 60) == "https://s3.example/bucket/docs/files/ab/doc-1/document.pdf?expires=60"
+    assert s3.local_path("files/ab/doc-1/document.pdf") is None
+
+def test_s3_size_only_treats_not_found_as_missing():
+    client = FakeS3Client()
+    store = S3BlobStore("bucket", client=client)
+    assert store.size("missing") is None
+
+    # Credential, throttling and network errors must not look like a missing blob
+    client.head_error = ClientError("AccessDenied", 403)
+    with pytest.raises(ClientError):
+        store.size("missing")
+
+def test_settings_reject_parts_below_the_s3_minimum(tmp_path):
+    with pytest.raises(ValueError, match="S3_MULTIPART_CHUNK_SIZE"):
+        Settings(UPLOAD_DIR=str(tmp_path), S3_MULTIPART_CHUNK_SIZE=1024 * 1024)
+    with pytest.raises(ValueError, match="UPLOAD_CHUNK_SIZE"):
+        Settings(UPLOAD_DIR=str(tmp_path), BLOB_BACKEND="s3", UPLOAD_CHUNK_SIZE=1024 * 1024)
+    # Local uploads may use smaller chunks
+    assert Settings(UPLOAD_DIR=str(tmp_path), UPLOAD_CHUNK_SIZE=1024 * 1024).UPLOAD_CHUNK_SIZE == 1024 * 1024
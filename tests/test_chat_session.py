@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from app.api.endpoints import chat
+from app.services.chat_session import ChatSessionManager
+from app.services.llm_providers import LocalProvider
+from app.services.llm_router import SinglePolicy
+from app.services.prompt_builder import HistoryCompactor
+from app.storage.document_store import DocumentStore
+
+TABLE = "| Quarter | Revenue |\n|---|---|\n| Q1 | $1,000 |\n| Q2 | $1,200 |\n"
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+def test_turn_does_not_wait_for_compaction(settings, monkeypatch):
+    store = DocumentStore(settings.UPLOAD_DIR)
+    store.create_file_document("doc-1", "report.pdf", 4, status="completed")
+    store.update_document("doc-1", content=TABLE, pages=[{"page_number": 1, "markdown": TABLE}])
+    manager = ChatSessionManager(store)
+    session = manager.open("doc-1")
+    monkeypatch.setattr(chat, "get_routing_policy", lambda: SinglePolicy(LocalProvider()))
+
+    async def scenario():
+        release = asyncio.Event()
+        compactions = []
+
+        async def slow_compact(self, document_id):
+            compactions.append(document_id)
+            await release.wait()
+            return True
+
+        monkeypatch.setattr(HistoryCompactor, "compact", slow_compact)
+        websocket = FakeWebSocket()
+        await asyncio.wait_for(chat._stream_turn(websocket, manager, session, "Q2 revenue", "auto", settings), 1)
+
+        # The turn is done, and its compaction is still running in the background
+        assert websocket.sent[-1]["type"] == "done"
+        await asyncio.sleep(0)
+        assert compactions == ["doc-1"] and not session.compaction.done()
+
+        # A turn while compaction runs does not start a second one
+        await chat._stream_turn(websocket, manager, session, "Q1 revenue", "auto", settings)
+        await asyncio.sleep(0)
+        assert compactions == ["doc-1"]
+
+        release.set()
+        assert await session.compaction is True
+
+    asyncio.run(scenario())
+
+def test_local_stream_spreads_its_delay_over_the_words():
+    provider = LocalProvider(delay=0.3)
+
+    async def first_and_total():
+        started = time.perf_counter()
+        first = None
+        pieces = []
+        async for piece in provider.stream("one two three four five"):
+            if first is None:
+                first = time.perf_counter() - started
+            pieces.append(piece)
+        return first, time.perf_counter() - started, pieces
+
+    first, total, pieces = asyncio.run(first_and_total())
+    assert first < 0.2
+    assert total >= 0.29
+    assert "".join(piece.text for piece in pieces) == f"[{provider.label}] one two three four five"
+    assert pieces[-1].output_tokens and not pieces[0].output_tokens
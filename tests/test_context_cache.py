@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.core.exceptions import ServiceError
+from app.services.context_cache import ContextCacheManager
+from app.services.llm_providers import GeminiProvider, LocalProvider
+from app.services.llm_router import HedgedPolicy, SinglePolicy
+from app.storage.document_store import DocumentStore
+
+PREFIX = "Document text. " * 50
+SUFFIX = "Question?"
+
+class BrokenCacheProvider(LocalProvider):
+    """Local provider whose cached calls fail, e.g. because the cache expired early."""
+
+    async def complete_cached(self, cache_name, suffix, generation_config=None):
+        raise ServiceError("cached content not found")
+
+class SlowCacheProvider(LocalProvider):
+    """Local provider whose cached calls hang."""
+
+    async def complete_cached(self, cache_name, suffix, generation_config=None):
+        await asyncio.sleep(5)
+        return await super().complete_cached(cache_name, suffix, generation_config)
+
+def make_manager(tmp_path, router):
+    return ContextCacheManager(router, DocumentStore(str(tmp_path)), ttl=600, min_tokens=10)
+
+def test_cached_prefix_is_reused(tmp_path):
+    manager = make_manager(tmp_path, SinglePolicy(LocalProvider()))
+
+    async def run():
+        await manager.complete("doc-1", PREFIX, SUFFIX)
+        return await manager.complete("doc-1", PREFIX, SUFFIX)
+
+    result = asyncio.run(run())
+    assert result.cached_tokens > 0
+    assert manager.stats["misses"] == 1 and manager.stats["hits"] == 1
+    assert manager.router.tracker.percentile("local:echo", 0.5) is not None
+
+def test_failed_cached_call_sends_the_full_prompt(tmp_path):
+    manager = make_manager(tmp_path, SinglePolicy(BrokenCacheProvider()))
+    result = asyncio.run(manager.complete("doc-1", PREFIX, SUFFIX))
+
+    assert result.text.endswith(SUFFIX)
+    assert result.cached_tokens == 0
+    assert manager.stats["fallbacks"] == 1
+
+def test_slow_cached_call_is_hedged_with_the_full_prompt(tmp_path):
+    secondary = LocalProvider("secondary")
+    router = HedgedPolicy(SlowCacheProvider(), secondary, hedge_delay=0.05)
+    manager = make_manager(tmp_path, router)
+    result = asyncio.run(manager.complete("doc-1", PREFIX, SUFFIX))
+
+    assert result.provider == secondary.label
+    assert result.text.endswith(SUFFIX)
+    assert manager.stats["fallbacks"] == 0
+    assert router.tracker.percentile(router.primary.label, 0.95) >= 0.05
+
+def test_models_without_cached_content_are_not_cached(tmp_path):
+    sdk = SimpleNamespace(configure=lambda **kwargs: None)
+    assert GeminiProvider("gemini-1.5-flash-001", "key", sdk=sdk).supports_context_cache
+    gemma = GeminiProvider("gemma-3-27b-it", "key", sdk=sdk)
+    assert not gemma.supports_context_cache
+
+    manager = make_manager(tmp_path, SinglePolicy(gemma))
+    assert not manager.usable(gemma, PREFIX)
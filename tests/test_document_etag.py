@@ -0,0 +1,45 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import documents
+from app.storage.document_store import DocumentStore
+
+class CountingStore(DocumentStore):
+    """Document store that counts full metadata reads."""
+
+    reads = 0
+
+    def get_document(self, document_id):
+        CountingStore.reads += 1
+        return super().get_document(document_id)
+
+def make_client(settings):
+    store = CountingStore(settings.UPLOAD_DIR)
+    store.save_url("doc-1", "https://example.com/report.pdf")
+    store.update_document("doc-1", status="processing", content="Some text")
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/api/documents")
+    app.dependency_overrides[documents.get_document_store] = lambda: store
+    return TestClient(app), store
+
+def test_matching_etag_is_answered_without_reading_the_document(settings):
+    client, store = make_client(settings)
+    response = client.get("/api/documents/doc-1", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    CountingStore.reads = 0
+    revalidated = client.get("/api/documents/doc-1", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert CountingStore.reads == 0
+
+def test_changed_document_gets_a_new_body(settings):
+    client, store = make_client(settings)
+    etag = client.get("/api/documents/doc-1").headers["ETag"]
+
+    store.update_document("doc-1", content="Other text, long enough to change the size")
+    response = client.get("/api/documents/doc-1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["content"].startswith("Other text")
+    assert response.headers["ETag"] != etag
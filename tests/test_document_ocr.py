@@ -0,0 +1,176 @@
+import asyncio
+import io
+import os
+from types import SimpleNamespace
+
+from app.api.endpoints import documents
+from app.api.endpoints.documents import process_document_ocr
+from app.core.exceptions import ServiceError
+from app.services.ocr_service import PageRangeError
+from app.storage.blob_store import LocalBlobStore
+from app.storage.document_store import DocumentStore
+
+class PresigningBlobStore(LocalBlobStore):
+    """Local blobs that also hand out presigned URLs, like an S3 backend."""
+
+    def presigned_url(self, key, expires=3600):
+        return f"https://blobs.internal/{key}"
+
+class FakeOCRService:
+    """OCR stand-in for a document of `page_count` pages that cannot fetch internal URLs.
+
+    Like the provider, a page range past the end of the document is an error.
+    """
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.calls = []
+        self.uploads = 0
+
+    def upload_pdf(self, content, filename):
+        self.uploads += 1
+        return "https://ocr.example/uploaded.pdf"
+
+    def process_ocr(self, document_source, pages=None):
+        url = document_source.get("document_url") or document_source.get("image_url")
+        self.calls.append((url, pages))
+        if url.startswith("https://blobs.internal/"):
+            raise ServiceError("Error processing OCR: could not fetch document")
+        indices = range(self.page_count) if pages is None else [index for index in pages if index < self.page_count]
+        if not indices:
+            raise PageRangeError("Error processing OCR: pages out of range")
+        return SimpleNamespace(
+            model="mistral-ocr-test",
+            pages=[SimpleNamespace(index=index, markdown=f"Page text {index + 1}", images=[], dimensions=None) for index in indices],
+            usage_info=SimpleNamespace(pages_processed=len(indices), doc_size_bytes=None),
+        )
+
+def make_document(settings, blob_store=None):
+    store = DocumentStore(settings.UPLOAD_DIR, blob_store=blob_store)
+    store.create_file_document("doc-1", "report.pdf", 4, status="uploaded")
+    store.blob_store.put_stream(store.blob_key("doc-1", "report.pdf"), io.BytesIO(b"%PDF"))
+    return store
+
+def test_presigned_fetch_is_off_by_default(settings):
+    store = make_document(settings, PresigningBlobStore(settings.UPLOAD_DIR))
+    ocr = FakeOCRService(page_count=3)
+    asyncio.run(process_document_ocr("doc-1", store.blob_key("doc-1", "report.pdf"), "report.pdf", ocr, store))
+
+    assert ocr.uploads == 1
+    assert not any(url.startswith("https://blobs.internal/") for url, _ in ocr.calls)
+    assert store.get_document("doc-1")["status"] == "completed"
+
+def test_unreachable_presigned_url_falls_back_to_upload(settings, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_FETCH_PRESIGNED", True)
+    store = make_document(settings, PresigningBlobStore(settings.UPLOAD_DIR))
+    ocr = FakeOCRService(page_count=3)
+    asyncio.run(process_document_ocr("doc-1", store.blob_key("doc-1", "report.pdf"), "report.pdf", ocr, store))
+
+    assert ocr.calls[0][0].startswith("https://blobs.internal/")
+    assert ocr.uploads == 1
+    document = store.get_document("doc-1")
+    assert document["status"] == "completed"
+    assert document["pages_available"] == 3
+
+class ObservingOCRService(FakeOCRService):
+    """Records what the store holds whenever OCR is called."""
+
+    def __init__(self, page_count, store):
+        super().__init__(page_count)
+        self.store = store
+        self.observed = []
+
+    def process_ocr(self, document_source, pages=None):
+        raw = self.store._get_metadata("doc-1")
+        document = self.store.get_document("doc-1")
+        self.observed.append((raw.get("status"), "pages" in raw, len(document.get("pages") or [])))
+        return super().process_ocr(document_source, pages)
+
+def run_ocr(settings, store, ocr):
+    asyncio.run(process_document_ocr("doc-1", store.blob_key("doc-1", "report.pdf"), "report.pdf", ocr, store))
+    return store.get_document("doc-1")
+
+def test_page_count_multiple_of_chunk_size_completes(settings, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PAGE_CHUNK_SIZE", 4)
+    store = make_document(settings)
+    ocr = FakeOCRService(page_count=8)
+    document = run_ocr(settings, store, ocr)
+
+    assert [pages for _, pages in ocr.calls] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11]]
+    assert document["status"] == "completed"
+    assert [page["page_number"] for page in document["pages"]] == list(range(1, 9))
+    assert document["content"].startswith("Page text 1")
+
+def test_chunks_persist_only_their_own_pages(settings, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PAGE_CHUNK_SIZE", 2)
+    store = make_document(settings)
+    ocr = ObservingOCRService(page_count=5, store=store)
+    document = run_ocr(settings, store, ocr)
+
+    # Partial pages are served from the page log, not rewritten into the metadata
+    assert ocr.observed[1:] == [("partial", False, 2), ("partial", False, 4)]
+    assert document["status"] == "completed"
+    assert document["pages_available"] == 5
+    assert store.get_logged_pages("doc-1") == []
+
+def test_failure_before_any_page_fails_the_document(settings):
+    store = make_document(settings)
+    ocr = FakeOCRService(page_count=0)
+    document = run_ocr(settings, store, ocr)
+
+    assert document["status"] == "failed"
+    assert "out of range" in document["error"]
+
+def test_progress_is_reported_per_chunk(settings, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PAGE_CHUNK_SIZE", 2)
+    store = make_document(settings)
+    events = []
+    monkeypatch.setattr(documents.get_event_broker(), "publish",
+                        lambda document_id, event, **data: events.append((event, data)))
+    run_ocr(settings, store, FakeOCRService(page_count=3))
+
+    chunks = [data for event, data in events if event == "chunk"]
+    assert chunks == [
+        {"first_page": 1, "last_page": 2, "pages_done": 2},
+        {"first_page": 3, "last_page": 3, "pages_done": 3},
+    ]
+    assert not any(event == "page" for event, _ in events)
+
+class FlakyOCRService(FakeOCRService):
+    """Fails the call for one page range a number of times, like a provider 429 or 5xx."""
+
+    def __init__(self, page_count, failing_start, failures):
+        super().__init__(page_count)
+        self.failing_start = failing_start
+        self.failures = failures
+
+    def process_ocr(self, document_source, pages=None):
+        if pages and pages[0] == self.failing_start and self.failures:
+            self.failures -= 1
+            self.calls.append((None, pages))
+            raise ServiceError("Error processing OCR: 503 Service Unavailable")
+        return super().process_ocr(document_source, pages)
+
+def test_transient_mid_document_failure_is_retried(settings, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PAGE_CHUNK_SIZE", 2)
+    store = make_document(settings)
+    ocr = FlakyOCRService(page_count=5, failing_start=2, failures=2)
+    document = run_ocr(settings, store, ocr)
+
+    assert [pages for _, pages in ocr.calls].count([2, 3]) == 3
+    assert document["status"] == "completed"
+    assert [page["page_number"] for page in document["pages"]] == [1, 2, 3, 4, 5]
+
+def test_persistent_mid_document_failure_fails_instead_of_truncating(settings, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PAGE_CHUNK_SIZE", 2)
+    store = make_document(settings)
+    ocr = FlakyOCRService(page_count=5, failing_start=2, failures=10)
+    document = run_ocr(settings, store, ocr)
+
+    assert len(ocr.calls) == 1 + 1 + settings.OCR_CHUNK_RETRIES
+    assert document["status"] == "failed"
+    assert "503" in document["error"]
+    # The pages read so far stay available, but the document is not completed or indexed
+    assert document["pages_available"] == 2
+    assert "ocr_result" not in document
+    assert not os.path.exists(os.path.join(settings.UPLOAD_DIR, "index"))
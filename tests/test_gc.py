@@ -0,0 +1,30 @@
+import os
+import time
+
+from app.services.gc_service import DAY, GarbageCollector
+from app.storage.document_store import DocumentStore
+from app.storage.search_index import SearchIndex
+
+def test_chat_retention_keeps_derived_state(settings, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_RETENTION_DAYS", 1)
+    store = DocumentStore(settings.UPLOAD_DIR)
+    for document_id in ("old-chat", "new-chat"):
+        store.save_url(document_id, "https://example.com/report.pdf")
+        store.save_chat_message(document_id, "user", "What is the total?")
+        store.save_chat_summary(document_id, {"summary": "Asked about totals", "covered_until": ""})
+        store.save_tables(document_id, [{"table_id": "t1"}])
+        store.save_context_cache(document_id, {"provider": "local:echo", "name": "local/abc", "digest": "d", "expires_at": 0})
+
+    stale = time.time() - 2 * DAY
+    os.utime(store._chat_file("old-chat"), (stale, stale))
+
+    collector = GarbageCollector(store, SearchIndex(os.path.join(settings.UPLOAD_DIR, "index")), settings)
+    report = collector.run_once()
+
+    assert report["stale_chat_logs"] == 1
+    assert store.get_chat_history("old-chat") == []
+    assert store.get_chat_summary("old-chat") is None
+    assert store.get_tables("old-chat") == [{"table_id": "t1"}]
+    assert store.get_context_cache("old-chat")["name"] == "local/abc"
+    assert len(store.get_chat_history("new-chat")) == 1
+    assert store.get_chat_summary("new-chat") is not None
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services.llm_providers import LLMProvider, LLMResult
+from app.services.llm_router import HedgedPolicy, LatencyTracker
+
+class SleepyProvider(LLMProvider):
+    """Provider that answers after a fixed delay."""
+
+    name = "sleepy"
+
+    def __init__(self, model, delay):
+        super().__init__(model)
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    @classmethod
+    def from_settings(cls, model, settings):
+        raise NotImplementedError
+
+    async def complete(self, prompt, generation_config=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return LLMResult(text=f"{self.model}: {prompt}", provider=self.label)
+
+def test_hedge_delay_follows_the_primary_percentile():
+    primary, secondary = SleepyProvider("primary", 0), SleepyProvider("secondary", 0)
+    policy = HedgedPolicy(primary, secondary, LatencyTracker(), percentile=0.95, min_delay=0.5, max_delay=10.0)
+    assert policy.current_delay() == 10.0
+
+    for seconds in [1.0] * 19 + [4.0]:
+        policy.tracker.record(primary.label, seconds)
+    assert policy.current_delay() == 4.0
+
+    for _ in range(200):
+        policy.tracker.record(primary.label, 0.01)
+    assert policy.current_delay() == 0.5
+    assert HedgedPolicy(primary, secondary, hedge_delay=2.0).current_delay() == 2.0
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = SleepyProvider("primary", 0.01), SleepyProvider("secondary", 0.01)
+    policy = HedgedPolicy(primary, secondary, hedge_delay=1.0)
+    result = asyncio.run(policy.complete("question"))
+    assert result.text == "primary: question"
+    assert secondary.calls == 0
+
+def test_slow_primary_is_hedged_cancelled_and_recorded():
+    primary, secondary = SleepyProvider("primary", 5.0), SleepyProvider("secondary", 0.02)
+    policy = HedgedPolicy(primary, secondary, hedge_delay=0.05)
+
+    async def run():
+        result = await policy.complete("question")
+        # Let the cancelled primary unwind
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(run())
+    assert result.text == "secondary: question"
+    assert primary.cancelled == 1
+
+    # The cancelled primary counts with at least the time it ran before losing
+    recorded = policy.tracker.percentile(primary.label, 0.95)
+    assert recorded is not None and recorded >= 0.05
+    assert policy.tracker.percentile(secondary.label, 0.95) is not None
@@ -0,0 +1,62 @@
+import json
+import logging
+import queue
+
+from app.core.logging import JsonFormatter, NonBlockingQueueHandler
+
+def make_logger(log_queue):
+    logger = logging.getLogger("tests.queue_logging")
+    logger.handlers = [NonBlockingQueueHandler(log_queue)]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def test_exceptions_reach_the_listener_unformatted():
+    log_queue = queue.Queue()
+    logger = make_logger(log_queue)
+    try:
+        raise ValueError("bad page")
+    except ValueError:
+        logger.exception("OCR failed for %s", "doc-1")
+
+    record = log_queue.get_nowait()
+    assert record.exc_info is not None
+
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["message"] == "OCR failed for doc-1"
+    assert "ValueError: bad page" in payload["exception"]
+
+def test_full_queue_drops_instead_of_blocking():
+    log_queue = queue.Queue(maxsize=1)
+    logger = make_logger(log_queue)
+    logger.info("first")
+    logger.info("second")
+
+    assert log_queue.qsize() == 1
+    assert logger.handlers[0].dropped == 1
+
+def test_dropped_records_are_reported_once_there_is_room():
+    log_queue = queue.Queue(maxsize=2)
+    logger = make_logger(log_queue)
+    for i in range(4):
+        logger.info("record %d", i)
+    # Records 2 and 3 are dropped; no notice fits ahead of record 3 either
+    assert logger.handlers[0].dropped == 2
+
+    assert [log_queue.get_nowait().getMessage() for _ in range(2)] == ["record 0", "record 1"]
+    logger.info("record 4")
+
+    notice, record = log_queue.get_nowait(), log_queue.get_nowait()
+    assert (notice.levelno, notice.getMessage()) == (logging.WARNING, "Dropped 2 log records while the log queue was full")
+    assert record.getMessage() == "record 4"
+    assert logger.handlers[0].dropped == 0
+
+def test_message_is_rendered_when_logged():
+    log_queue = queue.Queue()
+    logger = make_logger(log_queue)
+    pages = [1, 2]
+    logger.info("Pages %s of %d%%", pages, 50)
+    pages.append(3)
+
+    record = log_queue.get_nowait()
+    assert logging.Formatter("%(message)s").format(record) == "Pages [1, 2] of 50%"
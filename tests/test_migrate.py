@@ -0,0 +1,96 @@
+import io
+import json
+import os
+
+from app.storage.document_store import DocumentStore
+from app.storage.migrate import migrate_layout
+
+PDF = b"%PDF-1.4 legacy document"
+
+def make_legacy_document(upload_dir, document_id):
+    """Write a document the way the flat layout stored it, with an absolute original_path."""
+    files_dir = os.path.join(upload_dir, "files", document_id)
+    os.makedirs(files_dir)
+    original_path = os.path.join(files_dir, "document.pdf")
+    with open(original_path, "wb") as f:
+        f.write(PDF)
+    os.makedirs(os.path.join(upload_dir, "metadata"), exist_ok=True)
+    with open(os.path.join(upload_dir, "metadata", f"{document_id}.json"), "w") as f:
+        json.dump({
+            "document_id": document_id,
+            "filename": "report.pdf",
+            "original_path": original_path,
+            "created_at": "2024-01-01T00:00:00",
+            "status": "completed",
+            "type": "file",
+        }, f)
+
+def test_legacy_file_is_readable_before_and_after_migration(tmp_path):
+    make_legacy_document(str(tmp_path), "doc-1")
+    store = DocumentStore(str(tmp_path))
+
+    key = store.document_blob_key(store.get_document("doc-1"))
+    assert store.blob_store.read(key) == PDF
+
+    migrate_layout(store, pause=0)
+
+    key = store.document_blob_key(store.get_document("doc-1"))
+    assert key == store.blob_key("doc-1", "document.pdf")
+    assert store.blob_store.read(key) == PDF
+
+def test_update_during_migration_keeps_file_reachable(tmp_path):
+    make_legacy_document(str(tmp_path), "doc-1")
+    store = DocumentStore(str(tmp_path))
+
+    # The update writes sharded metadata that still carries the legacy original_path
+    store.update_document("doc-1", status="processing")
+    migrate_layout(store, pause=0)
+
+    document = store.get_document("doc-1")
+    assert document["status"] == "processing"
+    assert not os.path.exists(os.path.join(store.files_dir, "doc-1"))
+    assert store.blob_store.size(store.document_blob_key(document)) == len(PDF)
+
+def test_new_documents_store_no_absolute_paths(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    source = tmp_path / "upload.pdf"
+    source.write_bytes(PDF)
+    store.save_document("doc-2", str(source), "upload.pdf")
+
+    document = store.get_document("doc-2")
+    assert "original_path" not in document
+    assert store.blob_store.read(store.document_blob_key(document)) == PDF
+
+def test_legacy_chat_is_merged_into_an_existing_shard(tmp_path):
+    make_legacy_document(str(tmp_path), "doc-1")
+    legacy_chat = tmp_path / "chat" / "doc-1"
+    legacy_chat.mkdir(parents=True)
+    history = [{"role": "user", "content": "What is the total?", "timestamp": "2024-01-01T00:00:00"}]
+    (legacy_chat / "chat_history.json").write_text(json.dumps(history))
+    (legacy_chat / "passages.json").write_text("{}")
+    store = DocumentStore(str(tmp_path))
+
+    # After deploy the server writes state into the sharded directory before migration runs
+    store.append_pages("doc-1", [{"page_number": 1, "markdown": "Page one"}])
+    store.save_passages("doc-1", {"version": 2})
+
+    totals = migrate_layout(store, pause=0)
+
+    assert totals["chat"] == 1 and totals["skipped"] == 1
+    assert store.get_chat_history("doc-1") == history
+    assert store.get_passages("doc-1") == {"version": 2}
+    assert store.get_logged_pages("doc-1") == [{"page_number": 1, "markdown": "Page one"}]
+    # Only the file that is newer in the shard stays behind
+    assert os.listdir(legacy_chat) == ["passages.json"]
+
+def test_legacy_files_are_merged_into_an_existing_shard(tmp_path):
+    make_legacy_document(str(tmp_path), "doc-1")
+    store = DocumentStore(str(tmp_path))
+    store.blob_store.put_stream(store.image_key("doc-1", "img-0.jpeg"), io.BytesIO(b"jpeg"))
+
+    totals = migrate_layout(store, pause=0)
+
+    assert totals["files"] == 1 and totals["skipped"] == 0
+    assert not os.path.exists(os.path.join(store.files_dir, "doc-1"))
+    assert store.blob_store.read(store.document_blob_key(store.get_document("doc-1"))) == PDF
+    assert store.blob_store.read(store.image_key("doc-1", "img-0.jpeg")) == b"jpeg"
@@ -0,0 +1,71 @@
+import asyncio
+
+from app.services.llm_providers import LocalProvider
+from app.services.llm_router import SinglePolicy
+from app.services.prompt_builder import HistoryCompactor, PromptBuilder
+from app.storage import serialization
+from app.storage.document_store import DocumentStore
+
+def turns(start, count):
+    """`count` question/answer turns with increasing timestamps."""
+    messages = []
+    for i in range(start, start + count):
+        timestamp = f"2024-01-01T00:00:{i:02d}"
+        messages.append({"role": "user", "content": f"question {i}", "timestamp": timestamp})
+        messages.append({"role": "assistant", "content": f"answer {i}", "timestamp": timestamp})
+    return messages
+
+def make_compactor(tmp_path, monkeypatch):
+    store = DocumentStore(str(tmp_path))
+    compactor = HistoryCompactor(SinglePolicy(LocalProvider()), store, PromptBuilder(recent_turns=2))
+    reads = []
+    get_chat_history = store.get_chat_history
+    monkeypatch.setattr(store, "get_chat_history", lambda document_id: reads.append(document_id) or get_chat_history(document_id))
+    return store, compactor, reads
+
+def test_log_is_read_only_when_compaction_is_due(tmp_path, monkeypatch):
+    store, compactor, reads = make_compactor(tmp_path, monkeypatch)
+    store.append_chat_messages("doc-1", turns(0, 3))
+    reads.clear()
+
+    assert asyncio.run(compactor.compact("doc-1")) is False
+    assert reads == []
+
+    store.append_chat_messages("doc-1", turns(3, 1))
+    reads.clear()
+    assert asyncio.run(compactor.compact("doc-1")) is True
+    assert reads == ["doc-1"]
+    entry = store.get_chat_summary("doc-1")
+    # Everything but the two most recent turns is folded
+    assert entry["covered_messages"] == 4
+    assert entry["covered_chars"] == sum(len(m["content"]) for m in turns(0, 2))
+    assert entry["covered_until"] == "2024-01-01T00:00:01"
+
+    # The next turns are counted against the summary without reading the log
+    store.append_chat_messages("doc-1", turns(4, 1))
+    reads.clear()
+    assert asyncio.run(compactor.compact("doc-1")) is False
+    assert reads == []
+
+    summary, uncovered = compactor.conversation("doc-1")
+    assert summary == entry["summary"]
+    assert uncovered == turns(2, 3)
+
+def test_histories_without_counters_are_counted_once(tmp_path, monkeypatch):
+    store, compactor, reads = make_compactor(tmp_path, monkeypatch)
+    store.append_chat_messages("doc-1", turns(0, 2))
+    # A history and summary written before the counters existed
+    store.delete_chat_history("doc-1")
+    chat_file = store._chat_file("doc-1")
+    with open(chat_file, "wb") as f:
+        f.write(serialization.dumps(turns(0, 4)))
+    store.save_chat_summary("doc-1", {"summary": "Earlier.", "covered_until": "2024-01-01T00:00:00", "covered_messages": 2})
+    reads.clear()
+
+    assert asyncio.run(compactor.compact("doc-1")) is False
+    assert reads == ["doc-1"]
+    assert store.get_chat_stats("doc-1") == {"messages": 8, "chars": sum(len(m["content"]) for m in turns(0, 4))}
+
+    store.append_chat_messages("doc-1", turns(4, 2))
+    assert asyncio.run(compactor.compact("doc-1")) is True
+    assert store.get_chat_summary("doc-1")["covered_chars"] == sum(len(m["content"]) for m in turns(0, 4))
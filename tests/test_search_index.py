@@ -0,0 +1,67 @@
+import os
+
+from app.storage import search_index
+from app.storage.search_index import SearchIndex
+
+def page(number, text):
+    return {"page_number": number, "markdown": text}
+
+def bucket_files(index):
+    """Merged bucket files and their contents."""
+    files = {}
+    for name in os.listdir(index.terms_dir):
+        if name.endswith(".json"):
+            with open(os.path.join(index.terms_dir, name), "rb") as f:
+                files[name] = f.read()
+    return files
+
+def test_adds_append_to_bucket_logs_instead_of_rewriting_buckets(tmp_path, monkeypatch):
+    index = SearchIndex(str(tmp_path), compact_bytes=1 << 20)
+    index.add_document("doc-1", "a.pdf", [page(1, "quarterly revenue grew"), page(2, "operating costs fell")])
+    index.compact()
+    before = bucket_files(index)
+
+    writes = []
+    atomic_write = search_index.atomic_write
+    monkeypatch.setattr(search_index, "atomic_write", lambda path, *args, **kwargs: writes.append(path) or atomic_write(path, *args, **kwargs))
+    many_terms = " ".join(f"term{i}" for i in range(2000))
+    index.add_document("doc-2", "b.pdf", [page(1, f"revenue {many_terms}")])
+    index.remove_document("doc-1")
+
+    # Only the forward file and stats are rewritten; buckets just grow their logs
+    assert all(not path.startswith(index.terms_dir) for path in writes)
+    assert bucket_files(index) == before
+
+    total, hits = index.search("revenue")
+    assert total == 1 and hits[0]["document_id"] == "doc-2"
+    assert index.search("costs") == (0, [])
+    assert index.search("term1234")[1][0]["document_id"] == "doc-2"
+
+def test_search_results_survive_merges(tmp_path):
+    merged = SearchIndex(str(tmp_path / "merged"), compact_bytes=0)
+    logged = SearchIndex(str(tmp_path / "logged"), compact_bytes=1 << 20)
+    for index in (merged, logged):
+        index.add_document("doc-1", "a.pdf", [page(1, "revenue grew"), page(2, "revenue fell sharply")])
+        index.add_document("doc-2", "b.pdf", [page(1, "costs fell")])
+        index.add_document("doc-1", "a.pdf", [page(1, "revenue and costs grew")])
+        index.remove_document("doc-2")
+
+    for query in ("revenue", "costs", "fell", "grew"):
+        assert merged.search(query) == logged.search(query)
+    assert logged.search("costs")[1][0]["page_number"] == 1
+    assert logged.search("fell") == (0, [])
+
+    assert logged.compact() > 0
+    assert logged.compact() == 0
+    for query in ("revenue", "costs", "fell", "grew"):
+        assert merged.search(query) == logged.search(query)
+
+def test_partial_log_line_is_ignored(tmp_path):
+    index = SearchIndex(str(tmp_path), compact_bytes=1 << 20)
+    index.add_document("doc-1", "a.pdf", [page(1, "revenue grew")])
+    bucket = index._bucket("revenue")
+    # A concurrent reader can see an append that is not finished yet
+    with open(os.path.join(index.terms_dir, f"{bucket}.log"), "ab") as f:
+        f.write(b'["doc-2",{"reven')
+
+    assert index.search("revenue")[0] == 1
@@ -0,0 +1,77 @@
+from app.services.table_service import answer_from_tables, build_table, extract_tables, parse_number
+
+QUARTERS = """Quarterly results
+
+| Quarter | Revenue | Margin |
+|---|---|---|
+| Q1 | $1,000 | 10% |
+| Q2 | $1,200 | 12.5% |
+| Q3 | - | 9% |
+| Q4 | $2,300 | 11% |
+| Total | $4,500 | 10.9% |
+"""
+
+def quarterly_tables():
+    return extract_tables([{"page_number": 2, "markdown": QUARTERS}])
+
+def test_parse_number():
+    assert parse_number("$1,234.50") == (1234.5, "$")
+    assert parse_number("(12)") == (-12.0, "")
+    assert parse_number("-$5") == (-5.0, "$")
+    assert parse_number("$(5)") == (-5.0, "$")
+    assert parse_number("7.5%") == (7.5, "%")
+    assert parse_number("1,000,000") == (1000000.0, "")
+    assert parse_number("Q3") == (None, "")
+    assert parse_number("1,00") == (None, "")
+    assert parse_number("$") == (None, "")
+
+def test_build_table_types_columns():
+    table = build_table("p1-t1", 1, ["Item", "Cost", "Cost", ""], [
+        ["Paper", "$10", "n/a", "x"],
+        ["Ink", "$2.50", "3", "y"],
+    ])
+
+    assert table["columns"] == [
+        {"name": "Item", "type": "string", "unit": ""},
+        {"name": "Cost", "type": "number", "unit": "$"},
+        {"name": "Cost_2", "type": "number", "unit": ""},
+        {"name": "column_4", "type": "string", "unit": ""},
+    ]
+    assert table["data"]["Cost"] == [10.0, 2.5]
+    assert table["data"]["Cost_2"] == [None, 3.0]
+    assert table["row_count"] == 2
+
+def test_mixed_units_stay_strings():
+    table = build_table("p1-t1", 1, ["Value"], [["$5"], ["5%"]])
+    assert table["columns"][0]["type"] == "string"
+    assert table["data"]["Value"] == ["$5", "5%"]
+
+def test_lookup_by_row_label_and_header():
+    answer = answer_from_tables(quarterly_tables(), "What was Q2 revenue?")
+    assert answer.text == "Revenue for Q2: $1,200 (table on page 2)"
+    assert (answer.table_id, answer.page) == ("p2-t1", 2)
+
+def test_total_question_reads_the_total_row():
+    answer = answer_from_tables(quarterly_tables(), "What was the total revenue?")
+    assert answer.text == "Revenue for Total: $4,500 (table on page 2)"
+
+def test_aggregates_skip_total_rows_and_null_cells():
+    tables = quarterly_tables()
+    assert answer_from_tables(tables, "What was the highest revenue?").text == \
+        "Maximum Revenue: $2,300 over 3 rows (table on page 2)"
+    assert answer_from_tables(tables, "Average revenue").text == \
+        "Average Revenue: $1,500 over 3 rows (table on page 2)"
+    assert answer_from_tables(tables, "lowest margin").text == \
+        "Minimum Margin: 9% over 4 rows (table on page 2)"
+
+def test_subtotal_rows_are_skipped():
+    markdown = "| Region | Sales |\n|---|---|\n| North | 5 |\n| South | 7 |\n| Subtotal | 12 |\n| Grand total | 12 |\n"
+    answer = answer_from_tables(extract_tables([{"page_number": 1, "markdown": markdown}]), "sum of sales")
+    assert answer.text == "Total Sales: 12 over 2 rows (table on page 1)"
+
+def test_unclear_questions_fall_back():
+    tables = quarterly_tables()
+    assert answer_from_tables(tables, "Who signed the report?") is None
+    # Two tables with different answers to the same question are ambiguous
+    other = extract_tables([{"page_number": 5, "markdown": QUARTERS.replace("$1,200", "$1,300")}])
+    assert answer_from_tables(tables + other, "Q2 revenue") is None
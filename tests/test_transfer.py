@@ -0,0 +1,59 @@
+import base64
+import os
+
+from app.storage import atomic, serialization
+from app.storage.document_store import DocumentStore
+from app.storage.search_index import SearchIndex
+from app.storage.transfer import FORMAT_VERSION, Importer
+
+def test_images_are_stored_as_they_are_read(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    image_key = store.image_key("doc-1", "img-0.jpeg")
+    seen_before_commit = []
+
+    def lines():
+        yield serialization.dumps({"type": "header", "version": FORMAT_VERSION})
+        yield serialization.dumps({"type": "document", "document": {
+            "document_id": "doc-1", "filename": "report.pdf", "created_at": "2024-01-01T00:00:00",
+            "status": "completed", "type": "file",
+        }})
+        yield serialization.dumps({"type": "image", "document_id": "doc-1", "image_id": "img-0.jpeg",
+                                   "data": base64.b64encode(b"jpeg bytes").decode("ascii")})
+        # The batch is far from full, so the document is not committed yet
+        seen_before_commit.append((store.blob_store.size(image_key), store.get_document("doc-1")))
+        yield serialization.dumps({"type": "end"})
+
+    totals = Importer(store, batch_size=100).run(lines())
+
+    assert seen_before_commit == [(len(b"jpeg bytes"), None)]
+    assert totals["documents"] == 1
+    assert store.blob_store.read(image_key) == b"jpeg bytes"
+    assert store.get_document("doc-1")["status"] == "completed"
+
+def test_completed_documents_are_indexed_on_import(tmp_path, monkeypatch):
+    store = DocumentStore(str(tmp_path))
+    index = SearchIndex(str(tmp_path / "index"))
+    flushed = []
+    monkeypatch.setattr(atomic, "_fsync", flushed.append)
+
+    def lines():
+        yield serialization.dumps({"type": "header", "version": FORMAT_VERSION})
+        for document_id, status in (("doc-1", "completed"), ("doc-2", "failed")):
+            yield serialization.dumps({"type": "document", "document": {
+                "document_id": document_id, "filename": f"{document_id}.pdf", "created_at": "2024-01-01T00:00:00",
+                "status": status, "type": "file",
+                "pages": [{"page_number": 1, "markdown": f"Quarterly revenue of {document_id}"}],
+            }})
+        yield serialization.dumps({"type": "chat", "document_id": "doc-2", "messages": [{"role": "user", "content": "hi"}]})
+        yield serialization.dumps({"type": "end"})
+
+    totals = Importer(store, batch_size=100, search_index=index).run(lines())
+
+    assert totals["indexed"] == 1
+    assert [hit["document_id"] for hit in index.search("quarterly revenue")[1]] == ["doc-1"]
+    # Only what the batch wrote is flushed: its files, then their directories
+    assert flushed == [
+        store._metadata_path("doc-1"), store._metadata_path("doc-2"), store._chat_file("doc-2"),
+        store._chat_stats_file("doc-2"), os.path.dirname(store._metadata_path("doc-1")), os.path.dirname(store._metadata_path("doc-2")),
+        os.path.dirname(store._chat_file("doc-2")),
+    ]
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+import httpx
+
+from app.services.url_cache import UrlCache
+from app.storage.document_store import DocumentStore
+
+URL = "https://example.com/report.pdf"
+
+class Origin:
+    """HTTP origin serving one PDF that honours `If-None-Match`."""
+
+    def __init__(self, content=b"%PDF-1", etag='"v1"'):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, content=self.content, headers={"ETag": self.etag})
+
+def make_cache(settings, origin):
+    store = DocumentStore(settings.UPLOAD_DIR)
+    store.create_file_document("doc-1", "report.pdf", 6, status="completed")
+    cache = UrlCache(store, os.path.join(settings.UPLOAD_DIR, "url_cache"), ttl=60, transport=httpx.MockTransport(origin.handler))
+    cache.record(URL, "doc-1", asyncio.run(cache.fetch_validators(URL)))
+    return cache
+
+def expire(cache):
+    entry = cache.get_entry(URL)
+    entry["checked_at"] = time.time() - 3600
+    cache._save_entry(entry)
+
+def test_fresh_entry_is_reused_without_a_request(settings):
+    origin = Origin()
+    cache = make_cache(settings, origin)
+
+    hit = asyncio.run(cache.lookup(URL))
+    assert (hit.document_id, hit.reason) == ("doc-1", "fresh")
+    assert len(origin.requests) == 1
+
+def test_not_modified_reuses_the_result(settings):
+    origin = Origin()
+    cache = make_cache(settings, origin)
+    expire(cache)
+
+    hit = asyncio.run(cache.lookup(URL))
+    assert (hit.document_id, hit.reason) == ("doc-1", "not_modified")
+    assert origin.requests[-1].headers["if-none-match"] == '"v1"'
+    # Revalidation restarts the TTL
+    assert asyncio.run(cache.lookup(URL)).reason == "fresh"
+
+def test_changed_etag_with_same_content_is_reused(settings):
+    origin = Origin()
+    cache = make_cache(settings, origin)
+    expire(cache)
+    origin.etag = '"v2"'
+
+    hit = asyncio.run(cache.lookup(URL))
+    assert hit.reason == "unchanged"
+    assert cache.get_entry(URL)["etag"] == '"v2"'
+
+def test_changed_content_is_a_miss(settings):
+    origin = Origin()
+    cache = make_cache(settings, origin)
+    expire(cache)
+    origin.content, origin.etag = b"%PDF-2", '"v2"'
+
+    assert asyncio.run(cache.lookup(URL)) is None
+
+def test_failed_revalidation_is_a_miss(settings):
+    origin = Origin()
+    cache = make_cache(settings, origin)
+    expire(cache)
+    cache.transport = httpx.MockTransport(lambda request: httpx.Response(503))
+
+    assert asyncio.run(cache.lookup(URL)) is None
+
+def test_repoint_follows_a_newer_copy(settings):
+    origin = Origin()
+    cache = make_cache(settings, origin)
+    cache.store.create_file_document("doc-2", "report.pdf", 6, status="completed")
+    cache.repoint(URL, "doc-2")
+    cache.store.update_document("doc-1", status="failed")
+
+    assert asyncio.run(cache.lookup(URL)).document_id == "doc-2"